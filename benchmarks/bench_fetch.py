@@ -0,0 +1,69 @@
+"""
+Benchmark for the killmail detail fetch stage against a local stub server.
+
+Fetches the same kill list sequentially and through ``fetch_concurrently`` with
+the shared keep-alive session, with a configurable per-request latency standing
+in for the round-trip to ESI.
+
+Usage (from the repository root):
+
+    DJANGO_SETTINGS_MODULE=testauth.settings_aa4.local python benchmarks/bench_fetch.py --latency 0.05
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testauth.settings_aa4.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from unittest.mock import patch  # noqa: E402
+
+from killstory import tasks  # noqa: E402
+from killstory.client import fetch_concurrently  # noqa: E402
+from killstory.ratelimit import rate_limiter  # noqa: E402
+from killstory.tests.stub_server import StubServer  # noqa: E402
+
+
+def run(name, fetch, kill_list):
+    started = time.perf_counter()
+    fetched = sum(1 for data in fetch(kill_list) if data)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>16}: {fetched} killmails in {elapsed:6.2f}s = {fetched / elapsed:8.1f} killmails/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--killmails", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stub response")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8, 16])
+    options = parser.parse_args()
+
+    kill_list = {kill_id: f"hash{kill_id}" for kill_id in range(1, options.killmails + 1)}
+    # The stub is not ESI, measure the pool without the cluster-wide rate limit.
+    with StubServer(latency=options.latency) as stub, patch(
+        "killstory.tasks.KILLSTORY_API_DETAIL_ENDPOINT", stub.detail_endpoint
+    ), patch.object(rate_limiter, "rate", 0):
+        run(
+            "sequential",
+            lambda kills: (tasks.fetch_killmail_details(*pair) for pair in kills.items()),
+            kill_list,
+        )
+        for workers in options.workers:
+            run(
+                f"{workers} workers",
+                lambda kills, w=workers: fetch_concurrently(
+                    tasks.fetch_killmail_details, kills.items(), w
+                ),
+                kill_list,
+            )
+        print(f"{'connections':>16}: {stub.connections} for {len(stub.requests)} requests")
+
+
+if __name__ == "__main__":
+    main()
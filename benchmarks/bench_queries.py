@@ -0,0 +1,156 @@
+"""
+Benchmark for the killmail query patterns with and without the query indexes.
+
+Seeds a throwaway test database with synthetic killmails, then runs the
+listing and "kills/losses for my corp this month" queries twice: once with the
+indexes from ``0007_add_query_indexes`` dropped and once with them in place,
+printing the query plan and the median time of each.
+
+Usage (from the repository root):
+
+    DJANGO_SETTINGS_MODULE=testauth.settings_aa4.local python benchmarks/bench_queries.py --killmails 200000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testauth.settings_aa4.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from killstory.models import Attacker, Killmail, Victim  # noqa: E402
+from killstory.pagination import encode_cursor, keyset_page  # noqa: E402
+
+CORPORATIONS = 500
+SYSTEMS = 5000
+
+
+def seed(options):
+    rng = random.Random(1)
+    now = timezone.now()
+    chunk = 5000
+    for start in range(1, options.killmails + 1, chunk):
+        ids = range(start, min(start + chunk, options.killmails + 1))
+        Killmail.objects.bulk_create(
+            Killmail(
+                killmail_id=kill_id,
+                killmail_time=now - timedelta(minutes=rng.randrange(365 * 24 * 60)),
+                solar_system_id=30000000 + rng.randrange(SYSTEMS),
+            )
+            for kill_id in ids
+        )
+        Victim.objects.bulk_create(
+            Victim(
+                killmail_id=kill_id,
+                character_id=2112000000 + rng.randrange(CORPORATIONS * 20),
+                corporation_id=98000000 + rng.randrange(CORPORATIONS),
+                alliance_id=99000000 + rng.randrange(CORPORATIONS // 10),
+                damage_taken=1000,
+                ship_type_id=587,
+            )
+            for kill_id in ids
+        )
+        Attacker.objects.bulk_create(
+            Attacker(
+                killmail_id=kill_id,
+                character_id=2112000000 + rng.randrange(CORPORATIONS * 20),
+                corporation_id=98000000 + rng.randrange(CORPORATIONS),
+                alliance_id=99000000 + rng.randrange(CORPORATIONS // 10),
+                damage_done=100,
+                final_blow=i == 0,
+                security_status=0.0,
+                ship_type_id=24690,
+                weapon_type_id=2488,
+            )
+            for kill_id in ids
+            for i in range(options.attackers)
+        )
+
+
+def queries(options):
+    month_start = timezone.now() - timedelta(days=30)
+    corporation_id = 98000042
+    # Cursor 5000 rows deep, or at the last row of a smaller table
+    deep_offset = min(5000, options.killmails - 1)
+    deep = Killmail.objects.order_by("-killmail_time", "-killmail_id")[deep_offset]
+    return {
+        "index page": lambda: Killmail.objects.order_by("-killmail_time", "-killmail_id")[:50],
+        "deep index page": lambda: keyset_page(
+            Killmail.objects.all(), encode_cursor(deep.killmail_time, deep.killmail_id), 50
+        )[0],
+        "system kills": lambda: Killmail.objects.filter(
+            solar_system_id=30000042
+        ).order_by("-killmail_time")[:50],
+        "corp losses (month)": lambda: Killmail.objects.filter(
+            victim__corporation_id=corporation_id, killmail_time__gte=month_start
+        ).order_by("-killmail_time"),
+        "corp kills (month)": lambda: Killmail.objects.filter(
+            killmail_id__in=Attacker.objects.filter(
+                corporation_id=corporation_id
+            ).values("killmail_id"),
+            killmail_time__gte=month_start,
+        ).order_by("-killmail_time"),
+        "char losses": lambda: Victim.objects.filter(character_id=2112000042).values_list(
+            "killmail_id", flat=True
+        ),
+    }
+
+
+def run(label, options):
+    print(f"\n=== {label}")
+    for name, make_query in queries(options).items():
+        query = make_query()
+        timings = []
+        for _ in range(options.repeat):
+            started = time.perf_counter()
+            list(make_query())
+            timings.append(time.perf_counter() - started)
+        print(f"{name:>20}: {statistics.median(timings) * 1000:8.2f} ms")
+        if options.plans and hasattr(query, "explain"):
+            for line in query.explain().splitlines():
+                print(f"{'':>22}{line}")
+
+
+def query_indexes():
+    return [(model, index) for model in (Killmail, Victim, Attacker) for index in model._meta.indexes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--killmails", type=int, default=100_000)
+    parser.add_argument("--attackers", type=int, default=5, help="attackers per killmail")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-plans", dest="plans", action="store_false")
+    options = parser.parse_args()
+    if options.killmails < 1:
+        parser.error("--killmails must be at least 1")
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"backend: {connection.vendor}, seeding {options.killmails} killmails...")
+        seed(options)
+        with connection.schema_editor() as editor:
+            for model, index in query_indexes():
+                editor.remove_index(model, index)
+        run("without query indexes", options)
+        with connection.schema_editor() as editor:
+            for model, index in query_indexes():
+                editor.add_index(model, index)
+        run("with query indexes", options)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark for save_batch: per-row .save() versus the bulk writer.
+
+Creates a throwaway test database, writes the same synthetic killmails with the
+old per-row path and with ``killstory.writer.bulk_save_batch`` and prints rows
+per second for both.
+
+Usage (from the repository root):
+
+    DJANGO_SETTINGS_MODULE=testauth.settings_aa4.local python benchmarks/bench_save_batch.py
+
+Point DJANGO_SETTINGS_MODULE at settings with a MySQL ``DATABASES['default']``
+to benchmark MySQL instead of SQLite.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testauth.settings_aa4.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+
+from killstory.models import (  # noqa: E402
+    Killmail,
+    Victim,
+    Attacker,
+    VictimItem,
+    VictimContainedItem,
+)
+from killstory.tasks import create_killmail_instance  # noqa: E402
+from killstory.tests.utils import make_killmail_data  # noqa: E402
+from killstory.writer import (  # noqa: E402
+    bulk_save_batch,
+    build_attacker,
+    build_item,
+    build_victim,
+)
+
+
+def save_batch_rowwise(batch):
+    """The pre-bulk save_batch: one .save() per row."""
+    with transaction.atomic():
+        for killmail, killmail_data in batch:
+            killmail.save()
+            if "victim" in killmail_data:
+                victim = build_victim(killmail, killmail_data["victim"])
+                victim.save()
+                for item_data in killmail_data["victim"].get("items", []):
+                    item = build_item(VictimItem, item_data, victim=victim)
+                    item.save()
+                    for contained_item_data in item_data.get("items", []):
+                        build_item(
+                            VictimContainedItem, contained_item_data, parent_item=item
+                        ).save()
+            for attacker_data in killmail_data.get("attackers", []):
+                build_attacker(killmail, attacker_data).save()
+
+
+def make_batches(first_id, options):
+    batches = []
+    for start in range(first_id, first_id + options.killmails, options.batch_size):
+        batch = []
+        for killmail_id in range(start, min(start + options.batch_size, first_id + options.killmails)):
+            data = make_killmail_data(
+                killmail_id,
+                items=options.items,
+                contained=options.contained,
+                attackers=options.attackers,
+            )
+            batch.append((create_killmail_instance(data), data))
+        batches.append(batch)
+    return batches
+
+
+def count_rows():
+    return sum(
+        model.objects.count()
+        for model in (Killmail, Victim, Attacker, VictimItem, VictimContainedItem)
+    )
+
+
+def run(name, writer, batches):
+    rows_before = count_rows()
+    started = time.perf_counter()
+    for batch in batches:
+        writer(batch)
+    elapsed = time.perf_counter() - started
+    rows = count_rows() - rows_before
+    print(f"{name:>8}: {rows:>8} rows in {elapsed:7.2f}s = {rows / elapsed:>10.0f} rows/s")
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--killmails", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--items", type=int, default=40, help="fitted/cargo items per victim")
+    parser.add_argument("--contained", type=int, default=2, help="contained items per item")
+    parser.add_argument("--attackers", type=int, default=10)
+    options = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"backend: {connection.vendor}, killmails: {options.killmails}")
+        rowwise = run("per-row", save_batch_rowwise, make_batches(1, options))
+        bulk = run("bulk", bulk_save_batch, make_batches(10_000_000, options))
+        print(f" speedup: {bulk / rowwise:.1f}x")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Latency benchmark for the JSON killmail search API.
+
+Seeds a throwaway test database with synthetic killmails (one million by
+default), then requests ``/killstory/api/killmails/`` with typical filter
+combinations through the Django test client, printing the median and p95
+latency of each and the number of SQL queries it ran.
+
+Usage (from the repository root):
+
+    DJANGO_SETTINGS_MODULE=testauth.settings_aa4.local python benchmarks/bench_search.py --killmails 1000000
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testauth.settings_aa4.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from allianceauth.tests.auth_utils import AuthUtils  # noqa: E402
+
+from killstory.models import Attacker, Killmail, Victim  # noqa: E402
+
+CORPORATIONS = 500
+SYSTEMS = 5000
+SHIP_TYPES = (587, 626, 24690, 17738, 11176)
+
+
+def seed(options):
+    rng = random.Random(1)
+    now = timezone.now()
+    chunk = 5000
+    for start in range(1, options.killmails + 1, chunk):
+        ids = range(start, min(start + chunk, options.killmails + 1))
+        victims = {
+            kill_id: (
+                2112000000 + rng.randrange(CORPORATIONS * 20),
+                98000000 + rng.randrange(CORPORATIONS),
+                99000000 + rng.randrange(CORPORATIONS // 10),
+                rng.choice(SHIP_TYPES),
+            )
+            for kill_id in ids
+        }
+        Killmail.objects.bulk_create(
+            Killmail(
+                killmail_id=kill_id,
+                killmail_time=now - timedelta(minutes=rng.randrange(365 * 24 * 60)),
+                solar_system_id=30000000 + rng.randrange(SYSTEMS),
+                total_value=rng.lognormvariate(17, 2),
+                victim_character_id=victims[kill_id][0],
+                victim_corporation_id=victims[kill_id][1],
+                victim_alliance_id=victims[kill_id][2],
+                victim_ship_type_id=victims[kill_id][3],
+                attacker_count=options.attackers,
+            )
+            for kill_id in ids
+        )
+        Victim.objects.bulk_create(
+            Victim(
+                killmail_id=kill_id,
+                character_id=character_id,
+                corporation_id=corporation_id,
+                alliance_id=alliance_id,
+                damage_taken=1000,
+                ship_type_id=ship_type_id,
+            )
+            for kill_id, (character_id, corporation_id, alliance_id, ship_type_id) in victims.items()
+        )
+        Attacker.objects.bulk_create(
+            Attacker(
+                killmail_id=kill_id,
+                character_id=2112000000 + rng.randrange(CORPORATIONS * 20),
+                corporation_id=98000000 + rng.randrange(CORPORATIONS),
+                alliance_id=99000000 + rng.randrange(CORPORATIONS // 10),
+                damage_done=100,
+                final_blow=i == 0,
+                security_status=0.0,
+                ship_type_id=24690,
+                weapon_type_id=2488,
+            )
+            for kill_id in ids
+            for i in range(options.attackers)
+        )
+
+
+def searches():
+    month_ago = (timezone.now() - timedelta(days=30)).isoformat()
+    return {
+        "newest": {},
+        "corp any role": {"corporation_id": "98000042"},
+        "corp losses": {"corporation_id": "98000042", "role": "victim"},
+        "alliance kills month": {"alliance_id": "99000007", "role": "attacker", "since": month_ago},
+        "character any role": {"character_id": "2112000042"},
+        "system": {"solar_system_id": "30000042"},
+        "ship type month": {"ship_type_id": "626", "since": month_ago},
+        "min value 10B": {"min_value": "10000000000"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--killmails", type=int, default=1_000_000)
+    parser.add_argument("--attackers", type=int, default=5, help="attackers per killmail")
+    parser.add_argument("--repeat", type=int, default=20)
+    options = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"backend: {connection.vendor}, seeding {options.killmails} killmails...")
+        seed(options)
+        user = AuthUtils.create_user("bench")
+        AuthUtils.add_main_character_2(user, "Bench", 2112999999)
+        client = Client()
+        client.force_login(user)
+        url = reverse("killstory:api_killmails")
+
+        print(f"{'search':>22}{'median ms':>12}{'p95 ms':>10}{'queries':>9}{'rows':>6}")
+        for name, params in searches().items():
+            timings = []
+            for _ in range(options.repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(url, params)
+                    timings.append(time.perf_counter() - started)
+            timings.sort()
+            search_queries = [q for q in queries.captured_queries if "kill_killmail" in q["sql"]]
+            print(
+                f"{name:>22}{statistics.median(timings) * 1000:12.2f}"
+                f"{timings[math.ceil(len(timings) * 0.95) - 1] * 1000:10.2f}"
+                f"{len(search_queries):9}{len(response.json()['results']):6}"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
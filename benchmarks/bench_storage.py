@@ -0,0 +1,123 @@
+"""
+Benchmark for the storage modes: normalized item rows versus compact blobs.
+
+Creates a throwaway test database, writes the same synthetic killmails in
+``normalized`` and in ``compact`` storage mode and prints the write time, the
+rows written and the on-disk size of every killstory table, then the time to
+expand the items of a sample of compact killmails.
+
+Usage (from the repository root):
+
+    DJANGO_SETTINGS_MODULE=testauth.settings_aa4.local python benchmarks/bench_storage.py
+
+Table sizes come from SQLite's ``dbstat`` table or PostgreSQL's
+``pg_total_relation_size``; on other backends only row counts are printed.
+"""
+
+import argparse
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testauth.settings_aa4.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.utils import OperationalError  # noqa: E402
+
+from killstory.models import (  # noqa: E402
+    Attacker,
+    Killmail,
+    KillmailBlob,
+    Victim,
+    VictimContainedItem,
+    VictimItem,
+)
+from killstory.writer import bulk_save_batch, expand_items  # noqa: E402
+
+from bench_save_batch import make_batches  # noqa: E402
+
+MODELS = (Killmail, KillmailBlob, Victim, Attacker, VictimItem, VictimContainedItem)
+
+
+def table_bytes(table):
+    """Returns the on-disk size of a table and its indexes, or None when the backend cannot tell."""
+    with connection.cursor() as cursor:
+        try:
+            if connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s"
+                    " OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                    [table, table],
+                )
+            elif connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            else:
+                return None
+        except OperationalError:
+            return None
+        return cursor.fetchone()[0] or 0
+
+
+def clear():
+    for model in reversed(MODELS):
+        model.objects.all().delete()
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM")
+
+
+def run(mode, options):
+    clear()
+    batches = make_batches(1, options)
+    with patch("killstory.writer.KILLSTORY_STORAGE_MODE", mode):
+        started = time.perf_counter()
+        for batch in batches:
+            bulk_save_batch(batch)
+        elapsed = time.perf_counter() - started
+
+    print(f"\n=== {mode}: {options.killmails} killmails written in {elapsed:.2f}s")
+    total_rows, total_bytes = 0, 0
+    for model in MODELS:
+        rows, size = model.objects.count(), table_bytes(model._meta.db_table)
+        total_rows += rows
+        total_bytes += size or 0
+        size_text = f"{size / 1024:10.0f} KiB" if size is not None else f"{'n/a':>14}"
+        print(f"{model._meta.db_table:>28}: {rows:>8} rows {size_text}")
+    print(f"{'total':>28}: {total_rows:>8} rows {total_bytes / 1024:10.0f} KiB")
+
+    if mode == "compact":
+        sample = list(range(1, options.killmails + 1, max(options.killmails // options.expand, 1)))
+        started = time.perf_counter()
+        for kill_id in sample:
+            expand_items([kill_id])
+        elapsed = time.perf_counter() - started
+        print(f"expanding {len(sample)} killmails one by one: {elapsed / len(sample) * 1000:.2f} ms each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--killmails", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--items", type=int, default=40, help="fitted/cargo items per victim")
+    parser.add_argument("--contained", type=int, default=2, help="contained items per item")
+    parser.add_argument("--attackers", type=int, default=10)
+    parser.add_argument("--expand", type=int, default=50, help="compact killmails to expand")
+    options = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"backend: {connection.vendor}")
+        run("normalized", options)
+        run("compact", options)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+JSON search API over stored killmails.
+
+``search_killmails`` filters killmails by character, corporation or alliance
+(as victim, attacker or either), solar system, victim ship type, time range and
+minimum value, and returns one page of the summary columns, newest first, with
+a keyset cursor to the next page. Every filter maps to an indexed column:
+entity filters are ``killmail_id IN`` subqueries on the victim and attacker
+entity indexes, the others are columns of the killmail table.
+"""
+# killstory/api.py
+
+import datetime
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+from .models import Attacker, Killmail, Victim
+from .export import CONTENT_TYPES, export_killmails
+from .pagination import keyset_page
+from .app_settings import KILLSTORY_PAGE_SIZE
+
+# Columns returned for each killmail
+API_FIELDS = (
+    'killmail_id', 'killmail_time', 'solar_system_id', 'destroyed_value', 'dropped_value', 'total_value',
+    'victim_ship_type_id', 'victim_character_id', 'victim_corporation_id', 'victim_alliance_id',
+    'final_blow_ship_type_id', 'final_blow_character_id', 'final_blow_corporation_id',
+    'final_blow_alliance_id', 'attacker_count',
+)
+ENTITY_PARAMETERS = ('character_id', 'corporation_id', 'alliance_id')
+ROLES = ('any', 'victim', 'attacker')
+MAX_PAGE_SIZE = 200
+
+
+class InvalidParameter(ValueError):
+    """Raised for a malformed search parameter."""
+
+
+def parse_ids(params, name):
+    """Returns the IDs of a comma-separated integer parameter, or None when it is absent."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return [int(part) for part in value.split(",")]
+    except ValueError as e:
+        raise InvalidParameter(f"{name} must be a comma-separated list of integers") from e
+
+
+def parse_time(params, name):
+    """Returns an ISO 8601 date or datetime parameter as an aware datetime, or None when absent."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.datetime.combine(day, datetime.time()) if day else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise InvalidParameter(f"{name} must be an ISO 8601 date or datetime")
+    # Times without an offset are UTC, like ESI's
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+def entity_filter(field, ids, role):
+    """Returns a Q matching killmails whose victim and/or an attacker has one of the IDs in ``field``."""
+    lookup = {f"{field}__in": ids}
+    victim = Q(killmail_id__in=Victim.objects.filter(**lookup).values('killmail_id'))
+    attacker = Q(killmail_id__in=Attacker.objects.filter(**lookup).values('killmail_id'))
+    if role == 'victim':
+        return victim
+    if role == 'attacker':
+        return attacker
+    return victim | attacker
+
+
+def search_queryset(params):
+    """Returns the Killmail queryset of the search parameters."""
+    role = params.get('role') or 'any'
+    if role not in ROLES:
+        raise InvalidParameter(f"role must be one of {', '.join(ROLES)}")
+
+    queryset = Killmail.objects.all()
+    for field in ENTITY_PARAMETERS:
+        ids = parse_ids(params, field)
+        if ids:
+            queryset = queryset.filter(entity_filter(field, ids, role))
+    system_ids = parse_ids(params, 'solar_system_id')
+    if system_ids:
+        queryset = queryset.filter(solar_system_id__in=system_ids)
+    ship_type_ids = parse_ids(params, 'ship_type_id')
+    if ship_type_ids:
+        queryset = queryset.filter(victim_ship_type_id__in=ship_type_ids)
+    since, until = parse_time(params, 'since'), parse_time(params, 'until')
+    if since:
+        queryset = queryset.filter(killmail_time__gte=since)
+    if until:
+        queryset = queryset.filter(killmail_time__lt=until)
+    if params.get('min_value'):
+        try:
+            queryset = queryset.filter(total_value__gte=float(params['min_value']))
+        except ValueError as e:
+            raise InvalidParameter("min_value must be a number") from e
+    return queryset
+
+
+def page_size(params):
+    """Returns the requested page size, capped at ``MAX_PAGE_SIZE``."""
+    try:
+        return min(max(int(params.get('limit') or KILLSTORY_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    except ValueError as e:
+        raise InvalidParameter("limit must be an integer") from e
+
+
+@login_required
+@require_GET
+def search_killmails(request):
+    """
+    JSON endpoint returning one page of killmails matching the query parameters, newest first.
+
+    Parameters: ``character_id``, ``corporation_id``, ``alliance_id`` (comma-separated, matched
+    according to ``role``: ``any``, ``victim`` or ``attacker``), ``solar_system_id``, ``ship_type_id``
+    (of the victim), ``since`` and ``until`` (ISO 8601), ``min_value`` (ISK), ``limit`` and ``cursor``.
+    The response holds the killmails under ``results`` and the cursor of the next page, or null,
+    under ``next``. Invalid parameters are answered with a 400 and an ``error`` message.
+    """
+    try:
+        rows, next_cursor = keyset_page(
+            search_queryset(request.GET).values(*API_FIELDS), request.GET.get('cursor'), page_size(request.GET)
+        )
+    except InvalidParameter as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': rows, 'next': next_cursor})
+
+
+@login_required
+@require_GET
+def export_killmails_view(request):
+    """
+    Streams every killmail matching the search parameters as a CSV or Parquet download.
+
+    Takes the filters of ``search_killmails`` plus ``table`` (``killmails``, ``attackers`` or
+    ``items``) and ``format`` (``csv``, or ``parquet`` when pyarrow is installed). The rows are
+    read and encoded one chunk of killmails at a time while the response is sent; under ASGI the
+    content is an async iterator, as Django would read a sync one in full before sending it.
+    """
+    table, fmt = request.GET.get('table') or 'killmails', request.GET.get('format') or 'csv'
+    try:
+        content = export_killmails(search_queryset(request.GET), table, fmt)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if isinstance(request, ASGIRequest):
+        content = aiter_parts(content)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="killstory-{table}.{fmt}"'
+    return response
+
+
+async def aiter_parts(parts):
+    """Yields the parts of a sync iterator, reading each one in the sync thread."""
+    read = sync_to_async(next)
+    while True:
+        part = await read(parts, None)
+        if part is None:
+            return
+        yield part
@@ -11,9 +11,58 @@ KILLSTORY_API_LIST_ENDPOINT = getattr(
 KILLSTORY_API_DETAIL_ENDPOINT = getattr(
     settings, "KILLSTORY_API_DETAIL_ENDPOINT", "https://esi.evetech.net/latest/killmails/{}/{}"
 )
+KILLSTORY_API_PRICES_ENDPOINT = getattr(
+    settings, "KILLSTORY_API_PRICES_ENDPOINT", "https://esi.evetech.net/latest/markets/prices/"
+)
+# None disables name lookups on ESI, names then only come from the local table
+KILLSTORY_API_NAMES_ENDPOINT = getattr(
+    settings, "KILLSTORY_API_NAMES_ENDPOINT", "https://esi.evetech.net/latest/universe/names/"
+)
 
 
 # Optional settings with reasonable defaults
 KILLSTORY_BATCH_SIZE = getattr(settings, "KILLSTORY_BATCH_SIZE", 100)
+# Rows (killmails, victims, attackers, items) per in-process save
+KILLSTORY_BATCH_MAX_ROWS = getattr(settings, "KILLSTORY_BATCH_MAX_ROWS", 10000)
+# Raw JSON bytes per in-process save
+KILLSTORY_BATCH_MAX_BYTES = getattr(settings, "KILLSTORY_BATCH_MAX_BYTES", 8 * 1024 ** 2)
+# Fetched killmails waiting to be saved
+KILLSTORY_PIPELINE_QUEUE_SIZE = getattr(settings, "KILLSTORY_PIPELINE_QUEUE_SIZE", 200)
 KILLSTORY_RETRY_LIMIT = getattr(settings, "KILLSTORY_RETRY_LIMIT", 5)
+# Parallel killmail detail requests
+KILLSTORY_FETCH_CONCURRENCY = getattr(settings, "KILLSTORY_FETCH_CONCURRENCY", 8)
+# Requests per second over all workers, 0 = no limit
+KILLSTORY_ESI_RATE_LIMIT = getattr(settings, "KILLSTORY_ESI_RATE_LIMIT", 20)
+# Pause until reset below this
+KILLSTORY_ESI_ERROR_LIMIT_THRESHOLD = getattr(settings, "KILLSTORY_ESI_ERROR_LIMIT_THRESHOLD", 10)
+# Slow down below this
+KILLSTORY_ESI_ERROR_LIMIT_SLOWDOWN = getattr(settings, "KILLSTORY_ESI_ERROR_LIMIT_SLOWDOWN", 50)
+# Directory for raw killmail JSON, None = disabled
+KILLSTORY_RAW_CACHE_DIR = getattr(settings, "KILLSTORY_RAW_CACHE_DIR", None)
+KILLSTORY_RAW_CACHE_MAX_BYTES = getattr(settings, "KILLSTORY_RAW_CACHE_MAX_BYTES", 2 * 1024 ** 3)
+# "normalized" writes every item row, "compact" keeps raw killmails as compressed blobs and expands items on demand
+KILLSTORY_STORAGE_MODE = getattr(settings, "KILLSTORY_STORAGE_MODE", "normalized")
+# Seconds before a character's list is fetched again
+KILLSTORY_LIST_REFRESH_INTERVAL = getattr(settings, "KILLSTORY_LIST_REFRESH_INTERVAL", 20 * 3600)
+# Characters per population run, None = all due
+KILLSTORY_CHARACTERS_PER_RUN = getattr(settings, "KILLSTORY_CHARACTERS_PER_RUN", None)
+# Type price provider as a dotted path or (dotted path, kwargs) pair, None = no valuation, e.g.
+# ("killstory.pricing.FilePriceProvider", {"path": "/srv/killstory/prices.json"})
+KILLSTORY_PRICE_PROVIDER = getattr(settings, "KILLSTORY_PRICE_PROVIDER", "killstory.pricing.EsiPriceProvider")
+# Seconds before prices are reloaded
+KILLSTORY_PRICE_REFRESH_INTERVAL = getattr(settings, "KILLSTORY_PRICE_REFRESH_INTERVAL", 6 * 3600)
+# Names kept in each process
+KILLSTORY_NAMES_LRU_SIZE = getattr(settings, "KILLSTORY_NAMES_LRU_SIZE", 20000)
+# Seconds names stay in the Django cache
+KILLSTORY_NAMES_CACHE_TIMEOUT = getattr(settings, "KILLSTORY_NAMES_CACHE_TIMEOUT", 7 * 24 * 3600)
+# Seconds before a page asks ESI again for IDs it could not resolve
+KILLSTORY_NAMES_MISSING_TIMEOUT = getattr(settings, "KILLSTORY_NAMES_MISSING_TIMEOUT", 300)
+# Serve the index, detail and search pages with async views (ASGI)
+KILLSTORY_ASYNC_VIEWS = getattr(settings, "KILLSTORY_ASYNC_VIEWS", False)
+# Killmails per index page
+KILLSTORY_PAGE_SIZE = getattr(settings, "KILLSTORY_PAGE_SIZE", 50)
+# Metrics sinks as dotted paths or (dotted path, kwargs) pairs, e.g.
+# ("killstory.metrics.StatsdSink", {"host": "localhost", "port": 8125})
+# ("killstory.metrics.PrometheusTextSink", {"path": "/var/lib/node_exporter/killstory.prom"})
+KILLSTORY_METRICS_SINKS = getattr(settings, "KILLSTORY_METRICS_SINKS", ["killstory.metrics.LoggingSink"])
 KILLSTORY_LOG_LEVEL = getattr(settings, "KILLSTORY_LOG_LEVEL", "INFO")  # Can be "DEBUG", "INFO", "WARNING", etc.
@@ -0,0 +1,99 @@
+"""
+Bulk import of killmails from daily archives on local disk.
+
+EVE Ref and zKillboard publish one ``.tar.bz2`` archive per day holding a raw
+ESI JSON file per killmail. ``import_archives`` reads them as streams, one
+archive per worker process, keeps the killmails involving an owned character
+or an owned character's corporation, and saves them through ``save_batch``
+like fetched killmails, without any HTTP request.
+"""
+# killstory/archive.py
+
+import json
+import logging
+import tarfile
+import multiprocessing
+from functools import partial
+from allianceauth.eveonline.models import EveCharacter
+from .app_settings import KILLSTORY_BATCH_SIZE
+from .tasks import create_killmail_instance, get_owned_character_ids, save_batch
+
+logger = logging.getLogger(__name__)
+
+
+def owned_entity_ids():
+    """Returns the (character IDs, corporation IDs) sets of the owned characters."""
+    characters = EveCharacter.objects.filter(character_id__in=list(get_owned_character_ids()))
+    character_ids, corporation_ids = set(), set()
+    for character_id, corporation_id in characters.values_list('character_id', 'corporation_id'):
+        character_ids.add(character_id)
+        corporation_ids.add(corporation_id)
+    return character_ids, corporation_ids
+
+
+def iter_archive_killmails(path):
+    """Yields the killmail dicts of a tar archive, reading it as a stream."""
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(".json"):
+                continue
+            data = json.load(archive.extractfile(member))
+            # Some dumps hold a list of killmails per file
+            yield from data if isinstance(data, list) else (data,)
+
+
+def involves(killmail_data, character_ids, corporation_ids):
+    """Tells whether the victim or an attacker is one of the characters or corporations."""
+    for participant in (killmail_data.get('victim') or {}, *killmail_data.get('attackers', [])):
+        if participant.get('character_id') in character_ids or participant.get('corporation_id') in corporation_ids:
+            return True
+    return False
+
+
+def parse_archive(path, character_ids, corporation_ids):
+    """Returns (path, killmails read, matching killmail dicts) for an archive, run in the worker processes."""
+    read, matching = 0, []
+    try:
+        for killmail_data in iter_archive_killmails(path):
+            read += 1
+            if involves(killmail_data, character_ids, corporation_ids):
+                matching.append(killmail_data)
+    except (OSError, tarfile.TarError, ValueError) as e:
+        logger.error("Could not read archive %s: %s", path, e)
+    return path, read, matching
+
+
+def import_archives(paths, workers=1, on_archive=None):
+    """Imports the owned characters' killmails of the archives, returns (killmails read, matched, saved).
+
+    ``on_archive(path, read, matched)`` is called as each archive is parsed.
+    """
+    character_ids, corporation_ids = owned_entity_ids()
+    parse = partial(parse_archive, character_ids=character_ids, corporation_ids=corporation_ids)
+    totals = {'read': 0, 'matched': 0, 'saved': 0}
+    batch = []
+
+    def flush_batch():
+        totals['saved'] += save_batch(batch)['killmails']
+        batch.clear()
+
+    def consume(results):
+        for path, read, matching in results:
+            totals['read'] += read
+            totals['matched'] += len(matching)
+            if on_archive:
+                on_archive(path, read, len(matching))
+            for killmail_data in matching:
+                batch.append((create_killmail_instance(killmail_data), killmail_data))
+                if len(batch) >= KILLSTORY_BATCH_SIZE:
+                    flush_batch()
+
+    if workers <= 1:
+        consume(map(parse, paths))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            # Killmails are saved by this process while the workers parse the next archives
+            consume(pool.imap_unordered(parse, paths))
+    if batch:
+        flush_batch()
+    return totals['read'], totals['matched'], totals['saved']
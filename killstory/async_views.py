@@ -0,0 +1,130 @@
+"""
+Async versions of the killstory read views, for ASGI deployments.
+
+The index, killmail detail and search views read through Django's async ORM,
+so a worker serves other requests while their queries run, and independent
+lookups, such as the detail page's header row and cached tree, run
+concurrently. Rendering an uncached detail tree and resolving names, which have
+no async API, run in separate threads. ``urls.py`` mounts them in place of the sync
+views when ``KILLSTORY_ASYNC_VIEWS`` is set; the sync views stay the default
+and keep serving WSGI deployments.
+"""
+# killstory/async_views.py
+
+import asyncio
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import render
+from .api import API_FIELDS, InvalidParameter, page_size, search_queryset
+from .models import Killmail
+from .names import name_resolver
+from .pagination import akeyset_page
+from .views import (
+    INDEX_COLUMNS, INDEX_NAME_COLUMNS, cache_kill_detail_tree, kill_detail_cache_key, kill_detail_queryset
+)
+from .writer import expand_items
+from .app_settings import KILLSTORY_PAGE_SIZE
+
+
+def async_login_required(view):
+    """``login_required`` for async views."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _own_connection(func):
+    """Wraps a blocking callable run in a pool thread so its database connection is released as usual."""
+    def run():
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_blocking(*funcs):
+    """Runs blocking callables concurrently, each in its own thread, and returns their results in order.
+
+    Within a transaction, e.g. with ``ATOMIC_REQUESTS``, other connections would
+    not see its uncommitted writes, so the callables run one after the other on
+    the request's connection instead.
+    """
+    if await sync_to_async(lambda: connection.in_atomic_block)():
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(
+        *(sync_to_async(_own_connection(func), thread_sensitive=False)() for func in funcs)
+    )
+
+
+@async_login_required
+async def killstory_view(request):
+    """Async version of ``views.killstory_view``."""
+    kill_killmails, next_cursor = await akeyset_page(
+        Killmail.objects.only(*INDEX_COLUMNS),
+        request.GET.get('before'),
+        KILLSTORY_PAGE_SIZE,
+    )
+    names = await sync_to_async(name_resolver.resolve)(
+        [getattr(kill, column) for kill in kill_killmails for column in INDEX_NAME_COLUMNS]
+    )
+    context = {
+        'kill_killmails': kill_killmails,
+        'names': names,
+        'next_cursor': next_cursor,
+        'is_first_page': 'before' not in request.GET,
+    }
+    return await sync_to_async(render)(request, 'killstory/index.html', context)
+
+
+def render_kill_detail_tree(killmail_id):
+    """Renders and caches a killmail's detail tree, returns None when the killmail does not exist."""
+    expand_items([killmail_id])
+    killmail = kill_detail_queryset().filter(pk=killmail_id).first()
+    if killmail is None:
+        return None
+    return cache_kill_detail_tree(killmail)
+
+
+@async_login_required
+async def kill_detail_view(request, killmail_id):
+    """Async version of ``views.kill_detail_view``: the header row and the cached tree are read concurrently."""
+    killmail, fragment = await asyncio.gather(
+        Killmail.objects.filter(pk=killmail_id).afirst(),
+        sync_to_async(cache.get, thread_sensitive=False)(kill_detail_cache_key(killmail_id)),
+    )
+    if killmail is None:
+        raise Http404("No Killmail matches the given query.")
+    if fragment is None:
+        fragment, names = await gather_blocking(
+            lambda: render_kill_detail_tree(killmail_id),
+            lambda: name_resolver.resolve([killmail.solar_system_id]),
+        )
+    else:
+        names = await sync_to_async(name_resolver.resolve)([killmail.solar_system_id])
+    context = {
+        'killmail': killmail,
+        'fragment': fragment,
+        'names': names,
+    }
+    return await sync_to_async(render)(request, 'killstory/kill_detail.html', context)
+
+
+@async_login_required
+async def search_killmails(request):
+    """Async version of ``api.search_killmails``."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        queryset, size = search_queryset(request.GET).values(*API_FIELDS), page_size(request.GET)
+    except InvalidParameter as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    rows, next_cursor = await akeyset_page(queryset, request.GET.get('cursor'), size)
+    return JsonResponse({'results': rows, 'next': next_cursor})
@@ -0,0 +1,229 @@
+"""
+In-process backfill of the full killmail history of owned characters.
+
+``run_backfill`` splits the characters over a pool of worker processes. Each
+worker streams a character's kill list through a ``SavePipeline``, which fetches
+the details of the new kills concurrently and saves them in bounded batches, reporting
+its progress to the parent through a queue so the ``backfill_kills`` command
+can show live throughput.
+"""
+# killstory/backfill.py
+
+import time
+import queue
+import logging
+import multiprocessing
+import django
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from allianceauth.eveonline.models import EveCharacter
+from .pipeline import SavePipeline
+from .writer import empty_counts
+from .tasks import (
+    create_killmail_instance, fetch_killmail_details, get_owned_character_ids,
+    iter_new_killmails, save_batch
+)
+
+logger = logging.getLogger(__name__)
+
+# Progress messages sent by the workers: ("listed", character_id, kills) for each
+# chunk of a character's new kills, ("list_done", character_id) at the end of its
+# list, ("saved", kills, rows) after each batch and ("done", character_id, kills)
+# when a character is finished. Module state of the worker rather than a constant.
+_progress = None  # pylint: disable=invalid-name
+
+
+def select_character_ids(character_ids=None, corporation_ids=None, alliance_ids=None):
+    """Returns the owned character IDs matching the given character, corporation or alliance IDs."""
+    characters = EveCharacter.objects.filter(character_id__in=list(get_owned_character_ids()))
+    if character_ids:
+        characters = characters.filter(character_id__in=character_ids)
+    if corporation_ids:
+        characters = characters.filter(corporation_id__in=corporation_ids)
+    if alliance_ids:
+        characters = characters.filter(alliance_id__in=alliance_ids)
+    return list(characters.order_by('character_id').values_list('character_id', flat=True))
+
+
+def in_window(killmail_time, since=None, until=None):
+    """Tells whether a killmail time, a datetime or ISO 8601 string, is within [since, until)."""
+    if isinstance(killmail_time, str):
+        killmail_time = parse_datetime(killmail_time)
+    return (since is None or killmail_time >= since) and (until is None or killmail_time < until)
+
+
+def backfill_character(character_id, since=None, until=None):
+    """Fetches and saves every new killmail of a character within the dates, returns the killmails saved.
+
+    The kill list is streamed into a ``SavePipeline``, so neither the list nor the
+    fetched details are held in full.
+    """
+    listing = {}
+    pipeline = SavePipeline(fetch_killmail_details, lambda batch: save_and_report(batch, since, until))
+    pipeline.run(iter_listed(character_id, listing), lambda data: (create_killmail_instance(data), data))
+    # Kills whose details could not be fetched still count as progress through the list
+    report("saved", listing['new'] - pipeline.fetched, 0)
+    report("done", character_id, pipeline.saved)
+    return pipeline.saved
+
+
+def iter_listed(character_id, listing):
+    """Yields a character's new (kill_id, hash) pairs, reporting each chunk and the end of the list."""
+    for chunk in iter_new_killmails(character_id, listing=listing):
+        report("listed", character_id, len(chunk))
+        yield from chunk
+    report("list_done", character_id)
+
+
+def save_and_report(batch, since=None, until=None):
+    """Saves the killmails of a batch within the dates and reports the rows written, returns the counts."""
+    in_dates = [pair for pair in batch if in_window(pair[0].killmail_time, since, until)]
+    counts = save_batch(in_dates) if in_dates else empty_counts()
+    # Killmails skipped as already stored still count as progress through the list, not as rows
+    rows = sum(count for table, count in counts.items() if table != 'skipped')
+    report("saved", len(batch), rows)
+    return counts
+
+
+def report(*message):
+    """Sends a progress message to the parent process, when there is one."""
+    if _progress is not None:
+        _progress.put(message)
+
+
+def init_worker(progress):
+    """Prepares a worker process: Django set up, no connection shared with the parent."""
+    global _progress  # pylint: disable=global-statement
+    django.setup()
+    connections.close_all()
+    _progress = progress
+
+
+def run_backfill(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    character_ids, workers=1, since=None, until=None, on_progress=None, interval=1.0
+):
+    """Backfills the characters over worker processes, calling ``on_progress(progress)`` every interval.
+
+    Returns the final ``BackfillProgress``. With a single worker the backfill
+    runs in the current process. The arguments mirror the options of the
+    ``backfill_kills`` command.
+    """
+    global _progress  # pylint: disable=global-statement
+    progress = BackfillProgress(len(character_ids))
+    if workers <= 1:
+        _progress = InlineReporter(progress, on_progress, interval)
+        try:
+            for character_id in character_ids:
+                backfill_character(character_id, since, until)
+        finally:
+            _progress = None
+        return progress
+
+    # The pool's processes open their own connections
+    connections.close_all()
+    with multiprocessing.Manager() as manager:
+        messages = manager.Queue()
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(messages,)) as pool:
+            result = pool.starmap_async(
+                backfill_character, [(character_id, since, until) for character_id in character_ids], chunksize=1
+            )
+            while not result.ready():
+                result.wait(interval)
+                progress.drain(messages)
+                if on_progress:
+                    on_progress(progress)
+            result.get()
+        progress.drain(messages)
+    return progress
+
+
+class BackfillProgress:  # pylint: disable=too-many-instance-attributes
+    """Counters of a running backfill, with throughput and ETA, one attribute per figure of the status line."""
+
+    def __init__(self, characters, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.characters = characters
+        self.characters_listed = 0
+        self.characters_done = 0
+        self.listed = 0
+        self.processed = 0
+        self.saved = 0
+        self.rows = 0
+
+    def drain(self, messages):
+        """Applies every pending progress message of a queue."""
+        while True:
+            try:
+                self.apply(messages.get_nowait())
+            except queue.Empty:
+                return
+
+    def apply(self, message):
+        """Applies a progress message."""
+        kind, *values = message
+        if kind == "listed":
+            self.listed += values[1]
+        elif kind == "list_done":
+            self.characters_listed += 1
+        elif kind == "saved":
+            self.processed += values[0]
+            self.rows += values[1]
+        elif kind == "done":
+            self.characters_done += 1
+            self.saved += values[1]
+
+    def elapsed(self):
+        """Returns the seconds since the backfill started."""
+        return max(self.clock() - self.started, 1e-9)
+
+    def eta(self):
+        """Returns the estimated seconds left, or None before any progress."""
+        if self.characters_listed < self.characters:
+            # Until every list is known, extrapolate from the finished characters
+            if not self.characters_done:
+                return None
+            return self.elapsed() * (self.characters - self.characters_done) / self.characters_done
+        if not self.processed:
+            return None
+        return (self.listed - self.processed) * self.elapsed() / self.processed
+
+    def line(self):
+        """Returns a one-line status."""
+        elapsed, eta = self.elapsed(), self.eta()
+        return (
+            f"characters {self.characters_done}/{self.characters}, "
+            f"kills {self.processed}/{self.listed} ({self.processed / elapsed:.1f}/s), "
+            f"saved {self.saved}, rows {self.rows} ({self.rows / elapsed:.0f}/s), "
+            f"ETA {format_duration(eta) if eta is not None else '?'}"
+        )
+
+
+class InlineReporter:
+    """Progress "queue" of a backfill running in the current process, calling back at most every interval."""
+
+    def __init__(self, progress, on_progress=None, interval=1.0):
+        self.progress = progress
+        self.on_progress = on_progress
+        self.interval = interval
+        self.last_call = progress.clock()
+
+    def put(self, message):
+        """Applies a progress message and calls back when the interval has passed or a character is done."""
+        self.progress.apply(message)
+        now = self.progress.clock()
+        if self.on_progress and (now - self.last_call >= self.interval or message[0] == "done"):
+            self.last_call = now
+            self.on_progress(self.progress)
+
+
+def format_duration(seconds):
+    """Formats seconds as 1h02m03s, 2m03s or 3s."""
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
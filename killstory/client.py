@@ -0,0 +1,151 @@
+"""
+HTTP client for the killstory and ESI endpoints.
+
+All requests go through one shared ``requests.Session`` so connections are kept
+alive and pooled across calls and worker threads, and are paced by the
+cluster-wide ``rate_limiter``. ``try_request`` makes a single attempt for callers
+that cannot wait, such as page views. ``fetch_concurrently`` runs a function over an
+iterable in a bounded thread pool and yields results as they finish.
+"""
+# killstory/client.py
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
+from requests.adapters import HTTPAdapter
+from .app_settings import KILLSTORY_RETRY_LIMIT, KILLSTORY_FETCH_CONCURRENCY
+from .ratelimit import rate_limiter
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Returned by check_status when the request should be made again
+RETRY = object()
+
+# Session of this process, created on first use: module state rather than a constant
+_session = None  # pylint: disable=invalid-name
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the process-wide HTTP session, creating it on first use."""
+    global _session  # pylint: disable=global-statement
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4, pool_maxsize=max(KILLSTORY_FETCH_CONCURRENCY, 1)
+            )
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def make_request(url, stream=False, headers=None, json=None):
+    """Makes an HTTP GET request, or a POST of a ``json`` body, with retries for handling temporary issues.
+
+    With ``stream=True`` the body is not read up front and the caller must close the response.
+    When conditional ``headers`` are sent, a 304 Not Modified response is returned as well.
+    """
+    retries = 0
+    while retries < KILLSTORY_RETRY_LIMIT:
+        try:
+            rate_limiter.acquire()
+            if retries:
+                metrics.incr("http_retries")
+            metrics.incr("http_requests")
+            with metrics.timed("http_request_seconds"):
+                if json is None:
+                    response = get_session().get(url, timeout=10, stream=stream, headers=headers)
+                else:
+                    response = get_session().post(url, timeout=10, stream=stream, headers=headers, json=json)
+            result = None
+            try:
+                rate_limiter.update(response)
+                result = check_status(response, retries, conditional=bool(headers), lookup=json is not None)
+            finally:
+                if result is not response:
+                    response.close()
+            if result is not RETRY:
+                return result
+        except requests.RequestException as e:
+            metrics.incr("http_errors")
+            logger.error("Network error: %s, attempt %d", e, retries + 1)
+        retries += 1
+
+    logger.error("Retry limit reached, moving to next killmail.")
+    return None
+
+
+def check_status(response, retries, conditional=False, lookup=False):
+    """Returns the response of a successful request, None when it failed for good, or ``RETRY``.
+
+    ``conditional`` requests also return a 304 Not Modified response. ``lookup``
+    requests give up on a 404. Temporary errors back off before ``RETRY`` is returned.
+    """
+    if response.status_code == 304 and conditional:
+        return response
+    if response.status_code in [304, 400, 422]:
+        return None
+    if response.status_code == 404 and lookup:
+        # Lookups such as /universe/names/ answer 404 for invalid IDs, retrying cannot help
+        return None
+    if response.status_code == 420 and "X-Esi-Error-Limit-Reset" in response.headers:
+        logger.warning("ESI error limited, attempt %d", retries + 1)
+        return RETRY
+    if response.status_code in [420, 500, 503, 504]:
+        metrics.incr("http_errors")
+        time.sleep(2 ** retries)
+        return RETRY
+    response.raise_for_status()
+    return response
+
+
+def try_request(url, json=None, timeout=2):
+    """Makes one HTTP GET, or a POST of a ``json`` body, without waiting for the rate limiter or retrying.
+
+    Returns None when no request may be sent right now, on network errors and on error responses.
+    """
+    if not rate_limiter.try_acquire():
+        return None
+    metrics.incr("http_requests")
+    try:
+        with metrics.timed("http_request_seconds"):
+            if json is None:
+                response = get_session().get(url, timeout=timeout)
+            else:
+                response = get_session().post(url, timeout=timeout, json=json)
+    except requests.RequestException as e:
+        metrics.incr("http_errors")
+        logger.warning("Network error: %s, not retried", e)
+        return None
+    rate_limiter.update(response)
+    if not response.ok:
+        if response.status_code >= 420:
+            metrics.incr("http_errors")
+        response.close()
+        return None
+    return response
+
+
+def fetch_concurrently(func, iterable, max_workers=KILLSTORY_FETCH_CONCURRENCY):
+    """Calls ``func(*args)`` for each args tuple in a thread pool and yields results as they finish.
+
+    At most ``2 * max_workers`` calls are in flight, so a long iterable is never
+    submitted to the pool all at once.
+    """
+    max_workers = max(max_workers, 1)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="killstory-fetch") as executor:
+        pending = set()
+        for args in iterable:
+            pending.add(executor.submit(func, *args))
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,26 @@
+"""
+Encoding of raw killmails for the compact storage mode.
+
+With ``KILLSTORY_STORAGE_MODE = "compact"`` the writer keeps each killmail's
+raw ESI data as one zlib-compressed JSON blob in ``KillmailBlob`` and only
+normalizes the killmail, victim and attackers. Victim items are expanded into
+``VictimItem``/``VictimContainedItem`` rows on first use, see
+``killstory.writer.expand_items``.
+"""
+# killstory/compact.py
+
+import json
+import zlib
+
+NORMALIZED = "normalized"
+COMPACT = "compact"
+
+
+def encode_killmail(killmail_data):
+    """Returns the compressed blob of a raw killmail dict."""
+    return zlib.compress(json.dumps(killmail_data, separators=(",", ":")).encode(), 6)
+
+
+def decode_killmail(blob):
+    """Returns the raw killmail dict of a compressed blob."""
+    return json.loads(zlib.decompress(blob))
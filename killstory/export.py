@@ -0,0 +1,186 @@
+"""
+Streaming CSV and Parquet export of killmails, attackers and items.
+
+``iter_chunks`` walks the killmails of a queryset by primary key, one
+``pk > last pk`` query per chunk so no database cursor stays open between
+chunks, and yields the rows of one table, loading the attackers or items of one
+chunk of killmails at a time. The rows are encoded as
+CSV text or, when pyarrow is installed, as Parquet with one row group per chunk,
+and handed out as byte strings, so an export holds at most one chunk in memory
+whatever its total size. Items of killmails saved in compact mode are read from
+their blobs without expanding them.
+"""
+# killstory/export.py
+
+import io
+import csv
+import datetime
+from .compact import decode_killmail
+from .models import Attacker, KillmailBlob, VictimContainedItem, VictimItem
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Killmails per chunk, and rows per Parquet row group at most
+CHUNK_SIZE = 2000
+
+# Columns of each table as (name, type) pairs
+COLUMNS = {
+    'killmails': (
+        ('killmail_id', 'int'), ('killmail_time', 'time'), ('solar_system_id', 'int'),
+        ('moon_id', 'int'), ('war_id', 'int'),
+        ('destroyed_value', 'float'), ('dropped_value', 'float'), ('total_value', 'float'),
+        ('victim_ship_type_id', 'int'), ('victim_character_id', 'int'),
+        ('victim_corporation_id', 'int'), ('victim_alliance_id', 'int'),
+        ('final_blow_ship_type_id', 'int'), ('final_blow_character_id', 'int'),
+        ('final_blow_corporation_id', 'int'), ('final_blow_alliance_id', 'int'),
+        ('attacker_count', 'int'),
+    ),
+    'attackers': (
+        ('killmail_id', 'int'), ('character_id', 'int'), ('corporation_id', 'int'),
+        ('alliance_id', 'int'), ('faction_id', 'int'), ('damage_done', 'int'), ('final_blow', 'bool'),
+        ('security_status', 'float'), ('ship_type_id', 'int'), ('weapon_type_id', 'int'),
+    ),
+    'items': (
+        ('killmail_id', 'int'), ('parent_item_type_id', 'int'), ('item_type_id', 'int'), ('flag', 'int'),
+        ('quantity_destroyed', 'int'), ('quantity_dropped', 'int'), ('singleton', 'int'),
+    ),
+}
+FORMATS = ('csv', 'parquet')
+CONTENT_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+ITEM_FIELDS = ('item_type_id', 'flag', 'quantity_destroyed', 'quantity_dropped', 'singleton')
+
+
+def column_names(table):
+    """Returns the column names of a table."""
+    return [name for name, _ in COLUMNS[table]]
+
+
+def iter_chunks(queryset, table, chunk_size=CHUNK_SIZE):
+    """Yields lists of row tuples of a table, one list per chunk of killmails of the queryset."""
+    queryset = queryset.order_by('pk')
+    # killmail_id, the first killmail column, is the primary key
+    fields = column_names(table) if table == 'killmails' else ['pk']
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page.values_list(*fields)[:chunk_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1][0]
+        if table == 'killmails':
+            yield chunk
+        else:
+            kill_ids = [row[0] for row in chunk]
+            yield attacker_rows(kill_ids) if table == 'attackers' else item_rows(kill_ids)
+
+
+def attacker_rows(kill_ids):
+    """Returns the attacker rows of killmails."""
+    return list(
+        Attacker.objects.filter(killmail_id__in=kill_ids).order_by('killmail_id', 'pk')
+        .values_list(*column_names('attackers'))
+    )
+
+
+def item_rows(kill_ids):
+    """Returns the item and contained item rows of killmails, read from the blobs of unexpanded killmails."""
+    rows = [
+        (kill_id, None, *values) for kill_id, *values in
+        VictimItem.objects.filter(victim__killmail_id__in=kill_ids).order_by('pk')
+        .values_list('victim__killmail_id', *ITEM_FIELDS)
+    ]
+    rows += VictimContainedItem.objects.filter(
+        parent_item__victim__killmail_id__in=kill_ids
+    ).order_by('pk').values_list('parent_item__victim__killmail_id', 'parent_item__item_type_id', *ITEM_FIELDS)
+    for kill_id, data in KillmailBlob.objects.filter(
+        killmail_id__in=kill_ids, items_expanded=False
+    ).values_list('killmail_id', 'data'):
+        for item_data in decode_killmail(data).get('victim', {}).get('items', []):
+            rows.append((kill_id, None, *(item_data.get(field) for field in ITEM_FIELDS)))
+            for contained_data in item_data.get('items', []):
+                rows.append((
+                    kill_id, item_data['item_type_id'], *(contained_data.get(field) for field in ITEM_FIELDS)
+                ))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def iter_csv(table, chunks):
+    """Yields CSV bytes: the header, then one string per chunk of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(column_names(table))
+    for chunk in chunks:
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime.datetime) else value for value in row]
+            for row in chunk
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file collecting the bytes pyarrow writes until they are taken."""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        """Tells io the file accepts writes."""
+        return True
+
+    def write(self, data):
+        """Keeps a copy of the bytes written."""
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        """Returns and forgets the bytes written since the last call."""
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def parquet_schema(table):
+    """Returns the pyarrow schema of a table."""
+    types = {
+        'int': pyarrow.int64(), 'float': pyarrow.float64(), 'bool': pyarrow.bool_(),
+        'time': pyarrow.timestamp('us', tz='UTC'),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, kind in COLUMNS[table]])
+
+
+def iter_parquet(table, chunks):
+    """Yields Parquet bytes, writing one row group per chunk of rows."""
+    schema = parquet_schema(table)
+    sink = _Drain()
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            if chunk:
+                writer.write_table(
+                    pyarrow.Table.from_arrays(
+                        [pyarrow.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)],
+                        schema=schema,
+                    )
+                )
+                yield sink.take()
+    yield sink.take()
+
+
+def export_killmails(queryset, table='killmails', fmt='csv', chunk_size=CHUNK_SIZE):
+    """Returns an iterator of the encoded bytes of a table's rows for the killmails of a queryset."""
+    if table not in COLUMNS:
+        raise ValueError(f"table must be one of {', '.join(COLUMNS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt == 'parquet' and pyarrow is None:
+        raise ValueError("Parquet export requires pyarrow, install killstory[parquet]")
+    chunks = iter_chunks(queryset, table, chunk_size)
+    return iter_csv(table, chunks) if fmt == 'csv' else iter_parquet(table, chunks)
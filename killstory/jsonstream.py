@@ -0,0 +1,101 @@
+"""
+Incremental parsing of large flat JSON objects.
+
+The killstory list endpoint returns one JSON object mapping every kill ID of a
+character to its hash. ``iter_object_items`` parses such an object from a
+stream of byte chunks and yields its (key, value) pairs as they arrive, so the
+whole document is never held in memory.
+"""
+# killstory/jsonstream.py
+
+import json
+import codecs
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class IncompleteJSON(ValueError):
+    """Raised when the stream ends before the JSON object is closed."""
+
+
+def iter_object_items(chunks):
+    """Yields the (key, value) pairs of a top-level JSON object read from an iterable of byte chunks."""
+    reader = _Reader(chunks)
+    if reader.peek() == "[":
+        # An empty list is what the endpoint returns for characters without kills
+        if json.loads(reader.rest()) != []:
+            raise ValueError("Expected a JSON object or an empty list")
+        return
+    reader.expect("{")
+    if reader.peek() == "}":
+        return  # Empty object
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        yield key, reader.value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
+
+
+class _Reader:
+    """Text buffer over a stream of byte chunks, read one JSON token at a time."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer, self.pos, self.final = "", 0, False
+
+    def peek(self):
+        """Returns the next non-whitespace character, reading more chunks as needed."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.read_more()
+
+    def expect(self, char):
+        """Consumes the next character, raising ``ValueError`` when it is not the one given."""
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.buffer[self.pos:self.pos + 20]!r}")
+        self.pos += 1
+
+    def value(self):
+        """Consumes and returns the next JSON value, reading more chunks until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number may go on in the next chunk, a string ends at its closing quote
+                complete = end < len(self.buffer) or self.final or self.buffer[self.pos] == '"'
+            except json.JSONDecodeError:
+                complete = False
+            if complete:
+                self.pos = end
+                if self.pos > 65536:
+                    self.buffer, self.pos = self.buffer[self.pos:], 0
+                return value
+            self.read_more()
+
+    def read_more(self):
+        """Appends the next chunk to the unread text, raising ``IncompleteJSON`` at the end of the stream."""
+        if self.final:
+            raise IncompleteJSON("Stream ended inside the JSON object")
+        more = _next_text(self.chunks, self.text_decoder)
+        self.buffer, self.pos = self.buffer[self.pos:] + more, 0
+        self.final = not more
+
+    def rest(self):
+        """Returns the unread text and the rest of the stream."""
+        return self.buffer[self.pos:] + "".join(iter(lambda: _next_text(self.chunks, self.text_decoder), ""))
+
+
+def _next_text(chunks, text_decoder):
+    """Returns the next non-empty decoded chunk, or an empty string at the end of the stream."""
+    for chunk in chunks:
+        text = text_decoder.decode(chunk)
+        if text:
+            return text
+    return text_decoder.decode(b"", final=True)
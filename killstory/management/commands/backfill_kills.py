@@ -0,0 +1,54 @@
+"""
+Django management command to backfill the killmail history of owned characters.
+
+Unlike ``populate_kills``, which queues Celery tasks, this command does the work
+itself over ``--workers`` processes and prints its throughput and ETA as it goes.
+Characters can be selected by character, corporation or alliance, and killmails
+restricted to a date range.
+"""
+# killstory/management/commands/backfill_kills.py
+
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from killstory.backfill import format_duration, run_backfill, select_character_ids
+
+
+def parse_date(value):
+    """Parses a YYYY-MM-DD argument into midnight UTC of that day."""
+    try:
+        day = datetime.date.fromisoformat(value)
+    except ValueError as e:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD") from e
+    return datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.timezone.utc)
+
+
+class Command(BaseCommand):
+    """Django management command to backfill the killmail history of owned characters."""
+    help = 'Fetch and save the killmail history of owned characters, with live progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--character', type=int, nargs='+', help='Only these character IDs')
+        parser.add_argument('--corporation', type=int, nargs='+', help='Only characters of these corporations')
+        parser.add_argument('--alliance', type=int, nargs='+', help='Only characters of these alliances')
+        parser.add_argument('--since', help='Only killmails on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Only killmails before this date (YYYY-MM-DD)')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes (default: 1)')
+
+    def handle(self, *args, **options):
+        """Main handler for the command execution."""
+        since = parse_date(options['since']) if options['since'] else None
+        until = parse_date(options['until']) if options['until'] else None
+        character_ids = select_character_ids(options['character'], options['corporation'], options['alliance'])
+        if not character_ids:
+            raise CommandError("No owned character matches the selection.")
+
+        self.stdout.write(f"Backfilling {len(character_ids)} characters with {options['workers']} workers")
+        progress = run_backfill(
+            character_ids, workers=options['workers'], since=since, until=until,
+            on_progress=lambda progress: self.stdout.write(progress.line(), ending="\r"),
+        )
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved {progress.saved} killmails ({progress.rows} rows) for {progress.characters} characters "
+            f"in {format_duration(progress.elapsed())}."
+        ))
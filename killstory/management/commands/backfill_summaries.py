@@ -0,0 +1,29 @@
+"""
+Django management command to fill in the denormalized summary columns of stored killmails.
+
+New killmails are summarized as they are saved. This command copies the victim
+and final blow attacker fields onto the killmails saved before the columns
+existed, or onto every killmail with ``--all``.
+"""
+# killstory/management/commands/backfill_summaries.py
+
+from django.core.management.base import BaseCommand
+from killstory.models import Killmail
+from killstory.summary import backfill_summaries
+
+class Command(BaseCommand):
+    """Django management command to fill in the denormalized summary columns of stored killmails."""
+    help = 'Copy the victim and final blow attacker fields onto stored killmails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', help='Summarize every killmail, not only those without a summary'
+        )
+
+    def handle(self, *args, **options):
+        """Main handler for the command execution."""
+        queryset = Killmail.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(attacker_count__isnull=True)
+        updated = backfill_summaries(queryset)
+        self.stdout.write(self.style.SUCCESS(f"Summarized {updated} killmails."))
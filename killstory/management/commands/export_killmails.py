@@ -0,0 +1,61 @@
+"""
+Django management command to export killmails, attackers or items as CSV or Parquet.
+
+Selects killmails with the filters of the search API, e.g. every kill and loss
+of an alliance, and writes one table to a file (or CSV to standard output)
+chunk by chunk, so multi-gigabyte exports run in constant memory. Parquet
+output requires pyarrow.
+"""
+# killstory/management/commands/export_killmails.py
+
+from django.core.management.base import BaseCommand, CommandError
+from killstory.api import ROLES, search_queryset
+from killstory.export import COLUMNS, FORMATS, export_killmails
+
+# Command option -> search parameter
+FILTERS = {
+    'character': 'character_id',
+    'corporation': 'corporation_id',
+    'alliance': 'alliance_id',
+    'role': 'role',
+    'system': 'solar_system_id',
+    'ship_type': 'ship_type_id',
+    'since': 'since',
+    'until': 'until',
+    'min_value': 'min_value',
+}
+
+class Command(BaseCommand):
+    """Django management command to export killmails, attackers or items as CSV or Parquet."""
+    help = 'Export the killmails, attackers or items of the selected killmails as CSV or Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=list(COLUMNS), default='killmails')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help='Output file, standard output for CSV if omitted')
+        parser.add_argument('--character', help='Comma-separated character IDs')
+        parser.add_argument('--corporation', help='Comma-separated corporation IDs')
+        parser.add_argument('--alliance', help='Comma-separated alliance IDs')
+        parser.add_argument('--role', choices=ROLES, default='any', help='Match entities as victim, attacker or any')
+        parser.add_argument('--system', help='Comma-separated solar system IDs')
+        parser.add_argument('--ship-type', help='Comma-separated victim ship type IDs')
+        parser.add_argument('--since', help='Only killmails on or after this ISO 8601 date or time')
+        parser.add_argument('--until', help='Only killmails before this ISO 8601 date or time')
+        parser.add_argument('--min-value', help='Minimum total ISK value')
+
+    def handle(self, *args, **options):
+        """Main handler for the command execution."""
+        if options['format'] == 'parquet' and not options['output']:
+            raise CommandError("Parquet export needs --output.")
+        params = {param: options[option] for option, param in FILTERS.items() if options[option]}
+        try:
+            content = export_killmails(search_queryset(params), options['table'], options['format'])
+            if not options['output']:
+                for part in content:
+                    self.stdout.write(part.decode(), ending='')
+                return
+            with open(options['output'], 'wb') as file:
+                written = sum(file.write(part) for part in content)
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}."))
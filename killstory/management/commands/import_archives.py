@@ -0,0 +1,46 @@
+"""
+Django management command to import killmails from daily archives on local disk.
+
+Reads EVE Ref or zKillboard daily ``.tar.bz2`` killmail archives, parsing them
+over ``--workers`` processes, and saves the killmails involving an owned
+character or their corporation. No ESI request is made.
+"""
+# killstory/management/commands/import_archives.py
+
+import os
+from django.core.management.base import BaseCommand, CommandError
+from killstory.archive import import_archives
+
+
+class Command(BaseCommand):
+    """Django management command to import killmails from daily archives on local disk."""
+    help = 'Import the owned characters\' killmails from local daily .tar.bz2 killmail archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Archive files, or directories of .tar.bz2 archives')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(), help='Parsing processes (default: CPU count)'
+        )
+
+    def handle(self, *args, **options):
+        """Main handler for the command execution."""
+        paths = []
+        for path in options['paths']:
+            if os.path.isdir(path):
+                paths += sorted(
+                    os.path.join(path, name) for name in os.listdir(path) if name.endswith(".tar.bz2")
+                )
+            elif os.path.isfile(path):
+                paths.append(path)
+            else:
+                raise CommandError(f"No such file or directory: {path}")
+
+        read, matched, saved = import_archives(
+            paths, workers=options['workers'],
+            on_archive=lambda path, read, matched: self.stdout.write(
+                f"{os.path.basename(path)}: {matched}/{read} killmails"
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {read} killmails from {len(paths)} archives, {matched} matching, {saved} new saved."
+        ))
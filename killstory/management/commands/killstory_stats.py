@@ -0,0 +1,51 @@
+"""
+Django management command to print the ingestion metrics of the last population run.
+
+The totals are aggregated in the Django cache by every worker taking part in the
+run, so the breakdown covers the whole cluster.
+"""
+# killstory/management/commands/killstory_stats.py
+
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from killstory.metrics import last_run, render_prometheus, run_started
+from killstory.ratelimit import throttle_stats
+
+
+class Command(BaseCommand):
+    """Django management command to print the ingestion metrics of the last population run."""
+    help = "Print the per-stage timings and counters of the last killmail population run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prometheus", action="store_true", help="Print the totals in the Prometheus text format"
+        )
+
+    def handle(self, *args, **options):
+        """Main handler for the command execution."""
+        counters, histograms = last_run()
+        if options["prometheus"]:
+            self.stdout.write(render_prometheus(counters, histograms), ending="")
+            return
+
+        started = run_started()
+        if started is None:
+            self.stdout.write(self.style.WARNING("No population run recorded yet."))
+            return
+        self.stdout.write(f"Run started {datetime.fromtimestamp(started):%Y-%m-%d %H:%M:%S}\n")
+
+        self.stdout.write(f"{'stage':<24}{'count':>10}{'total s':>12}{'mean ms':>10}{'p50 <=':>10}{'p95 <=':>10}")
+        for name, histogram in histograms.items():
+            mean = histogram.sum / histogram.count * 1000 if histogram.count else 0
+            self.stdout.write(
+                f"{name:<24}{histogram.count:>10}{histogram.sum:>12.2f}{mean:>10.1f}"
+                f"{histogram.quantile(0.5):>10}{histogram.quantile(0.95):>10}"
+            )
+
+        self.stdout.write("")
+        for name, value in counters.items():
+            self.stdout.write(f"{name:<24}{value:>10}")
+        throttled = throttle_stats()
+        self.stdout.write(
+            f"{'throttled':<24}{throttled['throttled_count']:>10} pauses, {throttled['throttled_seconds']:.1f}s"
+        )
@@ -0,0 +1,20 @@
+"""
+Django management command to rebuild the per-entity kill and loss statistics.
+
+The statistics are normally kept current as killmails are saved. This command
+recomputes them from the victim and attacker tables, e.g. after importing data
+written before the statistics existed.
+"""
+# killstory/management/commands/rebuild_entity_stats.py
+
+from django.core.management.base import BaseCommand
+from killstory.stats import rebuild_entity_stats
+
+class Command(BaseCommand):
+    """Django management command to rebuild the per-entity kill and loss statistics."""
+    help = 'Rebuild the per-entity kill and loss statistics from the stored killmails'
+
+    def handle(self, *args, **options):
+        """Main handler for the command execution."""
+        rows = rebuild_entity_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} entity statistics rows."))
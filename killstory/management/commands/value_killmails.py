@@ -0,0 +1,32 @@
+"""
+Django management command to compute the ISK value of stored killmails.
+
+New killmails are valued as they are saved. This command values the killmails
+saved while no prices were available, or every killmail with ``--all`` to apply
+the current prices.
+"""
+# killstory/management/commands/value_killmails.py
+
+from django.core.management.base import BaseCommand, CommandError
+from killstory.models import Killmail
+from killstory.pricing import revalue_stored_killmails
+
+class Command(BaseCommand):
+    """Django management command to compute the ISK value of stored killmails."""
+    help = 'Compute the destroyed, dropped and total ISK value of stored killmails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', help='Revalue every killmail, not only those without a value'
+        )
+
+    def handle(self, *args, **options):
+        """Main handler for the command execution."""
+        queryset = Killmail.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(total_value__isnull=True)
+        try:
+            valued = revalue_stored_killmails(queryset)
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        self.stdout.write(self.style.SUCCESS(f"Valued {valued} killmails."))
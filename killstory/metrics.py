@@ -0,0 +1,304 @@
+"""
+Ingestion metrics: counters and latency histograms for each pipeline stage.
+
+Every process records into the in-memory ``metrics`` registry. At the end of
+each killstory Celery task (or explicitly with ``flush()``) the recorded values
+are sent to the sinks listed in ``KILLSTORY_METRICS_SINKS`` and added to the
+totals of the current run in the Django cache, which ``killstory_stats`` prints.
+
+The metric names are a fixed catalog so workers can aggregate them with atomic
+cache increments.
+"""
+# killstory/metrics.py
+
+import os
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from .app_settings import KILLSTORY_METRICS_SINKS
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    "http_requests",
+    "http_retries",
+    "http_errors",
+    "lists_not_modified",
+    "raw_cache_hits",
+    "raw_cache_misses",
+    "killmails_fetched",
+    "killmails_skipped",
+    "rows_killmails",
+    "rows_victims",
+    "rows_attackers",
+    "rows_items",
+    "rows_contained_items",
+)
+HISTOGRAMS = (
+    "http_request_seconds",
+    "list_fetch_seconds",
+    "detail_fetch_seconds",
+    "json_decode_seconds",
+    "save_batch_seconds",
+    "pipeline_wait_seconds",
+)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+CACHE_PREFIX = "killstory:metrics"
+RUN_STARTED_KEY = f"{CACHE_PREFIX}:run_started"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with a running count and sum."""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Records a value."""
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantile(self, q):
+        """Returns the upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """Thread-safe in-process registry of counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears every counter and histogram."""
+        with self._lock:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.histograms = {name: Histogram() for name in HISTOGRAMS}
+
+    def incr(self, name, value=1):
+        """Adds to a counter."""
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name, seconds):
+        """Records a duration into a histogram."""
+        with self._lock:
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timed(self, name):
+        """Records the duration of the block into a histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        """Returns and clears the values recorded since the last snapshot."""
+        with self._lock:
+            counters, histograms = self.counters, self.histograms
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.histograms = {name: Histogram() for name in HISTOGRAMS}
+        return counters, histograms
+
+
+class LoggingSink:
+    """Logs a one-line summary of each flush."""
+
+    def emit(self, counters, histograms):
+        """Logs the non-zero counters and histograms."""
+        parts = [f"{name}={value}" for name, value in counters.items() if value]
+        parts += [
+            f"{name}={histogram.count}x/{histogram.sum:.3f}s"
+            for name, histogram in histograms.items() if histogram.count
+        ]
+        if parts:
+            logger.info("Ingestion metrics: %s", " ".join(parts))
+
+
+class StatsdSink:
+    """Sends counters and timings to a statsd-compatible daemon over UDP."""
+
+    def __init__(self, host="localhost", port=8125, prefix="killstory"):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, counters, histograms):
+        """Sends the non-zero counters and the histograms' counts and mean durations."""
+        lines = [f"{self.prefix}.{name}:{value}|c" for name, value in counters.items() if value]
+        for name, histogram in histograms.items():
+            if histogram.count:
+                # Timings are pre-aggregated per flush: count plus mean duration
+                lines.append(f"{self.prefix}.{name}.count:{histogram.count}|c")
+                lines.append(f"{self.prefix}.{name}:{histogram.sum / histogram.count * 1000:.3f}|ms")
+        for line in lines:
+            try:
+                self.socket.sendto(line.encode(), self.address)
+            except OSError as e:
+                logger.warning("Could not send metrics to statsd: %s", e)
+                return
+
+
+class PrometheusTextSink:
+    """Writes the current run's totals in the Prometheus text format, e.g. for the node_exporter textfile collector."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, counters, histograms):  # pylint: disable=unused-argument
+        """Rewrites the file with the run totals, which already include the values of this flush."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(render_prometheus(*last_run()))
+        os.replace(tmp_path, self.path)
+
+
+def render_prometheus(counters, histograms):
+    """Renders counters and histograms in the Prometheus text exposition format."""
+    lines = []
+    for name, value in counters.items():
+        lines += [f"# TYPE killstory_{name}_total counter", f"killstory_{name}_total {value}"]
+    for name, histogram in histograms.items():
+        lines.append(f"# TYPE killstory_{name} histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.buckets):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else bound
+            lines.append(f'killstory_{name}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"killstory_{name}_sum {histogram.sum:.6f}")
+        lines.append(f"killstory_{name}_count {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def _counter_key(name):
+    """Returns the cache key of a counter's run total."""
+    return f"{CACHE_PREFIX}:counter:{name}"
+
+
+def _histogram_keys(name):
+    """Returns the cache keys of a histogram's run total: count, sum and buckets."""
+    return (
+        f"{CACHE_PREFIX}:hist:{name}:count",
+        f"{CACHE_PREFIX}:hist:{name}:sum_us",
+        [f"{CACHE_PREFIX}:hist:{name}:bucket:{i}" for i in range(len(BUCKETS))],
+    )
+
+
+def _cache_incr(key, value):
+    """Atomically adds a value to a cache key, creating it if needed."""
+    if value and not cache.add(key, value, timeout=None):
+        cache.incr(key, value)
+
+
+def add_to_last_run(counters, histograms):
+    """Adds a snapshot to the run totals kept in the cache."""
+    for name, value in counters.items():
+        _cache_incr(_counter_key(name), value)
+    for name, histogram in histograms.items():
+        if not histogram.count:
+            continue
+        count_key, sum_key, bucket_keys = _histogram_keys(name)
+        _cache_incr(count_key, histogram.count)
+        _cache_incr(sum_key, int(histogram.sum * 1_000_000))
+        for key, count in zip(bucket_keys, histogram.buckets):
+            _cache_incr(key, count)
+
+
+def _all_keys():
+    """Returns every cache key of the run totals."""
+    keys = [_counter_key(name) for name in COUNTERS]
+    for name in HISTOGRAMS:
+        count_key, sum_key, bucket_keys = _histogram_keys(name)
+        keys += [count_key, sum_key, *bucket_keys]
+    return keys
+
+
+def last_run():
+    """Returns the (counters, histograms) totals of the current or last run from the cache."""
+    values = cache.get_many(_all_keys())
+
+    counters = {name: values.get(_counter_key(name), 0) for name in COUNTERS}
+    histograms = {}
+    for name in HISTOGRAMS:
+        count_key, sum_key, bucket_keys = _histogram_keys(name)
+        histogram = Histogram()
+        histogram.count = values.get(count_key, 0)
+        histogram.sum = values.get(sum_key, 0) / 1_000_000
+        histogram.buckets = [values.get(key, 0) for key in bucket_keys]
+        histograms[name] = histogram
+    return counters, histograms
+
+
+def start_run():
+    """Clears the run totals in the cache and records the start of a new run."""
+    cache.delete_many(_all_keys())
+    cache.set(RUN_STARTED_KEY, time.time(), timeout=None)
+
+
+def run_started():
+    """Returns the timestamp the current or last run started at, or None."""
+    return cache.get(RUN_STARTED_KEY)
+
+
+def load_sinks(specs=KILLSTORY_METRICS_SINKS):
+    """Instantiates sinks from dotted paths or (dotted path, kwargs) pairs."""
+    sinks = []
+    for spec in specs:
+        path, kwargs = (spec, {}) if isinstance(spec, str) else spec
+        try:
+            sinks.append(import_string(path)(**kwargs))
+        except (ImportError, TypeError) as e:
+            logger.error("Invalid metrics sink %r: %s", spec, e)
+    return sinks
+
+
+def flush():
+    """Sends the values recorded since the last flush to the sinks and the run totals."""
+    counters, histograms = metrics.snapshot()
+    if not any(counters.values()) and not any(h.count for h in histograms.values()):
+        return
+    try:
+        add_to_last_run(counters, histograms)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Could not store run metrics: %s", e)
+    for sink in _sinks():
+        try:
+            sink.emit(counters, histograms)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Metrics sink %s failed: %s", type(sink).__name__, e)
+
+
+# Sinks of this process, loaded on first use: module state rather than a constant
+_loaded_sinks = None  # pylint: disable=invalid-name
+
+
+def _sinks():
+    """Returns the configured sinks, loaded on first use."""
+    global _loaded_sinks  # pylint: disable=global-statement
+    if _loaded_sinks is None:
+        _loaded_sinks = load_sinks()
+    return _loaded_sinks
+
+
+metrics = Metrics()
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0006_merge'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attacker',
+            index=models.Index(fields=['character_id', 'killmail'], name='kill_att_char_km_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attacker',
+            index=models.Index(fields=['corporation_id', 'killmail'], name='kill_att_corp_km_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attacker',
+            index=models.Index(fields=['alliance_id', 'killmail'], name='kill_att_alli_km_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='killmail',
+            index=models.Index(fields=['-killmail_time', '-killmail_id'], name='kill_km_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='killmail',
+            index=models.Index(fields=['solar_system_id', '-killmail_time'], name='kill_km_system_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='victim',
+            index=models.Index(fields=['character_id', 'killmail'], name='kill_vic_char_km_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='victim',
+            index=models.Index(fields=['corporation_id', 'killmail'], name='kill_vic_corp_km_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='victim',
+            index=models.Index(fields=['alliance_id', 'killmail'], name='kill_vic_alli_km_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0007_add_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CharacterCheckpoint',
+            fields=[
+                ('character_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('last_killmail_id', models.IntegerField(blank=True, null=True)),
+                ('list_fetched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'kill_character_checkpoint',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0008_character_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charactercheckpoint',
+            name='list_etag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='charactercheckpoint',
+            name='list_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0009_checkpoint_list_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('character', 'Character'), ('corporation', 'Corporation'), ('alliance', 'Alliance')], max_length=11)),
+                ('entity_id', models.IntegerField()),
+                ('period', models.DateField()),
+                ('kills', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('damage_done', models.BigIntegerField(default=0)),
+                ('damage_taken', models.BigIntegerField(default=0)),
+                ('final_blows', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'kill_entity_stats',
+                'indexes': [models.Index(fields=['entity_type', 'period', '-kills'], name='kill_stats_period_kills_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='entitystats',
+            constraint=models.UniqueConstraint(fields=('entity_type', 'entity_id', 'period'), name='kill_stats_entity_period_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0010_entity_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='killmail',
+            name='destroyed_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='dropped_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='total_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='killmail',
+            index=models.Index(fields=['-total_value', '-killmail_id'], name='kill_km_value_idx'),
+        ),
+    ]
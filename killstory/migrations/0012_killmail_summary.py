@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0011_killmail_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='killmail',
+            name='attacker_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='final_blow_alliance_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='final_blow_character_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='final_blow_corporation_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='final_blow_ship_type_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='victim_alliance_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='victim_character_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='victim_corporation_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='killmail',
+            name='victim_ship_type_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0012_killmail_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KillmailBlob',
+            fields=[
+                ('killmail', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blob', serialize=False, to='killstory.killmail')),
+                ('data', models.BinaryField()),
+                ('items_expanded', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'kill_killmail_blob',
+            },
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0013_killmail_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='killmail',
+            index=models.Index(fields=['victim_ship_type_id', '-killmail_time'], name='kill_km_ship_time_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('killstory', '0014_killmail_ship_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityName',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('category', models.CharField(max_length=32)),
+                ('name', models.CharField(max_length=255)),
+            ],
+            options={
+                'db_table': 'kill_entity_name',
+            },
+        ),
+    ]
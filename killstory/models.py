@@ -23,8 +23,33 @@ class Killmail(models.Model):
     position_y = models.FloatField(null=True, blank=True)
     position_z = models.FloatField(null=True, blank=True)
 
+    # ISK value of the victim's ship and items, None until valued
+    destroyed_value = models.FloatField(null=True, blank=True)
+    dropped_value = models.FloatField(null=True, blank=True)
+    total_value = models.FloatField(null=True, blank=True)
+
+    # Copies of the victim and final blow attacker fields shown on list pages, None until summarized
+    victim_ship_type_id = models.IntegerField(null=True, blank=True)
+    victim_character_id = models.IntegerField(null=True, blank=True)
+    victim_corporation_id = models.IntegerField(null=True, blank=True)
+    victim_alliance_id = models.IntegerField(null=True, blank=True)
+    final_blow_ship_type_id = models.IntegerField(null=True, blank=True)
+    final_blow_character_id = models.IntegerField(null=True, blank=True)
+    final_blow_corporation_id = models.IntegerField(null=True, blank=True)
+    final_blow_alliance_id = models.IntegerField(null=True, blank=True)
+    attacker_count = models.PositiveIntegerField(null=True, blank=True)
+
     class Meta:
         db_table = "kill_killmail"
+        indexes = [
+            # Newest first listings and keyset pagination
+            models.Index(fields=["-killmail_time", "-killmail_id"], name="kill_km_time_id_idx"),
+            models.Index(fields=["solar_system_id", "-killmail_time"], name="kill_km_system_time_idx"),
+            # Most valuable kills first
+            models.Index(fields=["-total_value", "-killmail_id"], name="kill_km_value_idx"),
+            # Losses of a ship type, newest first
+            models.Index(fields=["victim_ship_type_id", "-killmail_time"], name="kill_km_ship_time_idx"),
+        ]
 
     def __str__(self):
         return f"Killmail {self.killmail_id}"
@@ -46,6 +71,12 @@ class Victim(models.Model):
 
     class Meta:
         db_table = "kill_victim"
+        indexes = [
+            # Kills and losses of an entity, joined back to the killmail
+            models.Index(fields=["character_id", "killmail"], name="kill_vic_char_km_idx"),
+            models.Index(fields=["corporation_id", "killmail"], name="kill_vic_corp_km_idx"),
+            models.Index(fields=["alliance_id", "killmail"], name="kill_vic_alli_km_idx"),
+        ]
 
     def __str__(self):
         return f"Victim {self.character_id} in Killmail {self.killmail.killmail_id}"
@@ -70,6 +101,12 @@ class Attacker(models.Model):
 
     class Meta:
         db_table = "kill_attacker"
+        indexes = [
+            # Kills and losses of an entity, joined back to the killmail
+            models.Index(fields=["character_id", "killmail"], name="kill_att_char_km_idx"),
+            models.Index(fields=["corporation_id", "killmail"], name="kill_att_corp_km_idx"),
+            models.Index(fields=["alliance_id", "killmail"], name="kill_att_alli_km_idx"),
+        ]
 
     def __str__(self):
         return f"Attacker {self.character_id} for Killmail {self.killmail.killmail_id}"
@@ -113,3 +150,92 @@ class VictimContainedItem(models.Model):
         return (
             f"ContainedItem {self.item_type_id} in Item {self.parent_item.item_type_id}"
         )
+
+
+# Table for the raw data of killmails saved in compact storage mode
+class KillmailBlob(models.Model):
+    """Model for storing the compressed raw ESI data of a killmail whose items are expanded on demand."""
+
+    killmail = models.OneToOneField(
+        Killmail, on_delete=models.CASCADE, primary_key=True, related_name="blob"
+    )
+    data = models.BinaryField()
+    items_expanded = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = "kill_killmail_blob"
+
+    def __str__(self):
+        return f"Blob of Killmail {self.killmail_id}"
+
+
+# Table to store the ingestion progress of each character
+class CharacterCheckpoint(models.Model):
+    """Model for storing how far the killmails of a character have been ingested."""
+
+    character_id = models.IntegerField(primary_key=True)
+    # Every listed kill up to this ID is stored
+    last_killmail_id = models.IntegerField(null=True, blank=True)
+    list_fetched_at = models.DateTimeField(null=True, blank=True)
+    # Validators of the last list response, sent back as conditional request headers
+    list_etag = models.CharField(max_length=255, blank=True, default="")
+    list_last_modified = models.CharField(max_length=64, blank=True, default="")
+
+    class Meta:
+        db_table = "kill_character_checkpoint"
+
+    def __str__(self):
+        return f"Checkpoint for Character {self.character_id}"
+
+
+# Table for the monthly kill and loss statistics of characters, corporations and alliances
+class EntityStats(models.Model):
+    """Model for storing the kills, losses, damage and final blows of an entity over one month."""
+
+    CHARACTER = "character"
+    CORPORATION = "corporation"
+    ALLIANCE = "alliance"
+    ENTITY_TYPES = [
+        (CHARACTER, "Character"),
+        (CORPORATION, "Corporation"),
+        (ALLIANCE, "Alliance"),
+    ]
+
+    entity_type = models.CharField(max_length=11, choices=ENTITY_TYPES)
+    entity_id = models.IntegerField()
+    period = models.DateField()  # First day of the month
+    kills = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    damage_done = models.BigIntegerField(default=0)
+    damage_taken = models.BigIntegerField(default=0)
+    final_blows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "kill_entity_stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["entity_type", "entity_id", "period"], name="kill_stats_entity_period_uniq"
+            ),
+        ]
+        indexes = [
+            # Leaderboards of one entity type over a month
+            models.Index(fields=["entity_type", "period", "-kills"], name="kill_stats_period_kills_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.entity_type} {self.entity_id} in {self.period:%Y-%m}"
+
+
+# Table for the names of the types, systems and entities referenced by killmails
+class EntityName(models.Model):
+    """Model for storing the name of an EVE ID as resolved by ESI, with its category."""
+
+    id = models.BigIntegerField(primary_key=True)
+    category = models.CharField(max_length=32)  # ESI category, e.g. "solar_system", "inventory_type"
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = "kill_entity_name"
+
+    def __str__(self):
+        return f"{self.category} {self.id}: {self.name}"
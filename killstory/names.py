@@ -0,0 +1,196 @@
+"""
+Name resolution for the type, system and entity IDs shown on pages.
+
+``name_resolver.resolve(ids)`` returns the names of every ID of a page at once,
+looking them up in an in-process LRU, then the shared Django cache, then the
+``EntityName`` table, and only then in one ESI ``/universe/names/`` request. The
+table is warmed in the background with the IDs of each saved batch, so pages
+rarely need ESI at all. A page makes a single ESI attempt without waiting for
+the rate limiter, and the IDs it could not resolve are not asked again for
+``KILLSTORY_NAMES_MISSING_TIMEOUT`` seconds.
+"""
+# killstory/names.py
+
+import logging
+import threading
+from collections import OrderedDict
+from django.core.cache import cache
+from .client import make_request, try_request
+from .models import EntityName
+from .app_settings import (
+    KILLSTORY_API_NAMES_ENDPOINT, KILLSTORY_NAMES_CACHE_TIMEOUT, KILLSTORY_NAMES_LRU_SIZE,
+    KILLSTORY_NAMES_MISSING_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "killstory:name"
+
+# IDs per ESI request, the most /universe/names/ accepts
+ESI_CHUNK_SIZE = 1000
+
+# Seconds a page waits for ESI before showing the raw IDs
+REQUEST_TIMEOUT = 2
+
+# Cached in place of a name for IDs a page could not resolve
+MISSING = ""
+
+# IDs per ``id__in`` query on the name table
+QUERY_CHUNK_SIZE = 900
+
+
+def _cache_key(entity_id):
+    return f"{CACHE_PREFIX}:{entity_id}"
+
+
+def chunks_of(values, size):
+    """Returns the values as lists of at most size values."""
+    values = list(values)
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def fetch_names(ids, background=False):
+    """Returns {id: (category, name)} from ESI ``/universe/names/``.
+
+    ESI rejects a whole request when one ID is invalid. In the ``background`` the
+    requests wait for the rate limiter and are retried, and rejected requests are
+    split in halves until the invalid IDs are isolated. Otherwise each chunk gets
+    a single attempt that gives up rather than wait.
+    """
+    if not KILLSTORY_API_NAMES_ENDPOINT:
+        return {}
+    found = {}
+    for chunk in chunks_of(ids, ESI_CHUNK_SIZE):
+        if background:
+            response = make_request(KILLSTORY_API_NAMES_ENDPOINT, json=chunk)
+        else:
+            response = try_request(KILLSTORY_API_NAMES_ENDPOINT, json=chunk, timeout=REQUEST_TIMEOUT)
+        if response:
+            found.update((entry['id'], (entry['category'], entry['name'])) for entry in response.json())
+        elif background and len(chunk) > 1:
+            middle = len(chunk) // 2
+            found.update(fetch_names(chunk[:middle], background=True))
+            found.update(fetch_names(chunk[middle:], background=True))
+    return found
+
+
+def unknown_ids(ids):
+    """Returns the IDs that have no row in the name table."""
+    ids = set(ids)
+    for chunk in chunks_of(ids, QUERY_CHUNK_SIZE):
+        ids.difference_update(EntityName.objects.filter(id__in=chunk).values_list('id', flat=True))
+    return ids
+
+
+def store_names(found):
+    """Saves {id: (category, name)} into the name table."""
+    EntityName.objects.bulk_create(
+        [EntityName(id=entity_id, category=category, name=name) for entity_id, (category, name) in found.items()],
+        ignore_conflicts=True,
+    )
+
+
+class NameResolver:
+    """Resolves IDs to names through an in-process LRU, the Django cache, the name table and ESI."""
+
+    def __init__(
+        self, lru_size=KILLSTORY_NAMES_LRU_SIZE, cache_timeout=KILLSTORY_NAMES_CACHE_TIMEOUT,
+        missing_timeout=KILLSTORY_NAMES_MISSING_TIMEOUT
+    ):
+        self.lru_size = lru_size
+        self.cache_timeout = cache_timeout
+        self.missing_timeout = missing_timeout
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, ids, fetch_missing=True, background=False):
+        """Returns an {id: name} dict of the IDs that could be resolved, None IDs are ignored.
+
+        Each layer is asked once for all the IDs the previous layers missed, so a
+        page costs at most one cache request, one query per 900 IDs and one ESI
+        request per 1000 IDs. ESI is skipped when ``fetch_missing`` is false, and
+        for IDs it recently failed to resolve unless resolving in the ``background``.
+        """
+        ids = {int(entity_id) for entity_id in ids if entity_id is not None}
+        names = {}
+        with self._lock:
+            for entity_id in ids:
+                if entity_id in self._lru:
+                    self._lru.move_to_end(entity_id)
+                    names[entity_id] = self._lru[entity_id]
+        missing = ids - names.keys()
+        if not missing:
+            return names
+
+        cached = cache.get_many([_cache_key(entity_id) for entity_id in missing])
+        from_cache = {
+            entity_id: cached[_cache_key(entity_id)] for entity_id in missing if _cache_key(entity_id) in cached
+        }
+        known_missing = {entity_id for entity_id, name in from_cache.items() if name == MISSING}
+        from_cache = {entity_id: name for entity_id, name in from_cache.items() if name != MISSING}
+        missing -= from_cache.keys()
+        if not background:
+            missing -= known_missing
+
+        from_table = {}
+        for chunk in chunks_of(missing, QUERY_CHUNK_SIZE):
+            from_table.update(EntityName.objects.filter(id__in=chunk).values_list('id', 'name'))
+        missing -= from_table.keys()
+
+        from_esi = {}
+        if missing and fetch_missing:
+            found = fetch_names(sorted(missing), background=background)
+            store_names(found)
+            from_esi = {entity_id: name for entity_id, (_, name) in found.items()}
+            cache.set_many(
+                {_cache_key(entity_id): MISSING for entity_id in missing - from_esi.keys()},
+                timeout=self.missing_timeout
+            )
+
+        shared = {**from_table, **from_esi}
+        if shared:
+            cache.set_many(
+                {_cache_key(entity_id): name for entity_id, name in shared.items()}, timeout=self.cache_timeout
+            )
+        found = {**from_cache, **shared}
+        self._remember(found)
+        names.update(found)
+        return names
+
+    def _remember(self, names):
+        with self._lock:
+            self._lru.update(names)
+            for entity_id in names:
+                self._lru.move_to_end(entity_id)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def clear(self):
+        """Empties the in-process LRU."""
+        with self._lock:
+            self._lru.clear()
+
+
+def killmail_name_ids(killmail_data):
+    """Yields every nameable ID of a raw killmail: system, entities, ships, weapons and items."""
+    yield killmail_data.get('solar_system_id')
+    victim_data = killmail_data.get('victim') or {}
+    for participant in (victim_data, *killmail_data.get('attackers', [])):
+        for field in ('character_id', 'corporation_id', 'alliance_id', 'faction_id', 'ship_type_id', 'weapon_type_id'):
+            yield participant.get(field)
+    items = list(victim_data.get('items', []))
+    while items:
+        item_data = items.pop()
+        yield item_data.get('item_type_id')
+        items.extend(item_data.get('items', []))
+
+
+def batch_name_ids(batch):
+    """Returns the nameable IDs of (Killmail, raw dict) pairs."""
+    return {
+        entity_id for _, killmail_data in batch for entity_id in killmail_name_ids(killmail_data)
+        if entity_id is not None
+    }
+
+
+name_resolver = NameResolver()
@@ -0,0 +1,68 @@
+"""
+Keyset pagination over (killmail_time, killmail_id).
+
+Pages are ordered newest first and a cursor encodes the last row of the
+previous page, so fetching any page is an index range scan of the same cost
+however deep it is, unlike ``OFFSET``.
+"""
+# killstory/pagination.py
+
+from datetime import datetime, timedelta, timezone
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(killmail_time, killmail_id):
+    """Encodes a (killmail_time, killmail_id) position as an opaque cursor string."""
+    return f"{(killmail_time - EPOCH) // ONE_MICROSECOND}_{killmail_id}"
+
+
+def decode_cursor(cursor):
+    """Decodes a cursor string, returns None when it is missing or malformed."""
+    try:
+        microseconds, killmail_id = cursor.split("_")
+        return EPOCH + timedelta(microseconds=int(microseconds)), int(killmail_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def keyset_page(queryset, cursor, page_size, time_field="killmail_time", id_field="killmail_id"):
+    """Returns (rows, next_cursor) for the page after the cursor, newest first.
+
+    Rows may be model instances or ``.values()`` dicts. ``next_cursor`` is None on the last page.
+    """
+    rows = list(keyset_slice(queryset, cursor, page_size, time_field, id_field))
+    return split_page(rows, page_size, time_field, id_field)
+
+
+async def akeyset_page(queryset, cursor, page_size, time_field="killmail_time", id_field="killmail_id"):
+    """Async version of ``keyset_page``."""
+    rows = [row async for row in keyset_slice(queryset, cursor, page_size, time_field, id_field)]
+    return split_page(rows, page_size, time_field, id_field)
+
+
+def keyset_slice(queryset, cursor, page_size, time_field="killmail_time", id_field="killmail_id"):
+    """Returns the queryset of the page after the cursor, with one extra row telling whether more follow."""
+    queryset = queryset.order_by(f"-{time_field}", f"-{id_field}")
+    position = decode_cursor(cursor)
+    if position:
+        killmail_time, killmail_id = position
+        queryset = queryset.filter(
+            Q(**{f"{time_field}__lt": killmail_time})
+            | Q(**{time_field: killmail_time, f"{id_field}__lt": killmail_id})
+        )
+    return queryset[:page_size + 1]
+
+
+def split_page(rows, page_size, time_field="killmail_time", id_field="killmail_id"):
+    """Returns (rows, next_cursor) from the rows of ``keyset_slice``."""
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(last[time_field], last[id_field])
+    return rows, encode_cursor(getattr(last, time_field), getattr(last, id_field))
@@ -0,0 +1,188 @@
+"""
+Memory-bounded fetch/save pipeline.
+
+A producer thread fetches and parses killmail details while the calling thread
+saves them, the two stages joined by a queue of at most
+``KILLSTORY_PIPELINE_QUEUE_SIZE`` killmails. The (kill_id, hash) pairs are read
+lazily by the calling thread and handed to the producer through a queue of the
+same bound, so a kill list is never held in full either. When the database falls behind the
+queue fills up and the producer blocks, which in turn stops new detail requests
+from being submitted. Batches are flushed once they reach
+``KILLSTORY_BATCH_MAX_ROWS`` rows or ``KILLSTORY_BATCH_MAX_BYTES`` bytes of raw
+JSON, so at most ``queue size + 2 * KILLSTORY_FETCH_CONCURRENCY`` killmails plus
+one batch are held in memory, however many characters and kills are processed.
+"""
+# killstory/pipeline.py
+
+import json
+import queue
+import threading
+from .client import fetch_concurrently
+from .metrics import metrics
+from .app_settings import (
+    KILLSTORY_BATCH_MAX_BYTES, KILLSTORY_BATCH_MAX_ROWS, KILLSTORY_FETCH_CONCURRENCY,
+    KILLSTORY_PIPELINE_QUEUE_SIZE
+)
+
+# Seconds between checks of the stop flag while the producer waits for room
+PUT_TIMEOUT = 0.1
+
+_DONE = object()
+
+
+def killmail_rows(killmail_data):
+    """Returns the rows a killmail is written as: killmail, victim, attackers, items and contained items."""
+    def count_items(items):
+        return sum(1 + count_items(item.get('items', [])) for item in items)
+
+    victim_data = killmail_data.get('victim') or {}
+    return (
+        1 + bool(victim_data) + len(killmail_data.get('attackers', []))
+        + count_items(victim_data.get('items', []))
+    )
+
+
+def killmail_bytes(killmail_data):
+    """Returns the size of a killmail's raw JSON."""
+    return len(json.dumps(killmail_data, separators=(',', ':')))
+
+
+class SavePipeline:  # pylint: disable=too-many-instance-attributes
+    """Fetches killmails in a producer thread and saves them in the calling thread in bounded batches.
+
+    Besides its stages and bounds, the pipeline keeps the counters callers read
+    once it has run and the batch being filled.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, fetch, save, max_rows=KILLSTORY_BATCH_MAX_ROWS, max_bytes=KILLSTORY_BATCH_MAX_BYTES,
+        queue_size=KILLSTORY_PIPELINE_QUEUE_SIZE, max_workers=KILLSTORY_FETCH_CONCURRENCY
+    ):
+        self.fetch = fetch
+        self.save = save
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.queue_size = queue_size
+        self.max_workers = max_workers
+        self.fetched = 0
+        self.saved = 0
+        self.skipped = 0
+        self.batches = 0
+        self.peak_queued = 0
+        self._batch, self._rows, self._size = [], 0, 0
+
+    def run(self, killmails, build):
+        """Fetches the (kill_id, hash) pairs and saves ``build(killmail_data)`` items, returns the killmails fetched.
+
+        The pairs are iterated in the calling thread, so iterating them may query the
+        database, and handed to the producer through a queue of the same bound.
+        Empty fetch results are skipped.
+        """
+        pending = queue.Queue(maxsize=self.queue_size)
+        fetched = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(pending, fetched, stop), name="killstory-pipeline", daemon=True
+        )
+        self._batch, self._rows, self._size = [], 0, 0
+        producer.start()
+        try:
+            for pair in killmails:
+                self._feed(pending, pair, fetched, build)
+            self._feed(pending, _DONE, fetched, build)
+            while self._take(fetched, build):
+                pass
+            if self._batch:
+                self._flush(self._batch)
+        finally:
+            stop.set()
+            # Unblocks a producer waiting for room after a failed save
+            while producer.is_alive():
+                try:
+                    fetched.get(timeout=PUT_TIMEOUT)
+                except queue.Empty:
+                    pass
+            producer.join()
+        return self.fetched
+
+    def _produce(self, pending, fetched, stop):
+        """Producer stage: fetches the details and queues them, blocking while the queue is full."""
+        try:
+            for killmail_data in fetch_concurrently(self.fetch, self._iter_pending(pending, stop), self.max_workers):
+                if not killmail_data:
+                    continue
+                with metrics.timed("pipeline_wait_seconds"):
+                    while not stop.is_set():
+                        try:
+                            fetched.put(killmail_data, timeout=PUT_TIMEOUT)
+                            break
+                        except queue.Full:
+                            pass
+                if stop.is_set():
+                    return
+            self._put_last(fetched, stop, _DONE)
+        except Exception as e:  # pylint: disable=broad-except
+            self._put_last(fetched, stop, e)
+
+    @staticmethod
+    def _iter_pending(pending, stop):
+        """Yields the pairs handed to the producer until the end-of-stream marker."""
+        while not stop.is_set():
+            try:
+                pair = pending.get(timeout=PUT_TIMEOUT)
+            except queue.Empty:
+                continue
+            if pair is _DONE:
+                return
+            yield pair
+
+    @staticmethod
+    def _put_last(fetched, stop, item):
+        """Queues the end-of-stream marker or the producer's exception."""
+        while not stop.is_set():
+            try:
+                fetched.put(item, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def _feed(self, pending, pair, fetched, build):
+        """Hands a pair to the producer, saving the queued killmails while it waits for room."""
+        while True:
+            try:
+                pending.put(pair, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                while True:
+                    try:
+                        self._take(fetched, build, block=False)
+                    except queue.Empty:
+                        break
+
+    def _take(self, fetched, build, block=True):
+        """Consumer stage: adds the next queued killmail to the batch, flushing by row count and byte size.
+
+        Returns False at the end-of-stream marker, raises ``queue.Empty`` when not
+        blocking and nothing is queued.
+        """
+        self.peak_queued = max(self.peak_queued, fetched.qsize())
+        killmail_data = fetched.get(block)
+        if killmail_data is _DONE:
+            return False
+        if isinstance(killmail_data, Exception):
+            raise killmail_data
+        self.fetched += 1
+        self._batch.append(build(killmail_data))
+        self._rows += killmail_rows(killmail_data)
+        self._size += killmail_bytes(killmail_data)
+        if self._rows >= self.max_rows or self._size >= self.max_bytes:
+            self._flush(self._batch)
+            self._batch, self._rows, self._size = [], 0, 0
+        return True
+
+    def _flush(self, batch):
+        """Saves a batch and adds its counts to the totals."""
+        counts = self.save(batch)
+        self.saved += counts['killmails']
+        self.skipped += counts.get('skipped', 0)
+        self.batches += 1
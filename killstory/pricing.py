@@ -0,0 +1,232 @@
+"""
+ISK valuation of killmails.
+
+A type ID -> price table is loaded from the provider configured in
+``KILLSTORY_PRICE_PROVIDER`` (ESI market prices by default, or a local file)
+and kept in memory, reloaded once it is older than
+``KILLSTORY_PRICE_REFRESH_INTERVAL``. The writer values each batch before it is
+inserted and stores the destroyed, dropped and total value on ``Killmail``.
+"""
+# killstory/pricing.py
+
+import csv
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from itertools import islice
+from django.utils.module_loading import import_string
+from .client import make_request
+from .models import Killmail, KillmailBlob, Victim, VictimItem, VictimContainedItem
+from .compact import decode_killmail
+from .app_settings import (
+    KILLSTORY_PRICE_PROVIDER, KILLSTORY_PRICE_REFRESH_INTERVAL, KILLSTORY_API_PRICES_ENDPOINT
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a failed price load is retried
+RETRY_INTERVAL = 300
+
+# Item singleton value of blueprint copies, which have no market price
+BLUEPRINT_COPY = 2
+
+VALUE_FIELDS = ('destroyed_value', 'dropped_value', 'total_value')
+
+
+class EsiPriceProvider:
+    """Loads the average market price of every type from ESI."""
+
+    def __init__(self, url=KILLSTORY_API_PRICES_ENDPOINT):
+        self.url = url
+
+    def load(self):
+        """Returns the type ID -> price dict of ESI ``/markets/prices/``."""
+        response = make_request(self.url)
+        if not response:
+            raise ValueError(f"No prices returned by {self.url}")
+        return parse_prices(response.json())
+
+
+class FilePriceProvider:
+    """Loads prices from a JSON file, or a CSV file with type_id and price columns."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Returns the type ID -> price dict of the file."""
+        with open(self.path, encoding="utf-8", newline="") as file:
+            if self.path.endswith(".csv"):
+                return {int(row["type_id"]): float(row["price"]) for row in csv.DictReader(file)}
+            return parse_prices(json.load(file))
+
+
+def parse_prices(data):
+    """Returns a type ID -> price dict from a mapping or from ESI ``/markets/prices/`` entries."""
+    if isinstance(data, dict):
+        return {int(type_id): float(price) for type_id, price in data.items()}
+    prices = {}
+    for entry in data:
+        price = entry.get("average_price", entry.get("adjusted_price"))
+        if price is not None:
+            prices[int(entry["type_id"])] = float(price)
+    return prices
+
+
+class PriceTable:
+    """In-memory type price table, reloaded from its provider when stale."""
+
+    def __init__(self, provider, refresh_interval=KILLSTORY_PRICE_REFRESH_INTERVAL, clock=time.monotonic):
+        self.provider = provider
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._prices = None
+        self._next_refresh = 0
+        self._lock = threading.Lock()
+
+    def prices(self):
+        """Returns the current type ID -> price dict, or None when no prices could be loaded yet."""
+        # One thread reloads a stale table while the others keep using it, which takes a
+        # non-blocking acquire that a with statement cannot express
+        stale = self.clock() >= self._next_refresh
+        if stale and self._lock.acquire(blocking=self._prices is None):  # pylint: disable=consider-using-with
+            try:
+                if self.clock() >= self._next_refresh:
+                    self.refresh()
+            finally:
+                self._lock.release()
+        return self._prices
+
+    def refresh(self):
+        """Reloads the prices, keeping the previous table if the provider fails."""
+        try:
+            self._prices = self.provider.load()
+            self._next_refresh = self.clock() + self.refresh_interval
+            logger.info("Loaded %d type prices", len(self._prices))
+        except Exception as e:  # pylint: disable=broad-except
+            self._next_refresh = self.clock() + min(RETRY_INTERVAL, self.refresh_interval)
+            logger.warning("Could not load type prices: %s", e)
+
+
+def victim_values(prices, ship_type_id, items):
+    """Returns the (destroyed, dropped) ISK value of a victim's ship and items.
+
+    ``items`` are (item_type_id, quantity_destroyed, quantity_dropped, singleton)
+    tuples for the items and contained items alike.
+    """
+    destroyed = prices.get(ship_type_id, 0.0)
+    dropped = 0.0
+    for type_id, quantity_destroyed, quantity_dropped, singleton in items:
+        if singleton == BLUEPRINT_COPY:
+            continue
+        price = prices.get(type_id, 0.0)
+        destroyed += price * (quantity_destroyed or 0)
+        dropped += price * (quantity_dropped or 0)
+    return destroyed, dropped
+
+
+def iter_item_quantities(items_data):
+    """Yields the quantities tuple of every item and contained item in ESI item dicts."""
+    for item_data in items_data:
+        yield (
+            item_data['item_type_id'], item_data.get('quantity_destroyed'),
+            item_data.get('quantity_dropped'), item_data.get('singleton')
+        )
+        yield from iter_item_quantities(item_data.get('items', []))
+
+
+def value_killmails(pairs, table=None):
+    """Sets the destroyed, dropped and total value of each Killmail of (Killmail, raw dict) pairs.
+
+    The values are left unset when no price table is available.
+    """
+    table = get_price_table() if table is None else table
+    prices = table.prices() if table else None
+    if prices is None:
+        return
+    for killmail, killmail_data in pairs:
+        victim_data = killmail_data.get('victim')
+        if not victim_data:
+            continue
+        set_values(killmail, *victim_values(
+            prices, victim_data['ship_type_id'], iter_item_quantities(victim_data.get('items', []))
+        ))
+
+
+def set_values(killmail, destroyed, dropped):
+    """Sets the value fields of a Killmail."""
+    killmail.destroyed_value = destroyed
+    killmail.dropped_value = dropped
+    killmail.total_value = destroyed + dropped
+
+
+# Price table of this process, created on first use: module state rather than a constant
+_price_table = None  # pylint: disable=invalid-name
+_price_table_lock = threading.Lock()
+
+
+def get_price_table():
+    """Returns the process-wide price table of the configured provider, or None when pricing is disabled."""
+    global _price_table  # pylint: disable=global-statement
+    if not KILLSTORY_PRICE_PROVIDER:
+        return None
+    with _price_table_lock:
+        if _price_table is None:
+            path, kwargs = (
+                (KILLSTORY_PRICE_PROVIDER, {}) if isinstance(KILLSTORY_PRICE_PROVIDER, str)
+                else KILLSTORY_PRICE_PROVIDER
+            )
+            _price_table = PriceTable(import_string(path)(**kwargs))
+        return _price_table
+
+
+def revalue_stored_killmails(queryset, batch_size=500, table=None):
+    """Recomputes the values of stored killmails from their victim and item rows, returns the killmails valued."""
+    table = get_price_table() if table is None else table
+    prices = table.prices() if table else None
+    if prices is None:
+        raise ValueError("No type prices available")
+
+    valued = 0
+    kill_ids = queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    while True:
+        chunk = list(islice(kill_ids, batch_size))
+        if not chunk:
+            return valued
+        valued += revalue_chunk(prices, chunk)
+
+
+def revalue_chunk(prices, kill_ids):
+    """Recomputes and saves the values of a chunk of stored killmails, returns the killmails valued."""
+    ships = dict(Victim.objects.filter(killmail_id__in=kill_ids).values_list('killmail_id', 'ship_type_id'))
+    items = stored_item_quantities(kill_ids)
+    killmails = []
+    for kill_id, ship_type_id in ships.items():
+        killmail = Killmail(pk=kill_id)
+        set_values(killmail, *victim_values(prices, ship_type_id, items[kill_id]))
+        killmails.append(killmail)
+    Killmail.objects.bulk_update(killmails, VALUE_FIELDS)
+    return len(killmails)
+
+
+def stored_item_quantities(kill_ids):
+    """Returns the quantities tuples of the items and contained items of stored killmails, by killmail ID."""
+    items = defaultdict(list)
+    quantities = ('item_type_id', 'quantity_destroyed', 'quantity_dropped', 'singleton')
+    for kill_id, *quantity in VictimItem.objects.filter(victim__killmail_id__in=kill_ids).values_list(
+        'victim__killmail_id', *quantities
+    ):
+        items[kill_id].append(quantity)
+    for kill_id, *quantity in VictimContainedItem.objects.filter(
+        parent_item__victim__killmail_id__in=kill_ids
+    ).values_list('parent_item__victim__killmail_id', *quantities):
+        items[kill_id].append(quantity)
+    # Killmails saved in compact mode have no item rows until expanded
+    for kill_id, data in KillmailBlob.objects.filter(
+        killmail_id__in=kill_ids, items_expanded=False
+    ).values_list('killmail_id', 'data'):
+        victim_data = decode_killmail(data).get('victim', {})
+        items[kill_id] = list(iter_item_quantities(victim_data.get('items', [])))
+    return items
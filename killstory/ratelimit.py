@@ -0,0 +1,124 @@
+"""
+Request pacing shared by every worker through the Django cache.
+
+Each second is a bucket of ``KILLSTORY_ESI_RATE_LIMIT`` tokens counted with an
+atomic cache ``incr``, so all processes and nodes draw from the same bucket.
+ESI's ``X-Esi-Error-Limit-Remain``/``X-Esi-Error-Limit-Reset`` headers are stored
+in the cache too: the bucket shrinks as the error budget runs low, and every
+worker pauses until the reset once it falls to ``KILLSTORY_ESI_ERROR_LIMIT_THRESHOLD``.
+"""
+# killstory/ratelimit.py
+
+import time
+import logging
+from django.core.cache import cache
+from .app_settings import (
+    KILLSTORY_ESI_RATE_LIMIT, KILLSTORY_ESI_ERROR_LIMIT_THRESHOLD,
+    KILLSTORY_ESI_ERROR_LIMIT_SLOWDOWN
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "killstory:esi"
+ERROR_LIMIT_KEY = f"{CACHE_PREFIX}:error_limit"
+THROTTLED_MS_KEY = f"{CACHE_PREFIX}:throttled_ms"
+THROTTLED_COUNT_KEY = f"{CACHE_PREFIX}:throttled_count"
+
+
+class EsiRateLimiter:
+    """Cluster-wide token bucket and error budget guard for outgoing requests."""
+
+    def __init__(
+        self,
+        rate=KILLSTORY_ESI_RATE_LIMIT,
+        error_threshold=KILLSTORY_ESI_ERROR_LIMIT_THRESHOLD,
+        error_slowdown=KILLSTORY_ESI_ERROR_LIMIT_SLOWDOWN,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        self.rate = rate
+        self.error_threshold = error_threshold
+        self.error_slowdown = error_slowdown
+        self.clock = clock
+        self.sleep = sleep
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            remain, reset_at = self.error_limit()
+            now = self.clock()
+            if remain is not None and remain <= self.error_threshold and reset_at > now:
+                logger.warning(
+                    "ESI error limit at %d, pausing all requests for %.1fs", remain, reset_at - now
+                )
+                self.throttle(reset_at - now)
+                continue
+            if not self.rate:
+                return
+            window = int(now)
+            if self.take_token(window) <= self.bucket_size(remain):
+                return
+            self.throttle(window + 1 - now)
+
+    def try_acquire(self):
+        """Takes a token if a request may be sent now, returns False instead of waiting."""
+        remain, reset_at = self.error_limit()
+        now = self.clock()
+        if remain is not None and remain <= self.error_threshold and reset_at > now:
+            return False
+        return not self.rate or self.take_token(int(now)) <= self.bucket_size(remain)
+
+    def bucket_size(self, remain):
+        """Returns the tokens per second, scaled down while the error budget is low."""
+        if remain is None or remain >= self.error_slowdown:
+            return self.rate
+        return max(int(self.rate * remain / self.error_slowdown), 1)
+
+    def take_token(self, window):
+        """Counts a request in the bucket of the given second and returns the count so far."""
+        key = f"{CACHE_PREFIX}:bucket:{window}"
+        cache.add(key, 0, timeout=5)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=5)
+            return 1
+
+    def update(self, response):
+        """Stores the error budget reported by an ESI response for every worker to see."""
+        remain = response.headers.get("X-Esi-Error-Limit-Remain")
+        reset = response.headers.get("X-Esi-Error-Limit-Reset")
+        if response.status_code == 420:
+            remain = 0
+        if remain is None or reset is None:
+            return
+        reset = int(reset)
+        cache.set(ERROR_LIMIT_KEY, (int(remain), self.clock() + reset), timeout=reset + 1)
+
+    def error_limit(self):
+        """Returns the last known (remaining errors, reset timestamp), or (None, None)."""
+        return cache.get(ERROR_LIMIT_KEY) or (None, None)
+
+    def throttle(self, seconds):
+        """Sleeps and adds the time to the shared throttling counters."""
+        seconds = max(seconds, 0)
+        self.sleep(seconds)
+        for key, value in ((THROTTLED_MS_KEY, int(seconds * 1000)), (THROTTLED_COUNT_KEY, 1)):
+            if not cache.add(key, value, timeout=None):
+                cache.incr(key, value)
+
+
+def throttle_stats():
+    """Returns the total time spent throttled by all workers and the number of pauses."""
+    return {
+        "throttled_seconds": (cache.get(THROTTLED_MS_KEY) or 0) / 1000,
+        "throttled_count": cache.get(THROTTLED_COUNT_KEY) or 0,
+    }
+
+
+def reset_throttle_stats():
+    """Clears the shared throttling counters."""
+    cache.delete_many([THROTTLED_MS_KEY, THROTTLED_COUNT_KEY])
+
+
+rate_limiter = EsiRateLimiter()
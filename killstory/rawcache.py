@@ -0,0 +1,109 @@
+"""
+Persistent on-disk cache of raw killmail JSON.
+
+Published killmails never change, so the ESI response for a (killmail_id, hash)
+pair can be kept forever. Each killmail is stored gzip-compressed under
+``KILLSTORY_RAW_CACHE_DIR`` and the least recently read files are evicted when
+the directory grows beyond ``KILLSTORY_RAW_CACHE_MAX_BYTES``. The cache is
+disabled when no directory is configured.
+"""
+# killstory/rawcache.py
+
+import os
+import gzip
+import json
+import logging
+import tempfile
+import threading
+from .app_settings import KILLSTORY_RAW_CACHE_DIR, KILLSTORY_RAW_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class RawKillmailCache:
+    """Content-addressed store of compressed killmail JSON with size-based LRU eviction."""
+
+    def __init__(self, directory, max_bytes=KILLSTORY_RAW_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def path(self, kill_id, kill_hash):
+        """Returns the file path for a killmail, sharded by the first two hash characters."""
+        return os.path.join(self.directory, kill_hash[:2], f"{kill_id}-{kill_hash}.json.gz")
+
+    def get(self, kill_id, kill_hash):
+        """Returns the cached killmail dict, or None when it is not cached."""
+        path = self.path(kill_id, kill_hash)
+        try:
+            with gzip.open(path, "rb") as file:
+                data = json.loads(file.read())
+            os.utime(path)  # Reads count as use for the eviction order
+            return data
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Discarding unreadable cached killmail %s: %s", path, e)
+            self.discard(path)
+            return None
+
+    def put(self, kill_id, kill_hash, data):
+        """Stores a killmail dict, replacing the file atomically so concurrent writers are safe."""
+        path = self.path(kill_id, kill_hash)
+        payload = gzip.compress(json.dumps(data, separators=(",", ":")).encode())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not cache killmail %s: %s", kill_id, e)
+            self.discard(tmp_path)
+            return
+
+        with self._lock:
+            self._written += len(payload)
+            due = self._written >= self.max_bytes // 10
+            if due:
+                self._written = 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Deletes the least recently used files until the cache is below 90% of its maximum size."""
+        entries, total = [], 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            self.discard(path)
+            total -= size
+            evicted += 1
+        logger.info("Evicted %d cached killmails", evicted)
+        return evicted
+
+    @staticmethod
+    def discard(path):
+        """Removes a file, ignoring files another worker already removed."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+raw_cache = RawKillmailCache(KILLSTORY_RAW_CACHE_DIR) if KILLSTORY_RAW_CACHE_DIR else None
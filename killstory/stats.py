@@ -0,0 +1,164 @@
+"""
+Per-entity kill and loss statistics.
+
+``EntityStats`` holds one row per (entity type, entity ID, month) with the
+kills, losses, damage and final blows of a character, corporation or alliance.
+The writer adds the statistics of every newly written killmail in the same
+transaction, so the rows stay current without scanning the attacker and victim
+tables. ``rebuild_entity_stats`` recomputes them from scratch.
+"""
+# killstory/stats.py
+
+import datetime
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_datetime
+from .models import Attacker, EntityStats, Victim
+
+# (entity_type, ID field) pairs counted for victims and attackers
+ENTITY_FIELDS = (
+    (EntityStats.CHARACTER, 'character_id'),
+    (EntityStats.CORPORATION, 'corporation_id'),
+    (EntityStats.ALLIANCE, 'alliance_id'),
+)
+STAT_FIELDS = ('kills', 'losses', 'damage_done', 'damage_taken', 'final_blows')
+
+
+def month_of(value):
+    """Returns the first day of the UTC month of a datetime or ISO 8601 string."""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc)
+    return value.date().replace(day=1)
+
+
+def entity_stat_deltas(pairs):
+    """Returns the statistics added by (Killmail, raw dict) pairs, keyed by (entity_type, entity_id, period)."""
+    deltas = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    for killmail, killmail_data in pairs:
+        period = month_of(killmail.killmail_time)
+
+        victim_data = killmail_data.get('victim')
+        if victim_data:
+            for entity_type, field in ENTITY_FIELDS:
+                if victim_data.get(field):
+                    stats = deltas[(entity_type, victim_data[field], period)]
+                    stats['losses'] += 1
+                    stats['damage_taken'] += victim_data['damage_taken']
+
+        killers = set()
+        for attacker_data in killmail_data.get('attackers', []):
+            for entity_type, field in ENTITY_FIELDS:
+                if attacker_data.get(field):
+                    key = (entity_type, attacker_data[field], period)
+                    stats = deltas[key]
+                    stats['damage_done'] += attacker_data['damage_done']
+                    stats['final_blows'] += bool(attacker_data['final_blow'])
+                    killers.add(key)
+        # Several pilots of one corporation on a kill count as a single kill for it
+        for key in killers:
+            deltas[key]['kills'] += 1
+    return deltas
+
+
+def add_entity_stats(deltas):
+    """Adds statistics deltas to the stored rows, creating missing rows first.
+
+    The existing rows are locked first, in key order, and only the missing ones
+    are inserted, also in key order. An ``INSERT`` that ignores a conflict would
+    take a shared lock on the existing row, which the following ``FOR UPDATE``
+    of a concurrent writer of the same row waits on, deadlocking both.
+    """
+    if not deltas:
+        return
+    with transaction.atomic(savepoint=False):
+        rows = locked_rows(deltas)
+        missing = sorted(deltas.keys() - rows.keys())
+        if missing:
+            EntityStats.objects.bulk_create(
+                [
+                    EntityStats(entity_type=entity_type, entity_id=entity_id, period=period)
+                    for entity_type, entity_id, period in missing
+                ],
+                ignore_conflicts=True,
+            )
+            rows.update(locked_rows(missing))
+        for key, row in rows.items():
+            for field, value in deltas[key].items():
+                setattr(row, field, getattr(row, field) + value)
+        EntityStats.objects.bulk_update(list(rows.values()), STAT_FIELDS)
+
+
+def locked_rows(keys):
+    """Locks the stored rows of (entity_type, entity_id, period) keys in key order, returns them by key."""
+    keys = set(keys)
+    rows = EntityStats.objects.select_for_update().filter(
+        reduce(or_, (
+            Q(entity_type=entity_type, entity_id__in=entity_ids)
+            for entity_type, entity_ids in group_entity_ids(keys).items()
+        )),
+        period__in={period for _, _, period in keys},
+    ).order_by('entity_type', 'entity_id', 'period')
+    found = {}
+    for row in rows:
+        key = (row.entity_type, row.entity_id, row.period)
+        if key in keys:
+            found[key] = row
+    return found
+
+
+def group_entity_ids(keys):
+    """Groups the entity IDs of (entity_type, entity_id, period) keys by entity type."""
+    entity_ids = defaultdict(set)
+    for entity_type, entity_id, _ in keys:
+        entity_ids[entity_type].add(entity_id)
+    return entity_ids
+
+
+def rebuild_entity_stats(batch_size=500):
+    """Recomputes every statistics row from the victim and attacker tables, returns the rows written."""
+    stats = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    period = TruncMonth(
+        'killmail__killmail_time', output_field=DateField(), tzinfo=datetime.timezone.utc
+    )
+    for entity_type, field in ENTITY_FIELDS:
+        victims = (
+            Victim.objects.filter(**{f'{field}__isnull': False})
+            .values(field, period=period)
+            .annotate(losses=Count('pk'), damage_taken=Sum('damage_taken'))
+            .order_by()
+        )
+        for row in victims:
+            stats[(entity_type, row[field], row['period'])].update(
+                losses=row['losses'], damage_taken=row['damage_taken']
+            )
+        attackers = (
+            Attacker.objects.filter(**{f'{field}__isnull': False})
+            .values(field, period=period)
+            .annotate(
+                kills=Count('killmail', distinct=True),
+                damage_done=Sum('damage_done'),
+                final_blows=Count('pk', filter=Q(final_blow=True)),
+            )
+            .order_by()
+        )
+        for row in attackers:
+            stats[(entity_type, row[field], row['period'])].update(
+                kills=row['kills'], damage_done=row['damage_done'], final_blows=row['final_blows']
+            )
+
+    with transaction.atomic():
+        EntityStats.objects.all().delete()
+        EntityStats.objects.bulk_create(
+            [
+                EntityStats(entity_type=entity_type, entity_id=entity_id, period=period, **values)
+                for (entity_type, entity_id, period), values in stats.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(stats)
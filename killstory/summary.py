@@ -0,0 +1,82 @@
+"""
+Denormalized killmail summaries.
+
+The victim's ship, character, corporation and alliance, the final blow attacker
+and the attacker count are copied onto ``Killmail`` when it is written, so list
+and search pages read a single table instead of joining the victim and attacker
+tables for every row. ``backfill_summaries`` fills them in for stored killmails.
+"""
+# killstory/summary.py
+
+from collections import defaultdict
+from itertools import islice
+from django.db.models import Count
+from .models import Attacker, Killmail, Victim
+
+# Summary field -> field of the victim or final blow attacker it is copied from
+VICTIM_FIELDS = {
+    'victim_ship_type_id': 'ship_type_id',
+    'victim_character_id': 'character_id',
+    'victim_corporation_id': 'corporation_id',
+    'victim_alliance_id': 'alliance_id',
+}
+FINAL_BLOW_FIELDS = {
+    'final_blow_ship_type_id': 'ship_type_id',
+    'final_blow_character_id': 'character_id',
+    'final_blow_corporation_id': 'corporation_id',
+    'final_blow_alliance_id': 'alliance_id',
+}
+SUMMARY_FIELDS = (*VICTIM_FIELDS, *FINAL_BLOW_FIELDS, 'attacker_count')
+
+
+def summarize_killmails(pairs):
+    """Sets the summary fields of each Killmail of (Killmail, raw dict) pairs from its raw data."""
+    for killmail, killmail_data in pairs:
+        attackers = killmail_data.get('attackers', [])
+        final_blow = next((attacker for attacker in attackers if attacker.get('final_blow')), None)
+        set_summary(killmail, killmail_data.get('victim'), final_blow, len(attackers))
+
+
+def set_summary(killmail, victim, final_blow, attacker_count):
+    """Sets the summary fields of a Killmail from victim and final blow attacker dicts."""
+    for summary_field, field in VICTIM_FIELDS.items():
+        setattr(killmail, summary_field, victim.get(field) if victim else None)
+    for summary_field, field in FINAL_BLOW_FIELDS.items():
+        setattr(killmail, summary_field, final_blow.get(field) if final_blow else None)
+    killmail.attacker_count = attacker_count
+
+
+def backfill_summaries(queryset, batch_size=500):
+    """Fills in the summary fields of stored killmails from their victim and attacker rows.
+
+    Returns the killmails updated.
+    """
+    updated = 0
+    kill_ids = queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    while True:
+        chunk = list(islice(kill_ids, batch_size))
+        if not chunk:
+            return updated
+        victims = {
+            row['killmail_id']: row
+            for row in Victim.objects.filter(killmail_id__in=chunk).values(
+                'killmail_id', *VICTIM_FIELDS.values()
+            )
+        }
+        final_blows = {
+            row['killmail_id']: row
+            for row in Attacker.objects.filter(killmail_id__in=chunk, final_blow=True).values(
+                'killmail_id', *FINAL_BLOW_FIELDS.values()
+            )
+        }
+        attacker_counts = defaultdict(int, Attacker.objects.filter(killmail_id__in=chunk).values(
+            'killmail_id'
+        ).annotate(count=Count('pk')).order_by().values_list('killmail_id', 'count'))
+
+        killmails = []
+        for kill_id in chunk:
+            killmail = Killmail(pk=kill_id)
+            set_summary(killmail, victims.get(kill_id), final_blows.get(kill_id), attacker_counts[kill_id])
+            killmails.append(killmail)
+        Killmail.objects.bulk_update(killmails, SUMMARY_FIELDS)
+        updated += len(killmails)
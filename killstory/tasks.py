@@ -1,41 +1,155 @@
 """
 Populates killmails for owned characters asynchronously.
 
-This function is a Celery shared task that fetches and processes killmails for 
-all characters owned by the user. It retrieves the list of owned character IDs, 
-processes the killmails for each character, and saves the killmails, victims, 
-and attackers in batches.
+``populate_killmails`` is a coordinator Celery task: it fans out one
+``populate_character_killmails`` task per owned character, which fetches the
+character's new kill IDs and replaces itself with chunked
+``fetch_and_save_killmails`` subtasks. A chord callback logs the totals once
+every character is done.
+
+Progress is checkpointed per character: once all new kills of a character's
+list are committed, the newest kill ID, the list fetch time and the list's
+ETag/Last-Modified validators are recorded, so later runs skip characters
+fetched recently and lists that did not change.
 """
 # killstory/tasks.py
 
 import time
 import logging
+from datetime import timedelta
+from itertools import chain, islice
 import requests
-from celery import shared_task
-from django.db import transaction, IntegrityError
+from celery import chord, current_app, group, shared_task
+from celery.backends.base import DisabledBackend
+from celery.signals import task_postrun
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from allianceauth.eveonline.models import EveCharacter
 from allianceauth.authentication.models import CharacterOwnership
-from .models import Killmail, Victim, Attacker, VictimItem, VictimContainedItem
+from .models import Killmail, CharacterCheckpoint
+from .writer import bulk_save_batch
+from .client import make_request, fetch_concurrently
+from .ratelimit import reset_throttle_stats, throttle_stats
+from .rawcache import raw_cache
+from .jsonstream import iter_object_items
+from .names import batch_name_ids, name_resolver, unknown_ids
+from .metrics import metrics, flush, start_run
 from .app_settings import (
-    KILLSTORY_API_LIST_ENDPOINT, KILLSTORY_API_DETAIL_ENDPOINT,
-    KILLSTORY_BATCH_SIZE, KILLSTORY_RETRY_LIMIT
+    KILLSTORY_API_LIST_ENDPOINT, KILLSTORY_API_DETAIL_ENDPOINT, KILLSTORY_API_NAMES_ENDPOINT,
+    KILLSTORY_BATCH_SIZE, KILLSTORY_LIST_REFRESH_INTERVAL, KILLSTORY_CHARACTERS_PER_RUN
 )
 
 logger = logging.getLogger(__name__)
 
+# Killmail IDs per existence query when filtering out stored killmails.
+KILLMAIL_ID_CHUNK_SIZE = 500
+
 @shared_task
 def populate_killmails():
-    """Populate killmails for owned characters asynchronously."""
-    character_ids = get_owned_character_ids()
+    """Populate killmails for owned characters, fanning out one task per character."""
+    character_ids = get_due_character_ids()
+    if not character_ids:
+        logger.info("Population completed: no owned characters due for a refresh")
+        return
+
+    reset_throttle_stats()
+    start_run()
+    header = group(populate_character_killmails.si(character_id) for character_id in character_ids)
+    if isinstance(current_app.backend, DisabledBackend):
+        logger.warning("No Celery result backend configured, population totals will not be logged.")
+        header.delay()
+    else:
+        chord(header)(log_population_totals.s(len(character_ids)))
+
+@shared_task(bind=True)
+def populate_character_killmails(self, character_id):
+    """Fetches a character's new killmail IDs and replaces itself with one fetch/save task per chunk."""
+    checkpoint = get_checkpoint(character_id)
+    if not is_due(checkpoint):
+        return 0
+
+    fetched_at = timezone.now()
+    listing = checkpoint_listing(checkpoint)
+    chunks = list(chunked(
+        chain.from_iterable(iter_new_killmails(character_id, listing=listing)),
+        KILLSTORY_BATCH_SIZE
+    ))
+    if not listing.get('complete'):
+        # The list could not be read in full, save what was found but keep the checkpoint
+        if not chunks:
+            return 0
+        return self.replace(group(fetch_and_save_killmails.si(chunk) for chunk in chunks))
+
+    listing['fetched_at'] = fetched_at.isoformat()
+    if not chunks:
+        return record_character_checkpoint(0, character_id, listing)
+    if isinstance(current_app.backend, DisabledBackend):
+        # A chord needs a result backend to know when every chunk is committed
+        saved = sum(fetch_and_save_killmails(chunk) for chunk in chunks)
+        return record_character_checkpoint(saved, character_id, listing)
+    return self.replace(chord(
+        group(fetch_and_save_killmails.si(chunk) for chunk in chunks),
+        record_character_checkpoint.s(character_id, listing)
+    ))
+
+@shared_task
+def fetch_and_save_killmails(killmails):
+    """Fetches the details of a chunk of (kill_id, hash) pairs and saves them, returns killmails processed.
+
+    Killmails another task stored in the meantime count as processed.
+    """
     batch = []
+    for killmail_data in fetch_concurrently(fetch_killmail_details, killmails):
+        if killmail_data:
+            batch.append((create_killmail_instance(killmail_data), killmail_data))
+    if not batch:
+        return 0
+    counts = save_batch(batch)
+    return counts['killmails'] + counts['skipped']
 
-    for character_id in character_ids:
-        process_character_killmails(character_id, batch)
+@shared_task
+def record_character_checkpoint(results, character_id, listing):
+    """Chord callback recording a character's checkpoint once its chunks are committed, returns killmails processed.
 
-    if batch:
-        save_batch(batch)
+    ``listing`` is the list state of ``iter_new_killmails`` plus the ISO 8601
+    ``fetched_at`` time. The newest kill ID and the list validators are only kept
+    when every new kill was saved or found stored, so kills whose details could
+    not be fetched are retried on the next run.
+    """
+    processed = sum_results(results)
+    fetched_at = parse_datetime(listing['fetched_at'])
+    if processed >= listing['new']:
+        record_checkpoint(
+            character_id, listing.get('newest'), fetched_at, listing.get('etag', ""), listing.get('last_modified', "")
+        )
+    else:
+        record_checkpoint(character_id, None, fetched_at)
+    return processed
 
-    logger.info("Population completed")
+@shared_task
+def warm_entity_names(ids):
+    """Resolves IDs on ESI into the name table, skipping invalid IDs, returns the names stored."""
+    return len(name_resolver.resolve(unknown_ids(ids), background=True))
+
+@shared_task
+def log_population_totals(results, character_count):
+    """Chord callback logging the number of killmails processed over all characters."""
+    logger.info(
+        "Population completed: %d killmails processed for %d characters, throttled %.1fs over %d pauses",
+        sum_results(results), character_count, *throttle_stats().values()
+    )
+
+@task_postrun.connect
+def flush_task_metrics(sender=None, **kwargs):
+    """Flushes the metrics recorded by a killstory task when it ends."""
+    if sender is not None and sender.name.startswith("killstory."):
+        flush()
+
+def sum_results(results):
+    """Sums task results, which are nested lists when a character task was replaced by a group."""
+    if isinstance(results, (list, tuple)):
+        return sum(sum_results(result) for result in results)
+    return results or 0
 
 def get_owned_character_ids():
     """Returns a list of owned character IDs."""
@@ -43,65 +157,154 @@ def get_owned_character_ids():
         id__in=CharacterOwnership.objects.values_list('character_id', flat=True)
     ).values_list('character_id', flat=True)
 
-def process_character_killmails(character_id, batch):
-    """Processes killmails for a given character and adds them to the batch."""
-    try:
-        killmails = fetch_killmail_list(character_id)
-        if not killmails:
+def get_due_character_ids():
+    """Returns the owned character IDs whose list is due for a refresh, least recently fetched first."""
+    character_ids = list(get_owned_character_ids())
+    fetched = dict(
+        CharacterCheckpoint.objects.filter(
+            character_id__in=character_ids, list_fetched_at__isnull=False
+        ).values_list('character_id', 'list_fetched_at')
+    )
+    cutoff = timezone.now() - timedelta(seconds=KILLSTORY_LIST_REFRESH_INTERVAL)
+    due = [character_id for character_id in character_ids if fetched.get(character_id, cutoff) <= cutoff]
+    due.sort(key=lambda character_id: (character_id in fetched, fetched.get(character_id)))
+    return due[:KILLSTORY_CHARACTERS_PER_RUN] if KILLSTORY_CHARACTERS_PER_RUN else due
+
+def get_checkpoint(character_id):
+    """Returns the checkpoint of a character, unsaved and empty if it has none yet."""
+    return (
+        CharacterCheckpoint.objects.filter(pk=character_id).first()
+        or CharacterCheckpoint(character_id=character_id)
+    )
+
+def is_due(checkpoint):
+    """Tells whether a character's list was not fetched within the refresh interval."""
+    return checkpoint.list_fetched_at is None or (
+        checkpoint.list_fetched_at <= timezone.now() - timedelta(seconds=KILLSTORY_LIST_REFRESH_INTERVAL)
+    )
+
+def checkpoint_listing(checkpoint):
+    """Returns the list state for ``iter_new_killmails``, starting from the checkpoint's validators."""
+    return {'etag': checkpoint.list_etag, 'last_modified': checkpoint.list_last_modified}
+
+def record_checkpoint(character_id, newest_killmail_id, fetched_at, etag="", last_modified=""):
+    """Stores the list fetch time and validators of a character and moves its last kill ID forward."""
+    checkpoint = get_checkpoint(character_id)
+    if newest_killmail_id is not None and (
+        checkpoint.last_killmail_id is None or newest_killmail_id > checkpoint.last_killmail_id
+    ):
+        checkpoint.last_killmail_id = newest_killmail_id
+    checkpoint.list_fetched_at = fetched_at
+    checkpoint.list_etag = etag
+    checkpoint.list_last_modified = last_modified
+    checkpoint.save()
+
+def iter_new_killmails(character_id, listing=None):
+    """Streams a character's kill list, yielding chunks of (kill_id, hash) pairs that are not stored yet.
+
+    Every listed kill is checked against the stored ones, so kills that show up
+    below the newest kill ID are still found. When given, the ``listing`` dict receives
+    the newest listed kill ID, the number of new kills and whether the list was read to the end.
+    """
+    listing = {} if listing is None else listing
+    listing.setdefault('new', 0)
+    for chunk in iter_killmail_list(character_id, listing=listing):
+        kill_ids = [int(kill_id) for kill_id, _ in chunk]
+        listing['newest'] = max(kill_ids + [listing.get('newest') or 0])
+        killmails = filter_new_killmails(dict(chunk))
+        listing['new'] += len(killmails)
+        if killmails:
+            yield list(killmails.items())
+
+def filter_new_killmails(killmails):
+    """Drops the killmails already stored from an id -> hash dict, one query per chunk of IDs."""
+    kill_ids = [int(kill_id) for kill_id in killmails]
+    known = set()
+    for start in range(0, len(kill_ids), KILLMAIL_ID_CHUNK_SIZE):
+        known.update(
+            Killmail.objects.filter(
+                pk__in=kill_ids[start:start + KILLMAIL_ID_CHUNK_SIZE]
+            ).values_list('pk', flat=True)
+        )
+    return {
+        kill_id: kill_hash for kill_id, kill_hash in killmails.items()
+        if int(kill_id) not in known
+    }
+
+def iter_killmail_list(character_id, chunk_size=KILLMAIL_ID_CHUNK_SIZE, listing=None):
+    """Streams the list of killmails for a given character ID, yielding chunks of (kill_id, hash) pairs.
+
+    The response is parsed incrementally, so memory use does not grow with the size of the list.
+    The request is conditional on the ``etag``/``last_modified`` of the ``listing`` dict,
+    which are replaced by those of the response; ``listing['complete']`` is set once
+    the list was read to the end or reported unchanged.
+    """
+    listing = {} if listing is None else listing
+    headers = {}
+    if listing.get('etag'):
+        headers['If-None-Match'] = listing['etag']
+    if listing.get('last_modified'):
+        headers['If-Modified-Since'] = listing['last_modified']
+
+    started = time.perf_counter()
+    response = make_request(
+        KILLSTORY_API_LIST_ENDPOINT.format(character_id), stream=True, headers=headers or None
+    )
+    elapsed = time.perf_counter() - started
+    if not response:
+        return
+    with response:
+        if response.status_code == 304:
+            metrics.incr("lists_not_modified")
+            metrics.observe("list_fetch_seconds", elapsed)
+            listing['complete'] = True
             return
+        listing['etag'] = response.headers.get('ETag', "")
+        listing['last_modified'] = response.headers.get('Last-Modified', "")
+        chunks = chunked(iter_object_items(response.iter_content(chunk_size=65536)), chunk_size)
+        try:
+            while True:
+                # Only the time spent reading the list counts, not the consumer's work between chunks
+                started = time.perf_counter()
+                chunk = next(chunks, None)
+                elapsed += time.perf_counter() - started
+                if chunk is None:
+                    break
+                yield chunk
+            listing['complete'] = True
+        except (requests.RequestException, ValueError) as e:
+            logger.error("Error fetching killmails for character_id %s: %s", character_id, e)
+        finally:
+            metrics.observe("list_fetch_seconds", elapsed)
 
-        for kill_id, kill_hash in killmails.items():
-            killmail_data = fetch_killmail_details(kill_id, kill_hash)
-            if not killmail_data:
-                continue
-            killmail = create_killmail_instance(killmail_data)
-            batch.append((killmail, killmail_data))
-
-            if len(batch) >= KILLSTORY_BATCH_SIZE:
-                save_batch(batch)
-                batch.clear()
-
-    except requests.HTTPError as e:
-        logger.error("Request error for character_id %s: %s", character_id, e)
-    except IntegrityError as e:
-        logger.error("Integrity error for character_id %s: %s", character_id, e)
-
-def fetch_killmail_list(character_id):
-    """Fetches the list of killmails for a given character ID."""
-    try:
-        response = make_request(KILLSTORY_API_LIST_ENDPOINT.format(character_id))
-        if response and response.status_code == 404:
-            logger.warning("Character_id %s not found, skipping.", character_id)
-            return {}
-        return response.json() if response else {}
-    except requests.RequestException as e:
-        logger.error("Error fetching killmails for character_id %s: %s", character_id, e)
-        return {}
+def chunked(iterable, size):
+    """Yields lists of up to ``size`` items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 def fetch_killmail_details(kill_id, kill_hash):
-    """Fetches the details of a specific killmail using its ID and hash."""
-    response = make_request(KILLSTORY_API_DETAIL_ENDPOINT.format(kill_id, kill_hash))
-    return response.json() if response else {}
-
-def make_request(url):
-    """Makes an HTTP GET request with retries for handling temporary issues."""
-    retries = 0
-    while retries < KILLSTORY_RETRY_LIMIT:
-        try:
-            with requests.get(url, timeout=10) as response:
-                if response.status_code in [304, 400, 422]:
-                    return None
-                if response.status_code in [420, 500, 503, 504]:
-                    time.sleep(2 ** retries)
-                else:
-                    response.raise_for_status()
-                    return response
-        except requests.RequestException as e:
-            logger.error("Network error: %s, attempt %d", e, retries + 1)
-        retries += 1
-
-    logger.error("Retry limit reached, moving to next killmail.")
-    return None
+    """Fetches the details of a specific killmail using its ID and hash, from the raw cache if possible."""
+    with metrics.timed("detail_fetch_seconds"):
+        if raw_cache:
+            killmail_data = raw_cache.get(kill_id, kill_hash)
+            if killmail_data is not None:
+                metrics.incr("raw_cache_hits")
+                return killmail_data
+            metrics.incr("raw_cache_misses")
+
+        response = make_request(KILLSTORY_API_DETAIL_ENDPOINT.format(kill_id, kill_hash))
+        if not response:
+            return {}
+        with metrics.timed("json_decode_seconds"):
+            killmail_data = response.json()
+        metrics.incr("killmails_fetched")
+        if killmail_data and raw_cache:
+            raw_cache.put(kill_id, kill_hash, killmail_data)
+        return killmail_data
 
 def create_killmail_instance(data):
     """Creates an instance of a Killmail from the given data."""
@@ -117,71 +320,24 @@ def create_killmail_instance(data):
     )
 
 def save_batch(batch):
-    """Saves a batch of killmails, including related victims and attackers."""
-    with transaction.atomic():
-        for killmail, killmail_data in batch:
-            try:
-                killmail.save()
-                if "victim" in killmail_data:
-                    create_victim_instance(killmail, killmail_data['victim'])
-                for attacker_data in killmail_data.get('attackers', []):
-                    create_attacker_instance(killmail, attacker_data)
-            except IntegrityError as e:
-                logger.error("Error saving killmail: %s. Data: %s", e, killmail_data)
-
-def create_victim_instance(killmail, victim_data):
-    """Creates an instance of a Victim and its items from the given data."""
-    victim = Victim(
-        killmail=killmail,
-        alliance_id=victim_data.get('alliance_id'),
-        character_id=victim_data.get('character_id'),
-        corporation_id=victim_data.get('corporation_id'),
-        faction_id=victim_data.get('faction_id'),
-        damage_taken=victim_data['damage_taken'],
-        ship_type_id=victim_data['ship_type_id']
-    )
-    victim.save()
-    for item_data in victim_data.get('items', []):
-        create_victim_item_instance(victim, item_data)
-
-def create_attacker_instance(killmail, attacker_data):
-    """Creates an instance of an Attacker from the given data."""
-    attacker = Attacker(
-        killmail=killmail,
-        alliance_id=attacker_data.get('alliance_id'),
-        character_id=attacker_data.get('character_id'),
-        corporation_id=attacker_data.get('corporation_id'),
-        faction_id=attacker_data.get('faction_id'),
-        damage_done=attacker_data['damage_done'],
-        final_blow=attacker_data['final_blow'],
-        security_status=attacker_data['security_status'],
-        ship_type_id=attacker_data['ship_type_id'],
-        weapon_type_id=attacker_data.get('weapon_type_id')
-    )
-    attacker.save()
-
-def create_victim_item_instance(victim, item_data):
-    """Creates an instance of a VictimItem and contained items from the given data."""
-    item = VictimItem(
-        victim=victim,
-        item_type_id=item_data['item_type_id'],
-        flag=item_data['flag'],
-        quantity_destroyed=item_data.get('quantity_destroyed'),
-        quantity_dropped=item_data.get('quantity_dropped'),
-        singleton=item_data['singleton']
-    )
-    item.save()
-    for contained_item_data in item_data.get('items', []):
-        create_contained_item_instance(item, contained_item_data)
-
-def create_contained_item_instance(parent_item, contained_item_data):
-    """Creates an instance of a VictimContainedItem from the given data."""
-    contained_item = VictimContainedItem(
-        parent_item=parent_item,
-        item_type_id=contained_item_data['item_type_id'],
-        flag=contained_item_data['flag'],
-        quantity_destroyed=contained_item_data.get('quantity_destroyed'),
-        quantity_dropped=contained_item_data.get('quantity_dropped'),
-        singleton=contained_item_data['singleton']
-    )
-    contained_item.save()
+    """Saves a batch of killmails, including related victims, attackers and items, in bulk."""
+    with metrics.timed("save_batch_seconds"):
+        counts = bulk_save_batch(batch)
+    rows = dict(counts)
+    metrics.incr("killmails_skipped", rows.pop('skipped'))
+    for table, count in rows.items():
+        metrics.incr(f"rows_{table}", count)
+    logger.debug("Saved batch: %s", counts)
+    warm_names(batch)
+    return counts
+
+def warm_names(batch):
+    """Queues the resolution of the batch's IDs that have no name stored yet."""
+    if not KILLSTORY_API_NAMES_ENDPOINT or not batch:
+        return
+    missing = unknown_ids(batch_name_ids(batch))
+    if missing:
+        try:
+            warm_entity_names.delay(sorted(missing))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Could not queue name resolution: %s", e)
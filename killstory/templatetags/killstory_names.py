@@ -0,0 +1,14 @@
+"""Template filters showing resolved names in place of IDs."""
+# killstory/templatetags/killstory_names.py
+
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def entity_name(entity_id, names):
+    """Returns the name of an ID from a resolved {id: name} dict, the ID itself when unknown, None for None."""
+    if entity_id is None:
+        return None
+    return names.get(entity_id, entity_id) if names else entity_id
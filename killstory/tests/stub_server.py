@@ -0,0 +1,122 @@
+"""Local stub of the killstory list and ESI killmail endpoints."""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .utils import make_killmail_data
+
+
+class StubServer:
+    """Serves ``/list/<character_id>.json`` and ``/killmails/<id>/<hash>/`` on localhost.
+
+    ``kill_lists`` maps character ids to ``{kill_id: hash}`` dicts. ``latency`` adds
+    a delay in seconds to every response. Requests and client connections are counted.
+    Lists carry an ETag and answer a matching ``If-None-Match`` with 304.
+    ``names`` maps IDs to (category, name) pairs served by ``POST /universe/names/``,
+    which answers 404 when any requested ID is unknown, like ESI.
+    """
+
+    def __init__(self, kill_lists=None, latency=0.0, names=None):
+        self.kill_lists = kill_lists or {}
+        self.names = names or {}
+        self.latency = latency
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    @property
+    def list_endpoint(self):
+        return self.url + "/list/{}.json"
+
+    @property
+    def detail_endpoint(self):
+        return self.url + "/killmails/{}/{}/"
+
+    @property
+    def names_endpoint(self):
+        return self.url + "/universe/names/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, path, request_headers=None):
+        """Returns (status, headers, body) for a request path."""
+        match = re.fullmatch(r"/list/(\d+)\.json", path)
+        if match:
+            kill_list = self.kill_lists.get(int(match.group(1)))
+            if kill_list is None:
+                return 404, {}, b"{}"
+            body = json.dumps({str(k): v for k, v in kill_list.items()}).encode()
+            headers = {"ETag": f'"{hashlib.sha1(body).hexdigest()}"'}
+            if (request_headers or {}).get("If-None-Match") == headers["ETag"]:
+                return 304, headers, b""
+            return 200, headers, body
+        match = re.fullmatch(r"/killmails/(\d+)/(\w+)/", path)
+        if match:
+            return 200, {}, json.dumps(make_killmail_data(int(match.group(1)))).encode()
+        return 404, {}, b"{}"
+
+    def respond_post(self, path, body):
+        """Returns (status, headers, body) for a POST request."""
+        ids = json.loads(body)
+        if path != "/universe/names/" or not all(entity_id in self.names for entity_id in ids):
+            return 404, {}, b'{"error": "Ensure all IDs are valid before resolving."}'
+        return 200, {}, json.dumps([
+            {"id": entity_id, "category": self.names[entity_id][0], "name": self.names[entity_id][1]}
+            for entity_id in ids
+        ]).encode()
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_GET(self):  # noqa: N802
+                with stub.lock:
+                    stub.requests.append((self.path, dict(self.headers)))
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, headers, body = stub.respond(self.path, self.headers)
+                self.send(status, headers, body)
+
+            def do_POST(self):  # noqa: N802
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub.lock:
+                    stub.requests.append((self.path, dict(self.headers)))
+                self.send(*stub.respond_post(self.path, body))
+
+            def send(self, status, headers, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
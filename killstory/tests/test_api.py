@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from allianceauth.tests.auth_utils import AuthUtils
+
+from killstory.tasks import save_batch
+
+from .utils import make_batch
+
+
+class TestSearchKillmails(TestCase):
+    def setUp(self):
+        self.user = AuthUtils.create_user("viewer")
+        AuthUtils.add_main_character_2(self.user, "Viewer", 2112000900)
+        self.client.force_login(self.user)
+        base = parse_datetime("2024-01-01T00:00:00Z")
+        # Killmails 1-5 lost by corporation 98000001 in a Rifter, 6-10 by 98000002 in a Vexor
+        batch = make_batch(*range(1, 6)) + make_batch(
+            *range(6, 11), corporation_id=98000002, character_id=2112000002, ship_type_id=626
+        )
+        for killmail, _ in batch:
+            killmail.killmail_time = base + timedelta(days=killmail.killmail_id)
+            killmail.total_value = killmail.killmail_id * 1_000_000.0
+        save_batch(batch)
+
+    def search(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("killstory:api_killmails"), params)
+        self.killmail_queries = [
+            query["sql"] for query in queries.captured_queries if "kill_killmail" in query["sql"]
+        ]
+        return response
+
+    def ids(self, response):
+        return [row["killmail_id"] for row in response.json()["results"]]
+
+    def test_should_return_newest_first_with_selected_columns(self):
+        # when
+        response = self.search()
+        # then
+        self.assertEqual(self.ids(response), list(range(10, 0, -1)))
+        row = response.json()["results"][0]
+        self.assertEqual(row["victim_ship_type_id"], 626)
+        self.assertEqual(row["killmail_time"], "2024-01-11T00:00:00Z")
+        self.assertNotIn("position_x", row)
+        self.assertIsNone(response.json()["next"])
+
+    def test_should_filter_by_entity_and_role(self):
+        self.assertEqual(self.ids(self.search(corporation_id="98000002", role="victim")), [10, 9, 8, 7, 6])
+        self.assertEqual(self.ids(self.search(corporation_id="98000002", role="attacker")), [])
+        self.assertEqual(len(self.ids(self.search(corporation_id="98000100"))), 10)
+        self.assertEqual(self.ids(self.search(character_id="2112000002,1", role="victim")), [10, 9, 8, 7, 6])
+
+    def test_should_filter_by_ship_time_and_value(self):
+        self.assertEqual(self.ids(self.search(ship_type_id="587")), [5, 4, 3, 2, 1])
+        self.assertEqual(self.ids(self.search(since="2024-01-04", until="2024-01-06")), [4, 3])
+        self.assertEqual(self.ids(self.search(min_value="8000000")), [10, 9, 8])
+        self.assertEqual(self.ids(self.search(solar_system_id="30000142", min_value="9500000")), [10])
+
+    def test_should_page_with_cursor_in_one_query_per_page(self):
+        # given
+        seen, cursor = [], None
+        # when
+        for _ in range(4):
+            response = self.search(limit=3, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(len(self.killmail_queries), 1)
+            seen += self.ids(response)
+            cursor = response.json()["next"]
+            if not cursor:
+                break
+        # then
+        self.assertEqual(seen, list(range(10, 0, -1)))
+
+    def test_should_filter_entities_with_a_single_query(self):
+        # when
+        self.search(character_id="2112000001", corporation_id="98000001", alliance_id="99000001")
+        # then
+        self.assertEqual(len(self.killmail_queries), 1)
+
+    def test_should_reject_invalid_parameters(self):
+        for params in ({"character_id": "abc"}, {"role": "owner"}, {"since": "yesterday"}, {"min_value": "x"}):
+            response = self.search(**params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from killstory.archive import import_archives, involves, iter_archive_killmails
+from killstory.models import Killmail
+
+from .utils import create_owned_character, make_killmail_data
+
+
+def write_archive(path, killmails):
+    """Writes killmail dicts into a .tar.bz2 archive, one JSON file each."""
+    with tarfile.open(path, "w:bz2") as archive:
+        for killmail_data in killmails:
+            body = json.dumps(killmail_data).encode()
+            info = tarfile.TarInfo(f"killmails/{killmail_data['killmail_id']}.json")
+            info.size = len(body)
+            archive.addfile(info, io.BytesIO(body))
+
+
+class TestImportArchives(TestCase):
+    def setUp(self):
+        create_owned_character(2112000001, corporation_id=98000050)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.paths = [os.path.join(tmp.name, f"killmails-2024-01-0{day}.tar.bz2") for day in (1, 2)]
+        # Killmails 1-3 and 11-13 have the owned character as victim, the others not
+        write_archive(self.paths[0], [
+            *(make_killmail_data(kill_id) for kill_id in range(1, 4)),
+            *(make_killmail_data(kill_id, character_id=1, corporation_id=1) for kill_id in range(4, 6)),
+        ])
+        write_archive(self.paths[1], [
+            *(make_killmail_data(kill_id) for kill_id in range(11, 14)),
+            make_killmail_data(14, character_id=1, corporation_id=98000050),
+        ])
+
+    def test_should_read_archive_as_stream(self):
+        self.assertEqual([k["killmail_id"] for k in iter_archive_killmails(self.paths[0])], [1, 2, 3, 4, 5])
+
+    def test_should_match_characters_and_corporations(self):
+        killmail_data = make_killmail_data(1, character_id=1, corporation_id=1)
+        self.assertTrue(involves(killmail_data, {2112000100}, set()))
+        self.assertTrue(involves(killmail_data, set(), {1}))
+        self.assertFalse(involves(killmail_data, {2}, {2}))
+
+    def test_should_import_owned_killmails_in_process(self):
+        # when
+        totals = import_archives(self.paths, workers=1)
+        # then
+        self.assertEqual(totals, (9, 7, 7))
+        self.assertEqual(
+            sorted(Killmail.objects.values_list("pk", flat=True)), [1, 2, 3, 11, 12, 13, 14]
+        )
+
+    def test_should_import_with_worker_processes(self):
+        # when
+        out = StringIO()
+        call_command("import_archives", *self.paths, "--workers", "2", stdout=out)
+        # then
+        self.assertEqual(Killmail.objects.count(), 7)
+        self.assertIn("7 matching, 7 new saved", out.getvalue())
+
+    def test_should_skip_stored_killmails(self):
+        # given
+        import_archives(self.paths[:1])
+        # when
+        totals = import_archives(self.paths)
+        # then
+        self.assertEqual(totals, (9, 7, 4))
@@ -0,0 +1,98 @@
+import asyncio
+import importlib
+import json
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import Http404
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase
+
+from allianceauth.tests.auth_utils import AuthUtils
+
+from killstory import async_views, urls
+from killstory.tasks import save_batch
+from killstory.views import kill_detail_cache_key
+
+from .utils import make_batch
+
+
+class TestGatherBlocking(SimpleTestCase):
+    def test_should_run_callables_concurrently(self):
+        # given
+        barrier = threading.Barrier(2, timeout=2)
+
+        def meet(value):
+            # Fails with BrokenBarrierError unless both calls run at the same time
+            barrier.wait()
+            return value
+
+        # when
+        with patch("killstory.async_views.close_old_connections"):
+            results = asyncio.run(async_views.gather_blocking(lambda: meet(1), lambda: meet(2)))
+        # then
+        self.assertEqual(results, [1, 2])
+
+
+class TestAsyncViews(TestCase):
+    def setUp(self):
+        self.user = AuthUtils.create_user("viewer")
+        AuthUtils.add_main_character_2(self.user, "Viewer", 2112000900)
+        self.factory = AsyncRequestFactory()
+        save_batch(make_batch(1, 2, 3))
+        cache.delete(kill_detail_cache_key(1))
+        self.addCleanup(cache.delete, kill_detail_cache_key(1))
+
+    def request(self, path, user=None, **params):
+        request = self.factory.get(path, params)
+        request.user = user or self.user
+        request.session = {}
+        return request
+
+    async def test_should_render_index(self):
+        # when
+        response = await async_views.killstory_view(self.request("/killstory/"))
+        # then
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "<td>2112000001</td>", count=3, html=True)
+
+    async def test_should_render_and_cache_detail(self):
+        # when
+        response = await async_views.kill_detail_view(self.request("/killstory/kill/1/"), 1)
+        # then
+        self.assertContains(response, "<td>Yes</td>", count=1, html=True)
+        self.assertIsNotNone(await cache.aget(kill_detail_cache_key(1)))
+        cached = await async_views.kill_detail_view(self.request("/killstory/kill/1/"), 1)
+        self.assertContains(cached, "<td>Yes</td>", count=1, html=True)
+
+    async def test_should_raise_404_for_unknown_killmail(self):
+        with self.assertRaises(Http404):
+            await async_views.kill_detail_view(self.request("/killstory/kill/404/"), 404)
+
+    async def test_should_search_like_sync_view(self):
+        # when
+        response = await async_views.search_killmails(self.request("/killstory/api/killmails/", limit="2"))
+        # then
+        data = json.loads(response.content)
+        self.assertEqual([row["killmail_id"] for row in data["results"]], [3, 2])
+        self.assertIsNotNone(data["next"])
+        response = await async_views.search_killmails(
+            self.request("/killstory/api/killmails/", limit="2", cursor=data["next"])
+        )
+        self.assertEqual([row["killmail_id"] for row in json.loads(response.content)["results"]], [1])
+
+    async def test_should_redirect_anonymous_users(self):
+        response = await async_views.killstory_view(self.request("/killstory/", user=AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+
+    def test_should_mount_async_views_when_enabled(self):
+        # given
+        self.addCleanup(importlib.reload, urls)
+        # when
+        with patch("killstory.app_settings.KILLSTORY_ASYNC_VIEWS", True):
+            importlib.reload(urls)
+        # then
+        callbacks = {pattern.name: pattern.callback for pattern in urls.urlpatterns}
+        self.assertIs(callbacks["index"], async_views.killstory_view)
+        self.assertTrue(asyncio.iscoroutinefunction(callbacks["api_killmails"]))
@@ -0,0 +1,135 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from killstory.backfill import (
+    BackfillProgress,
+    format_duration,
+    in_window,
+    run_backfill,
+    save_and_report,
+    select_character_ids,
+)
+from killstory.models import Killmail
+from killstory.tasks import save_batch
+
+from .stub_server import StubServer
+from .utils import create_owned_character, make_batch
+
+UTC = datetime.timezone.utc
+
+
+class BackfillTestCase(TestCase):
+    def setUp(self):
+        create_owned_character(1001, corporation_id=98000001, alliance_id=99000001)
+        create_owned_character(1002, corporation_id=98000002)
+        self.kill_lists = {
+            1001: {kill_id: f"hash{kill_id}" for kill_id in range(1, 8)},
+            1002: {kill_id: f"hash{kill_id}" for kill_id in range(5, 12)},
+        }
+
+    def run_stubbed(self, func, *args, **kwargs):
+        with StubServer(self.kill_lists) as stub, patch(
+            "killstory.tasks.KILLSTORY_API_LIST_ENDPOINT", stub.list_endpoint
+        ), patch(
+            "killstory.tasks.KILLSTORY_API_DETAIL_ENDPOINT", stub.detail_endpoint
+        ):
+            self.requests = stub.requests
+            return func(*args, **kwargs)
+
+
+class TestRunBackfill(BackfillTestCase):
+    def test_should_save_every_character_in_process(self):
+        # given
+        lines = []
+        # when
+        progress = self.run_stubbed(
+            run_backfill, [1001, 1002], on_progress=lambda p: lines.append(p.line()), interval=0
+        )
+        # then
+        self.assertEqual(sorted(Killmail.objects.values_list("pk", flat=True)), list(range(1, 12)))
+        self.assertEqual(progress.characters_done, 2)
+        self.assertEqual(progress.saved, 11)
+        self.assertEqual(progress.processed, progress.listed)
+        self.assertTrue(lines[-1].startswith("characters 2/2, "))
+
+    def test_should_not_fetch_stored_killmails(self):
+        # given
+        save_batch(make_batch(1, 2, 3))
+        # when
+        progress = self.run_stubbed(run_backfill, [1001])
+        # then
+        self.assertEqual(
+            sorted(path for path, _ in self.requests),
+            [f"/killmails/{kill_id}/hash{kill_id}/" for kill_id in range(4, 8)] + ["/list/1001.json"],
+        )
+        self.assertEqual(progress.listed, 4)
+        self.assertEqual(progress.saved, 4)
+
+    def test_should_skip_killmails_outside_dates(self):
+        # when
+        progress = self.run_stubbed(
+            run_backfill, [1001], since=datetime.datetime(2024, 2, 1, tzinfo=UTC)
+        )
+        # then
+        self.assertEqual(Killmail.objects.count(), 0)
+        self.assertEqual(progress.processed, 7)
+
+    def test_should_run_command(self):
+        # given
+        out = StringIO()
+        # when
+        self.run_stubbed(call_command, "backfill_kills", "--corporation", "98000002", stdout=out)
+        # then
+        self.assertEqual(Killmail.objects.count(), 7)
+        self.assertIn("Saved 7 killmails", out.getvalue())
+
+
+class TestBackfillHelpers(BackfillTestCase):
+    def test_should_select_characters(self):
+        self.assertEqual(select_character_ids(), [1001, 1002])
+        self.assertEqual(select_character_ids(character_ids=[1002]), [1002])
+        self.assertEqual(select_character_ids(alliance_ids=[99000001]), [1001])
+        self.assertEqual(select_character_ids(corporation_ids=[98000003]), [])
+
+    def test_should_check_window(self):
+        since = datetime.datetime(2024, 1, 1, tzinfo=UTC)
+        until = datetime.datetime(2024, 1, 2, tzinfo=UTC)
+        self.assertTrue(in_window("2024-01-01T12:00:00Z", since, until))
+        self.assertFalse(in_window("2024-01-02T00:00:00Z", since, until))
+        self.assertTrue(in_window("2023-12-31T23:59:59Z"))
+
+    def test_should_estimate_time_left(self):
+        # given
+        now = [0.0]
+        progress = BackfillProgress(1, clock=lambda: now[0])
+        progress.apply(("listed", 1001, 100))
+        progress.apply(("list_done", 1001))
+        progress.apply(("saved", 25, 250))
+        now[0] = 10.0
+        # when
+        line = progress.line()
+        # then
+        self.assertEqual(
+            line, "characters 0/1, kills 25/100 (2.5/s), saved 0, rows 250 (25/s), ETA 30s"
+        )
+
+    def test_should_not_count_skipped_killmails_as_rows(self):
+        # given
+        counts = {"killmails": 1, "victims": 1, "attackers": 3, "items": 0, "contained_items": 0, "skipped": 2}
+        # when
+        with patch("killstory.backfill.save_batch", return_value=counts), patch(
+            "killstory.backfill.report"
+        ) as report:
+            saved = save_and_report([(Killmail(killmail_time=datetime.datetime(2024, 1, 1, tzinfo=UTC)), {})] * 3)
+        # then
+        self.assertEqual(saved, counts)
+        report.assert_called_once_with("saved", 3, 5)
+
+    def test_should_format_durations(self):
+        self.assertEqual(format_duration(3), "3s")
+        self.assertEqual(format_duration(123), "2m03s")
+        self.assertEqual(format_duration(3723), "1h02m03s")
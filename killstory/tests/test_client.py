@@ -0,0 +1,89 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from killstory.client import fetch_concurrently, make_request
+from killstory.models import Killmail
+from killstory.tasks import (
+    filter_new_killmails,
+    iter_killmail_list,
+    save_batch,
+)
+
+from .stub_server import StubServer
+from .utils import make_batch
+
+
+class TestFetchConcurrently(TestCase):
+    def test_should_yield_all_results(self):
+        # when
+        results = list(fetch_concurrently(lambda x: x * 2, ((i,) for i in range(50)), 4))
+        # then
+        self.assertEqual(sorted(results), [i * 2 for i in range(50)])
+
+    def test_should_bound_calls_in_flight(self):
+        # given
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def work(_):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        # when
+        list(fetch_concurrently(work, ((i,) for i in range(40)), 3))
+        # then
+        self.assertLessEqual(peak[0], 3)
+
+
+class TestMakeRequest(TestCase):
+    def test_should_reuse_connections(self):
+        with StubServer() as stub:
+            # when
+            for kill_id in range(10):
+                make_request(stub.detail_endpoint.format(kill_id, "abc"))
+            # then
+            self.assertEqual(len(stub.requests), 10)
+            self.assertEqual(stub.connections, 1)
+
+
+class TestFilterNewKillmails(TestCase):
+    def test_should_drop_stored_ids_with_one_query_per_chunk(self):
+        # given
+        save_batch(make_batch(2, 4))
+        killmails = {str(kill_id): "hash" for kill_id in range(1, 6)}
+        # when
+        with patch("killstory.tasks.KILLMAIL_ID_CHUNK_SIZE", 2), self.assertNumQueries(3):
+            result = filter_new_killmails(killmails)
+        # then
+        self.assertEqual(list(result), ["1", "3", "5"])
+
+
+class TestIterKillmailList(TestCase):
+    def test_should_stream_list_in_chunks(self):
+        # given
+        kill_list = {kill_id: f"hash{kill_id}" for kill_id in range(1, 8)}
+        with StubServer({1001: kill_list}) as stub, patch(
+            "killstory.tasks.KILLSTORY_API_LIST_ENDPOINT", stub.list_endpoint
+        ):
+            # when
+            chunks = list(iter_killmail_list(1001, chunk_size=3))
+        # then
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual(
+            [pair for chunk in chunks for pair in chunk],
+            [(str(kill_id), f"hash{kill_id}") for kill_id in range(1, 8)],
+        )
+
+    def test_should_yield_nothing_for_unknown_character(self):
+        with StubServer() as stub, patch(
+            "killstory.tasks.KILLSTORY_API_LIST_ENDPOINT", stub.list_endpoint
+        ), patch("killstory.client.KILLSTORY_RETRY_LIMIT", 1), self.assertLogs(
+            "killstory.client", level="ERROR"
+        ):
+            self.assertEqual(list(iter_killmail_list(1001)), [])
@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from killstory.compact import decode_killmail
+from killstory.models import Killmail, KillmailBlob, Victim, VictimContainedItem, VictimItem
+from killstory.pricing import PriceTable, revalue_stored_killmails
+from killstory.tasks import save_batch
+from killstory.writer import expand_items
+
+from .test_pricing import StaticProvider
+from .utils import make_batch, make_killmail_data
+
+
+@patch("killstory.writer.KILLSTORY_STORAGE_MODE", "compact")
+class TestCompactStorage(TestCase):
+    def test_should_store_blob_instead_of_item_rows(self):
+        # when
+        counts = save_batch(make_batch(1, 2, items=3, contained=2))
+        # then
+        self.assertEqual(counts["victims"], 2)
+        self.assertEqual(counts["items"], 0)
+        self.assertEqual(VictimItem.objects.count(), 0)
+        self.assertEqual(
+            decode_killmail(KillmailBlob.objects.get(pk=1).data), make_killmail_data(1, items=3, contained=2)
+        )
+
+    def test_should_expand_items_once(self):
+        # given
+        save_batch(make_batch(1, 2, items=3, contained=2))
+        # when
+        expanded = expand_items([1, 2])
+        # then
+        self.assertEqual(expanded, 2)
+        self.assertEqual(expand_items([1, 2]), 0)
+        self.assertEqual(VictimItem.objects.filter(victim=Victim.objects.get(killmail_id=1)).count(), 3)
+        self.assertEqual(VictimItem.objects.count(), 6)
+        self.assertEqual(VictimContainedItem.objects.count(), 12)
+        self.assertFalse(KillmailBlob.objects.filter(items_expanded=False).exists())
+
+    def test_should_value_unexpanded_killmails_from_blob(self):
+        # given
+        save_batch(make_batch(1, items=2, contained=1))
+        # when
+        revalue_stored_killmails(Killmail.objects.all(), table=PriceTable(StaticProvider()))
+        # then
+        self.assertEqual(Killmail.objects.get(pk=1).total_value, 1_000_400.0)
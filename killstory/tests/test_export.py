@@ -0,0 +1,132 @@
+import csv
+import io
+import os
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from allianceauth.tests.auth_utils import AuthUtils
+
+from killstory import export
+from killstory.export import export_killmails
+from killstory.models import Killmail
+from killstory.tasks import save_batch
+
+from .utils import make_batch
+
+
+def read_csv(parts):
+    return list(csv.reader(io.StringIO(b"".join(parts).decode())))
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        save_batch(make_batch(1, 2, 3, items=2, contained=1, attackers=2))
+
+    def test_should_export_killmails_one_chunk_at_a_time(self):
+        # when
+        with self.assertNumQueries(3):
+            parts = list(export_killmails(Killmail.objects.all(), "killmails", chunk_size=2))
+        # then
+        rows = read_csv(parts)
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(rows[0][:3], ["killmail_id", "killmail_time", "solar_system_id"])
+        self.assertEqual([row[0] for row in rows[1:]], ["1", "2", "3"])
+        self.assertEqual(rows[1][1], "2024-01-01T12:00:00+00:00")
+
+    def test_should_export_attackers(self):
+        rows = read_csv(export_killmails(Killmail.objects.filter(pk__lte=2), "attackers"))
+        self.assertEqual(len(rows), 1 + 2 * 2)
+        self.assertEqual(rows[1][:2], ["1", "2112000100"])
+
+    def test_should_export_items_with_parent_type(self):
+        rows = read_csv(export_killmails(Killmail.objects.filter(pk=1), "items"))
+        self.assertEqual(
+            [row[:3] for row in rows[1:]],
+            [["1", "", "2000"], ["1", "", "2001"], ["1", "2000", "3000"], ["1", "2001", "3000"]],
+        )
+
+    @patch("killstory.writer.KILLSTORY_STORAGE_MODE", "compact")
+    def test_should_export_items_of_compact_killmails(self):
+        # given
+        save_batch(make_batch(4, items=2, contained=1))
+        # when
+        rows = read_csv(export_killmails(Killmail.objects.filter(pk=4), "items"))
+        # then
+        self.assertEqual(sorted(row[2] for row in rows[1:]), ["2000", "2001", "3000", "3000"])
+
+    def test_should_reject_unknown_table_and_format(self):
+        with self.assertRaises(ValueError):
+            export_killmails(Killmail.objects.all(), "victims")
+        with self.assertRaises(ValueError):
+            export_killmails(Killmail.objects.all(), "killmails", "xlsx")
+
+    @patch("killstory.export.pyarrow", None)
+    def test_should_require_pyarrow_for_parquet(self):
+        with self.assertRaises(ValueError):
+            export_killmails(Killmail.objects.all(), "killmails", "parquet")
+
+    @skipUnless(export.pyarrow, "pyarrow is not installed")
+    def test_should_write_one_row_group_per_chunk(self):
+        # given
+        import pyarrow.parquet
+
+        # when
+        data = b"".join(export_killmails(Killmail.objects.all(), "killmails", "parquet", chunk_size=2))
+        # then
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(data))
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        self.assertEqual(parquet_file.read().column("killmail_id").to_pylist(), [1, 2, 3])
+
+    def test_should_export_to_file_from_command(self):
+        # given
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "attackers.csv")
+            # when
+            call_command("export_killmails", "--table", "attackers", "--output", path, stderr=io.StringIO())
+            # then
+            with open(path, encoding="utf-8") as file:
+                self.assertEqual(len(file.readlines()), 1 + 3 * 2)
+
+    def test_should_reject_invalid_filters_in_command(self):
+        with self.assertRaises(CommandError):
+            call_command("export_killmails", "--alliance", "abc", stdout=io.StringIO())
+
+
+class TestExportView(TestCase):
+    def setUp(self):
+        self.user = AuthUtils.create_user("viewer")
+        AuthUtils.add_main_character_2(self.user, "Viewer", 2112000900)
+        self.client.force_login(self.user)
+        save_batch(make_batch(1, 2) + make_batch(3, corporation_id=98000002))
+
+    def test_should_stream_filtered_csv(self):
+        # when
+        response = self.client.get(
+            reverse("killstory:api_export"), {"corporation_id": "98000002", "role": "victim"}
+        )
+        # then
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = read_csv(response.streaming_content)
+        self.assertEqual([row[0] for row in rows[1:]], ["3"])
+
+    async def test_should_stream_asynchronously_under_asgi(self):
+        # given
+        await sync_to_async(self.async_client.force_login)(self.user)
+        # when
+        response = await self.async_client.get(reverse("killstory:api_export"), {"table": "attackers"})
+        # then
+        self.assertTrue(response.is_async)
+        parts = [part async for part in response.streaming_content]
+        rows = read_csv(parts)
+        self.assertEqual(sorted({row[0] for row in rows[1:]}), ["1", "2", "3"])
+
+    def test_should_reject_unknown_format(self):
+        response = self.client.get(reverse("killstory:api_export"), {"format": "xlsx"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,54 @@
+import json
+
+from django.test import SimpleTestCase
+
+from killstory.jsonstream import IncompleteJSON, iter_object_items
+
+
+def split(data, size):
+    encoded = data.encode() if isinstance(data, str) else data
+    return [encoded[i:i + size] for i in range(0, len(encoded), size)]
+
+
+class TestIterObjectItems(SimpleTestCase):
+    def test_should_parse_any_chunking(self):
+        # given
+        document = {str(120000000 + i): f"{i:040x}" for i in range(200)}
+        text = json.dumps(document, indent=1)
+        for size in (1, 3, 7, 64, len(text)):
+            with self.subTest(size=size):
+                # when
+                result = list(iter_object_items(split(text, size)))
+                # then
+                self.assertEqual(result, list(document.items()))
+
+    def test_should_parse_numbers_split_across_chunks(self):
+        result = list(iter_object_items([b'{"1": 12', b"34", b', "2": 5}']))
+        self.assertEqual(result, [("1", 1234), ("2", 5)])
+
+    def test_should_parse_multibyte_characters_split_across_chunks(self):
+        result = list(iter_object_items(split('{"k": "héé"}', 1)))
+        self.assertEqual(result, [("k", "héé")])
+
+    def test_should_accept_empty_object_and_list(self):
+        self.assertEqual(list(iter_object_items([b" { } "])), [])
+        self.assertEqual(list(iter_object_items([b"[", b"]"])), [])
+
+    def test_should_reject_truncated_stream(self):
+        with self.assertRaises(IncompleteJSON):
+            list(iter_object_items([b'{"1": "abc", "2": "de']))
+
+    def test_should_reject_invalid_json(self):
+        with self.assertRaises(ValueError):
+            list(iter_object_items([b'{"1" "abc"}']))
+
+    def test_should_yield_before_the_stream_ends(self):
+        # given
+        def chunks():
+            yield b'{"1": "a", '
+            raise AssertionError("read too far")
+
+        # when
+        first = next(iter_object_items(chunks()))
+        # then
+        self.assertEqual(first, ("1", "a"))
@@ -0,0 +1,145 @@
+import socket
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from killstory import metrics as metrics_module
+from killstory.metrics import (
+    Histogram,
+    Metrics,
+    StatsdSink,
+    add_to_last_run,
+    last_run,
+    render_prometheus,
+    start_run,
+)
+from killstory.tasks import save_batch
+
+from .utils import make_batch
+
+
+class TestHistogram(TestCase):
+    def test_should_bucket_observations_and_estimate_quantiles(self):
+        # given
+        histogram = Histogram()
+        # when
+        for value in [0.001, 0.002, 0.003, 0.2, 3]:
+            histogram.observe(value)
+        # then
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 3.206)
+        self.assertEqual(histogram.quantile(0.5), 0.005)
+        self.assertEqual(histogram.quantile(0.95), 5)
+
+
+class TestMetrics(TestCase):
+    def test_snapshot_should_return_and_clear_recorded_values(self):
+        # given
+        registry = Metrics()
+        registry.incr("http_requests", 3)
+        with registry.timed("save_batch_seconds"):
+            pass
+        # when
+        counters, histograms = registry.snapshot()
+        # then
+        self.assertEqual(counters["http_requests"], 3)
+        self.assertEqual(histograms["save_batch_seconds"].count, 1)
+        counters, histograms = registry.snapshot()
+        self.assertEqual(counters["http_requests"], 0)
+        self.assertEqual(histograms["save_batch_seconds"].count, 0)
+
+    def test_should_add_snapshots_to_the_run_totals(self):
+        # given
+        start_run()
+        registry = Metrics()
+        registry.incr("rows_killmails", 2)
+        registry.observe("detail_fetch_seconds", 0.02)
+        # when
+        add_to_last_run(*registry.snapshot())
+        registry.incr("rows_killmails", 5)
+        registry.observe("detail_fetch_seconds", 0.3)
+        add_to_last_run(*registry.snapshot())
+        # then
+        counters, histograms = last_run()
+        self.assertEqual(counters["rows_killmails"], 7)
+        self.assertEqual(histograms["detail_fetch_seconds"].count, 2)
+        self.assertAlmostEqual(histograms["detail_fetch_seconds"].sum, 0.32)
+
+    def test_save_batch_should_record_rows_and_timing(self):
+        # given
+        metrics_module.metrics.snapshot()
+        # when
+        save_batch(make_batch(1001, 1002))
+        # then
+        counters, histograms = metrics_module.metrics.snapshot()
+        self.assertEqual(counters["rows_killmails"], 2)
+        self.assertEqual(counters["rows_victims"], 2)
+        self.assertEqual(histograms["save_batch_seconds"].count, 1)
+
+
+class TestSinks(TestCase):
+    def test_render_prometheus_should_emit_cumulative_buckets(self):
+        # given
+        registry = Metrics()
+        registry.incr("http_requests")
+        registry.observe("http_request_seconds", 0.02)
+        registry.observe("http_request_seconds", 20)
+        # when
+        text = render_prometheus(*registry.snapshot())
+        # then
+        self.assertIn("killstory_http_requests_total 1", text)
+        self.assertIn('killstory_http_request_seconds_bucket{le="0.025"} 1', text)
+        self.assertIn('killstory_http_request_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("killstory_http_request_seconds_count 2", text)
+
+    def test_statsd_sink_should_send_counters_and_timings(self):
+        # given
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(2)
+        self.addCleanup(receiver.close)
+        sink = StatsdSink("127.0.0.1", receiver.getsockname()[1])
+        registry = Metrics()
+        registry.incr("http_retries", 2)
+        registry.observe("list_fetch_seconds", 0.5)
+        # when
+        sink.emit(*registry.snapshot())
+        # then
+        lines = {receiver.recv(1024).decode() for _ in range(3)}
+        self.assertEqual(
+            lines,
+            {
+                "killstory.http_retries:2|c",
+                "killstory.list_fetch_seconds.count:1|c",
+                "killstory.list_fetch_seconds:500.000|ms",
+            },
+        )
+
+
+class TestKillstoryStatsCommand(TestCase):
+    def test_should_print_the_last_run_breakdown(self):
+        # given
+        start_run()
+        registry = Metrics()
+        registry.incr("killmails_fetched", 4)
+        registry.observe("json_decode_seconds", 0.004)
+        add_to_last_run(*registry.snapshot())
+        out = StringIO()
+        # when
+        call_command("killstory_stats", stdout=out)
+        # then
+        output = out.getvalue()
+        self.assertIn("Run started", output)
+        self.assertRegex(output, r"json_decode_seconds\s+1\s")
+        self.assertRegex(output, r"killmails_fetched\s+4")
+
+    @patch("killstory.management.commands.killstory_stats.run_started", lambda: None)
+    def test_should_report_when_no_run_was_recorded(self):
+        # given
+        out = StringIO()
+        # when
+        call_command("killstory_stats", stdout=out)
+        # then
+        self.assertIn("No population run recorded yet.", out.getvalue())
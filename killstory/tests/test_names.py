@@ -0,0 +1,210 @@
+from unittest.mock import patch
+
+from celery import current_app
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from allianceauth.tests.auth_utils import AuthUtils
+
+from killstory.app_settings import KILLSTORY_NAMES_MISSING_TIMEOUT
+from killstory.models import EntityName
+from killstory.names import NameResolver, batch_name_ids, name_resolver
+from killstory.tasks import save_batch
+
+from .stub_server import StubServer
+from .utils import make_batch
+
+NAMES = {
+    30000142: ("solar_system", "Jita"),
+    587: ("inventory_type", "Rifter"),
+    2112000001: ("character", "Victim Pilot"),
+    98000001: ("corporation", "Victim Corp"),
+}
+
+
+class NamesTestCase(TestCase):
+    def setUp(self):
+        ids = [*NAMES, 1, 2, 3, 12345, 24690, 2000, 2001, 3000]
+        cache.delete_many([f"killstory:name:{entity_id}" for entity_id in ids])
+        self.addCleanup(cache.delete_many, [f"killstory:name:{entity_id}" for entity_id in ids])
+        name_resolver.clear()
+        self.addCleanup(name_resolver.clear)
+
+    def stubbed(self, names=NAMES):
+        stub = StubServer(names=names)
+        return stub, patch("killstory.names.KILLSTORY_API_NAMES_ENDPOINT", stub.names_endpoint)
+
+
+class TestNameResolver(NamesTestCase):
+    def test_should_resolve_from_table_then_lru(self):
+        # given
+        EntityName.objects.create(id=587, category="inventory_type", name="Rifter")
+        resolver = NameResolver()
+        # when
+        with CaptureQueriesContext(connection) as first:
+            names = resolver.resolve([587, None, 12345])
+        with CaptureQueriesContext(connection) as second:
+            again = resolver.resolve([587])
+        # then
+        self.assertEqual(names, {587: "Rifter"})
+        self.assertEqual(again, {587: "Rifter"})
+        self.assertEqual(len(first.captured_queries), 1)
+        self.assertEqual(len(second.captured_queries), 0)
+
+    def test_should_share_names_through_the_cache(self):
+        # given
+        EntityName.objects.create(id=587, category="inventory_type", name="Rifter")
+        NameResolver().resolve([587])
+        EntityName.objects.all().delete()
+        # when
+        with CaptureQueriesContext(connection) as queries:
+            names = NameResolver().resolve([587])
+        # then
+        self.assertEqual(names, {587: "Rifter"})
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_should_evict_least_recently_used(self):
+        # given
+        EntityName.objects.bulk_create(
+            EntityName(id=entity_id, category="x", name=str(entity_id)) for entity_id in (1, 2, 3)
+        )
+        resolver = NameResolver(lru_size=2)
+        # when
+        resolver.resolve([1, 2])
+        resolver.resolve([1])
+        resolver.resolve([3])
+        # then
+        self.assertEqual(list(resolver._lru), [1, 3])
+
+    def test_should_fetch_missing_names_in_one_request_and_store_them(self):
+        # given
+        stub, endpoint = self.stubbed()
+        # when
+        with stub, endpoint:
+            names = NameResolver().resolve(NAMES)
+        # then
+        self.assertEqual(names[30000142], "Jita")
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(EntityName.objects.get(pk=98000001).category, "corporation")
+
+    def test_should_bisect_around_invalid_ids(self):
+        # given
+        stub, endpoint = self.stubbed()
+        # when
+        with stub, endpoint:
+            plain = NameResolver().resolve([587, 1])
+            bisected = NameResolver().resolve([587, 1], background=True)
+        # then
+        self.assertEqual(plain, {})
+        self.assertEqual(bisected, {587: "Rifter"})
+
+    def test_should_not_ask_esi_again_for_ids_a_page_could_not_resolve(self):
+        # given
+        stub, endpoint = self.stubbed()
+        # when
+        with stub, endpoint:
+            first = NameResolver().resolve([587, 1])
+            again = NameResolver().resolve([587, 1])
+            warmed = NameResolver().resolve([587, 1], background=True)
+        # then: one failed request, then the bisected background requests
+        self.assertEqual((first, again), ({}, {}))
+        self.assertEqual(warmed, {587: "Rifter"})
+        self.assertEqual(len(stub.requests), 4)
+        self.assertEqual(NameResolver().resolve([587, 1]), {587: "Rifter"})
+
+    def test_should_not_wait_for_the_rate_limiter_on_pages(self):
+        # given
+        stub, endpoint = self.stubbed()
+        # when
+        with stub, endpoint, patch("killstory.client.rate_limiter.try_acquire", return_value=False), patch(
+            "killstory.client.rate_limiter.acquire"
+        ) as acquire:
+            names = NameResolver().resolve([587])
+        # then
+        self.assertEqual(names, {})
+        self.assertEqual(stub.requests, [])
+        acquire.assert_not_called()
+
+
+class TestNameWarming(NamesTestCase):
+    def test_should_collect_ids_of_a_batch(self):
+        ids = batch_name_ids(make_batch(1, items=1, contained=1, attackers=1))
+        self.assertTrue({30000142, 587, 2112000001, 98000001, 24690, 2488, 2000, 3000} <= ids)
+
+    def test_should_warm_unknown_names_after_saving(self):
+        # given
+        self.addCleanup(setattr, current_app.conf, "task_always_eager", current_app.conf.task_always_eager)
+        current_app.conf.task_always_eager = True
+        EntityName.objects.create(id=587, category="inventory_type", name="Rifter")
+        names = {**{entity_id: ("x", str(entity_id)) for entity_id in batch_name_ids(make_batch(1))}, **NAMES}
+        stub, endpoint = self.stubbed(names)
+        # when
+        with stub, endpoint, patch("killstory.tasks.KILLSTORY_API_NAMES_ENDPOINT", stub.names_endpoint):
+            save_batch(make_batch(1))
+        # then
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(EntityName.objects.get(pk=30000142).name, "Jita")
+
+
+class TestNamesOnPages(NamesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = AuthUtils.create_user("viewer")
+        AuthUtils.add_main_character_2(self.user, "Viewer", 2112000900)
+        self.client.force_login(self.user)
+        EntityName.objects.bulk_create(
+            EntityName(id=entity_id, category=category, name=name) for entity_id, (category, name) in NAMES.items()
+        )
+
+    def test_should_show_names_on_index_with_one_lookup(self):
+        # given
+        save_batch(make_batch(*range(1, 101)))
+        # when
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("killstory:index"))
+        # then
+        self.assertContains(response, "<td>Jita</td>", count=50, html=True)
+        self.assertContains(response, "<td>Victim Pilot</td>", count=50, html=True)
+        self.assertEqual(len([q for q in queries.captured_queries if "kill_entity_name" in q["sql"]]), 1)
+
+    def test_should_show_names_on_detail(self):
+        # given
+        save_batch(make_batch(1))
+        cache.delete("killstory:kill_detail:2:1")
+        self.addCleanup(cache.delete, "killstory:kill_detail:2:1")
+        # when
+        response = self.client.get(reverse("killstory:kill_detail", args=[1]))
+        # then
+        self.assertContains(response, "<td>Rifter</td>", html=True)
+        self.assertContains(response, "Jita")
+        self.assertContains(response, "<td>24690</td>", html=True)
+
+    @patch("killstory.names.KILLSTORY_API_NAMES_ENDPOINT", "")
+    def test_should_cache_detail_with_raw_ids_only_briefly(self):
+        # given
+        save_batch(make_batch(1))
+        cache.delete("killstory:kill_detail:2:1")
+        self.addCleanup(cache.delete, "killstory:kill_detail:2:1")
+        # when
+        self.client.get(reverse("killstory:kill_detail", args=[1]))
+        # then
+        self.assertLessEqual(cache.ttl("killstory:kill_detail:2:1"), KILLSTORY_NAMES_MISSING_TIMEOUT)
+
+    def test_should_cache_detail_forever_once_every_name_is_resolved(self):
+        # given
+        batch = make_batch(1)
+        ids = batch_name_ids(batch)
+        EntityName.objects.bulk_create(
+            [EntityName(id=entity_id, category="x", name=str(entity_id)) for entity_id in ids], ignore_conflicts=True
+        )
+        self.addCleanup(cache.delete_many, [f"killstory:name:{entity_id}" for entity_id in ids])
+        save_batch(batch)
+        cache.delete("killstory:kill_detail:2:1")
+        self.addCleanup(cache.delete, "killstory:kill_detail:2:1")
+        # when
+        self.client.get(reverse("killstory:kill_detail", args=[1]))
+        # then
+        self.assertIsNone(cache.ttl("killstory:kill_detail:2:1"))
@@ -0,0 +1,125 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from killstory.pipeline import SavePipeline, killmail_bytes, killmail_rows
+
+from .utils import make_killmail_data
+
+
+class FakeStages:
+    """Fetch and save stages recording their calls, the save optionally slow."""
+
+    def __init__(self, save_delay=0.0):
+        self.save_delay = save_delay
+        self.fetches = 0
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def fetch(self, kill_id, kill_hash):
+        with self.lock:
+            self.fetches += 1
+        return make_killmail_data(kill_id) if kill_hash else {}
+
+    def save(self, batch):
+        time.sleep(self.save_delay)
+        self.batches.append(list(batch))
+        return {"killmails": len(batch)}
+
+
+def pairs(*kill_ids):
+    return [(kill_id, f"hash{kill_id}") for kill_id in kill_ids]
+
+
+class TestSavePipeline(SimpleTestCase):
+    def test_should_count_rows_and_bytes(self):
+        # given
+        killmail_data = make_killmail_data(1, items=2, contained=1, attackers=3)
+        # then
+        self.assertEqual(killmail_rows(killmail_data), 1 + 1 + 3 + 2 * 2)
+        self.assertGreater(killmail_bytes(killmail_data), 500)
+
+    def test_should_flush_by_row_count(self):
+        # given
+        stages = FakeStages()
+        rows = killmail_rows(make_killmail_data(1))
+        pipeline = SavePipeline(stages.fetch, stages.save, max_rows=3 * rows, max_bytes=10 ** 9)
+        # when
+        fetched = pipeline.run(pairs(*range(1, 11)) + [(11, "")], lambda data: data["killmail_id"])
+        # then
+        self.assertEqual(fetched, 10)
+        self.assertEqual(pipeline.saved, 10)
+        self.assertEqual([len(batch) for batch in stages.batches], [3, 3, 3, 1])
+        self.assertEqual(sorted(sum(stages.batches, [])), list(range(1, 11)))
+
+    def test_should_flush_by_byte_size(self):
+        # given
+        stages = FakeStages()
+        size = killmail_bytes(make_killmail_data(1))
+        pipeline = SavePipeline(stages.fetch, stages.save, max_rows=10 ** 9, max_bytes=2 * size)
+        # when
+        pipeline.run(pairs(*range(1, 6)), lambda data: data)
+        # then
+        self.assertEqual([len(batch) for batch in stages.batches], [2, 2, 1])
+
+    def test_should_read_pairs_lazily_in_the_calling_thread(self):
+        # given
+        stages = FakeStages()
+        pipeline = SavePipeline(stages.fetch, stages.save, max_rows=1, queue_size=2, max_workers=1)
+        reads = []
+
+        def read_pairs():
+            for pair in pairs(*range(1, 51)):
+                reads.append((threading.current_thread(), len(stages.batches)))
+                yield pair
+
+        # when
+        pipeline.run(read_pairs(), lambda data: data)
+        # then
+        self.assertEqual(pipeline.saved, 50)
+        self.assertEqual({thread for thread, _ in reads}, {threading.current_thread()})
+        # Batches were saved before the last pair was read
+        self.assertGreater(reads[-1][1], 0)
+
+    def test_should_stop_fetching_while_saves_are_behind(self):
+        # given
+        stages = FakeStages(save_delay=0.05)
+        pipeline = SavePipeline(stages.fetch, stages.save, max_rows=1, queue_size=2, max_workers=1)
+        fetches_at_first_save = []
+        save = stages.save
+        stages.save = lambda batch: fetches_at_first_save.append(stages.fetches) or save(batch)
+        # when
+        pipeline.run(pairs(*range(1, 21)), lambda data: data)
+        # then
+        self.assertEqual(pipeline.saved, 20)
+        self.assertLessEqual(pipeline.peak_queued, 2)
+        # Saved, queued, held by the producer and in flight in the pool
+        self.assertTrue(all(
+            fetches <= saved + 1 + 2 + 1 + 2 for saved, fetches in enumerate(fetches_at_first_save)
+        ))
+
+    def test_should_raise_fetch_errors(self):
+        # given
+        def fetch(kill_id, kill_hash):
+            raise ValueError("boom")
+
+        pipeline = SavePipeline(fetch, FakeStages().save)
+        # when/then
+        with self.assertRaises(ValueError):
+            pipeline.run(pairs(1, 2), lambda data: data)
+
+    def test_should_stop_producer_when_save_fails(self):
+        # given
+        stages = FakeStages()
+
+        def save(batch):
+            raise ValueError("boom")
+
+        pipeline = SavePipeline(stages.fetch, save, max_rows=1, queue_size=1, max_workers=1)
+        # when
+        with self.assertRaises(ValueError):
+            pipeline.run(pairs(*range(1, 101)), lambda data: data)
+        # then
+        self.assertLess(stages.fetches, 100)
+        self.assertFalse(any(thread.name == "killstory-pipeline" for thread in threading.enumerate()))
@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from killstory.models import Killmail
+from killstory.pricing import (
+    FilePriceProvider,
+    PriceTable,
+    parse_prices,
+    value_killmails,
+)
+from killstory.tasks import save_batch
+
+from .utils import make_batch
+
+PRICES = {587: 1_000_000.0, 2000: 100.0, 2001: 200.0, 3000: 5.0}
+
+
+class StaticProvider:
+    def __init__(self, prices=PRICES):
+        self.prices = prices
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        if isinstance(self.prices, Exception):
+            raise self.prices
+        return dict(self.prices)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPriceProviders(TestCase):
+    def test_should_parse_esi_market_prices(self):
+        # given
+        data = [
+            {"type_id": 587, "average_price": 10.5, "adjusted_price": 9.0},
+            {"type_id": 588, "adjusted_price": 3.0},
+            {"type_id": 589},
+        ]
+        # when/then
+        self.assertEqual(parse_prices(data), {587: 10.5, 588: 3.0})
+
+    def test_should_load_json_and_csv_files(self):
+        # given
+        directory = tempfile.mkdtemp()
+        json_path = os.path.join(directory, "prices.json")
+        csv_path = os.path.join(directory, "prices.csv")
+        with open(json_path, "w", encoding="utf-8") as file:
+            json.dump({"587": 10.5}, file)
+        with open(csv_path, "w", encoding="utf-8") as file:
+            file.write("type_id,price\n587,10.5\n588,2\n")
+        # when/then
+        self.assertEqual(FilePriceProvider(json_path).load(), {587: 10.5})
+        self.assertEqual(FilePriceProvider(csv_path).load(), {587: 10.5, 588: 2.0})
+
+
+class TestPriceTable(TestCase):
+    def test_should_reload_prices_when_stale(self):
+        # given
+        provider, clock = StaticProvider(), FakeClock()
+        table = PriceTable(provider, refresh_interval=60, clock=clock)
+        table.prices()
+        # when
+        clock.now = 30
+        table.prices()
+        clock.now = 61
+        prices = table.prices()
+        # then
+        self.assertEqual(provider.loads, 2)
+        self.assertEqual(prices, PRICES)
+
+    def test_should_keep_previous_prices_when_reload_fails(self):
+        # given
+        provider, clock = StaticProvider(), FakeClock()
+        table = PriceTable(provider, refresh_interval=60, clock=clock)
+        table.prices()
+        provider.prices = ValueError("unavailable")
+        clock.now = 61
+        # when
+        with self.assertLogs("killstory.pricing", level="WARNING"):
+            prices = table.prices()
+        # then
+        self.assertEqual(prices, PRICES)
+
+
+class TestValuation(TestCase):
+    def setUp(self):
+        self.table = PriceTable(StaticProvider())
+
+    def test_should_value_destroyed_and_dropped_items(self):
+        # given
+        batch = make_batch(1, items=2, contained=1)
+        # when
+        value_killmails(batch, self.table)
+        # then: ship and destroyed items, contained items were dropped
+        killmail = batch[0][0]
+        self.assertEqual(killmail.destroyed_value, 1_000_300.0)
+        self.assertEqual(killmail.dropped_value, 100.0)
+        self.assertEqual(killmail.total_value, 1_000_400.0)
+
+    def test_should_not_value_blueprint_copies(self):
+        # given
+        batch = make_batch(1, items=1, contained=0)
+        batch[0][1]["victim"]["items"][0]["singleton"] = 2
+        # when
+        value_killmails(batch, self.table)
+        # then
+        self.assertEqual(batch[0][0].total_value, 1_000_000.0)
+
+    def test_should_store_values_when_saving(self):
+        # given
+        with patch("killstory.pricing.get_price_table", return_value=self.table):
+            # when
+            save_batch(make_batch(1))
+        # then
+        self.assertEqual(Killmail.objects.get(pk=1).total_value, 1_000_400.0)
+
+    def test_should_load_prices_outside_the_save_transaction(self):
+        # given
+        depths = []
+        provider = StaticProvider()
+        provider.load = lambda: depths.append(len(connection.atomic_blocks)) or dict(PRICES)
+        outer_depth = len(connection.atomic_blocks)
+        # when
+        with patch("killstory.pricing.get_price_table", return_value=PriceTable(provider)):
+            save_batch(make_batch(1))
+        # then
+        self.assertEqual(depths, [outer_depth])
+        self.assertEqual(Killmail.objects.get(pk=1).total_value, 1_000_400.0)
+
+    def test_command_should_value_stored_killmails_from_item_rows(self):
+        # given
+        save_batch(make_batch(1, 2, items=2, contained=1))
+        out = StringIO()
+        # when
+        with patch("killstory.pricing.get_price_table", return_value=self.table):
+            call_command("value_killmails", stdout=out)
+        # then
+        self.assertIn("Valued 2 killmails.", out.getvalue())
+        self.assertEqual(
+            list(Killmail.objects.values_list("destroyed_value", "dropped_value", "total_value")),
+            [(1_000_300.0, 100.0, 1_000_400.0)] * 2,
+        )
@@ -0,0 +1,104 @@
+from unittest.mock import Mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from killstory.ratelimit import (
+    ERROR_LIMIT_KEY,
+    EsiRateLimiter,
+    reset_throttle_stats,
+    throttle_stats,
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.25):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 2))
+        self.now += seconds
+
+
+def make_response(status_code=200, remain=None, reset=None):
+    headers = {}
+    if remain is not None:
+        headers["X-Esi-Error-Limit-Remain"] = str(remain)
+    if reset is not None:
+        headers["X-Esi-Error-Limit-Reset"] = str(reset)
+    return Mock(status_code=status_code, headers=headers)
+
+
+class TestEsiRateLimiter(TestCase):
+    def setUp(self):
+        cache.delete(ERROR_LIMIT_KEY)
+        cache.delete_many([f"killstory:esi:bucket:{window}" for window in range(990, 1200)])
+        reset_throttle_stats()
+        self.clock = FakeClock()
+        self.limiter = EsiRateLimiter(
+            rate=5, error_threshold=10, error_slowdown=50, clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def test_should_pace_requests_to_the_rate(self):
+        # when
+        for _ in range(12):
+            self.limiter.acquire()
+        # then
+        self.assertEqual(self.clock.sleeps, [0.75, 1.0])
+        self.assertEqual(throttle_stats(), {"throttled_seconds": 1.75, "throttled_count": 2})
+
+    def test_should_share_the_bucket_between_limiters(self):
+        # given
+        other = EsiRateLimiter(rate=5, clock=self.clock, sleep=self.clock.sleep)
+        # when
+        for _ in range(3):
+            self.limiter.acquire()
+            other.acquire()
+        # then
+        self.assertEqual(self.clock.sleeps, [0.75])
+
+    def test_should_pause_until_reset_when_error_budget_is_spent(self):
+        # given
+        self.limiter.update(make_response(200, remain=8, reset=30))
+        # when
+        self.limiter.acquire()
+        # then
+        self.assertEqual(self.clock.sleeps, [30.0])
+
+    def test_should_pause_after_error_limited_response(self):
+        # given
+        self.limiter.update(make_response(420, remain=None, reset=12))
+        # when
+        self.limiter.acquire()
+        # then
+        self.assertEqual(self.clock.sleeps, [12.0])
+
+    def test_should_refuse_instead_of_waiting(self):
+        # when
+        taken = [self.limiter.try_acquire() for _ in range(6)]
+        self.limiter.update(make_response(420, remain=None, reset=12))
+        self.clock.now += 1
+        # then
+        self.assertEqual(taken, [True] * 5 + [False])
+        self.assertFalse(self.limiter.try_acquire())
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_should_shrink_bucket_when_error_budget_is_low(self):
+        # given
+        self.limiter.update(make_response(200, remain=20, reset=50))
+        # when
+        for _ in range(3):
+            self.limiter.acquire()
+        # then
+        self.assertEqual(self.limiter.bucket_size(20), 2)
+        self.assertEqual(self.clock.sleeps, [0.75])
+
+    def test_should_ignore_responses_without_headers(self):
+        # when
+        self.limiter.update(make_response(200))
+        # then
+        self.assertEqual(self.limiter.error_limit(), (None, None))
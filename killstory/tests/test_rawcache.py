@@ -0,0 +1,73 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from killstory.rawcache import RawKillmailCache
+from killstory.tasks import fetch_killmail_details
+
+from .stub_server import StubServer
+from .utils import make_killmail_data
+
+
+class TestRawKillmailCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = RawKillmailCache(self.directory.name, max_bytes=10 ** 9)
+
+    def test_should_store_and_return_killmails(self):
+        # given
+        data = make_killmail_data(1)
+        # when
+        self.cache.put(1, "abcdef", data)
+        # then
+        self.assertEqual(self.cache.get(1, "abcdef"), data)
+        self.assertIsNone(self.cache.get(1, "other"))
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory.name, "ab", "1-abcdef.json.gz"))
+        )
+
+    def test_should_discard_corrupt_files(self):
+        # given
+        path = self.cache.path(1, "abcdef")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as file:
+            file.write(b"not gzip")
+        # when
+        with self.assertLogs("killstory.rawcache", level="WARNING"):
+            result = self.cache.get(1, "abcdef")
+        # then
+        self.assertIsNone(result)
+        self.assertFalse(os.path.exists(path))
+
+    def test_should_evict_least_recently_used(self):
+        # given
+        for kill_id in range(10):
+            self.cache.put(kill_id, f"hash{kill_id}", make_killmail_data(kill_id))
+            os.utime(self.cache.path(kill_id, f"hash{kill_id}"), (kill_id, kill_id))
+        self.cache.get(0, "hash0")
+        size = os.path.getsize(self.cache.path(0, "hash0"))
+        self.cache.max_bytes = size * 5
+        # when
+        evicted = self.cache.evict()
+        # then
+        self.assertGreaterEqual(evicted, 5)
+        self.assertIsNotNone(self.cache.get(0, "hash0"))
+        self.assertIsNone(self.cache.get(1, "hash1"))
+        self.assertIsNotNone(self.cache.get(9, "hash9"))
+
+
+class TestFetchKillmailDetailsWithCache(TestCase):
+    def test_should_only_hit_network_once(self):
+        # given
+        with tempfile.TemporaryDirectory() as directory, StubServer() as stub, patch(
+            "killstory.tasks.KILLSTORY_API_DETAIL_ENDPOINT", stub.detail_endpoint
+        ), patch("killstory.tasks.raw_cache", RawKillmailCache(directory)):
+            # when
+            first = fetch_killmail_details(7, "abc123")
+            second = fetch_killmail_details(7, "abc123")
+        # then
+        self.assertEqual(first, second)
+        self.assertEqual(len(stub.requests), 1)
@@ -0,0 +1,83 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from killstory.models import EntityStats
+from killstory.stats import add_entity_stats, entity_stat_deltas, month_of
+from killstory.tasks import save_batch
+
+from .utils import make_batch
+
+
+def stats_of(entity_type, entity_id):
+    return EntityStats.objects.filter(entity_type=entity_type, entity_id=entity_id).values(
+        "period", "kills", "losses", "damage_done", "damage_taken", "final_blows"
+    ).get()
+
+
+class TestEntityStats(TestCase):
+    def test_should_add_statistics_of_new_killmails(self):
+        # when
+        save_batch(make_batch(1, 2, attackers=3))
+        # then
+        self.assertEqual(
+            stats_of(EntityStats.CORPORATION, 98000100),
+            {
+                "period": datetime.date(2024, 1, 1),
+                "kills": 2,
+                "losses": 0,
+                "damage_done": 3000,
+                "damage_taken": 0,
+                "final_blows": 2,
+            },
+        )
+        self.assertEqual(stats_of(EntityStats.CHARACTER, 2112000001)["losses"], 2)
+        self.assertEqual(stats_of(EntityStats.ALLIANCE, 99000001)["damage_taken"], 2000)
+
+    def test_should_not_count_replayed_killmails_twice(self):
+        # given
+        save_batch(make_batch(1))
+        # when
+        save_batch(make_batch(1, 2))
+        # then
+        self.assertEqual(stats_of(EntityStats.CORPORATION, 98000100)["kills"], 2)
+        self.assertEqual(stats_of(EntityStats.CORPORATION, 98000001)["losses"], 2)
+
+    def test_should_lock_existing_rows_before_inserting_only_missing_ones(self):
+        # given
+        save_batch(make_batch(1))
+        deltas = entity_stat_deltas(make_batch(2, corporation_id=98000002))
+        # when
+        with CaptureQueriesContext(connection) as queries:
+            add_entity_stats(deltas)
+        # then: only the new victim corporation's row is inserted, after the lock
+        sql = [query["sql"] for query in queries.captured_queries if "kill_entity_stats" in query["sql"]]
+        self.assertTrue(sql[0].startswith("SELECT"))
+        inserts = [statement for statement in sql if statement.startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn("98000002", inserts[0])
+        self.assertEqual(stats_of(EntityStats.CORPORATION, 98000100)["kills"], 2)
+        self.assertEqual(stats_of(EntityStats.CORPORATION, 98000002)["losses"], 1)
+
+    def test_rebuild_should_match_incremental_statistics(self):
+        # given
+        save_batch(make_batch(1, 2, attackers=3))
+        save_batch(make_batch(3, corporation_id=98000002))
+        expected = list(EntityStats.objects.order_by("entity_type", "entity_id").values())
+        EntityStats.objects.update(kills=0)
+        out = StringIO()
+        # when
+        call_command("rebuild_entity_stats", stdout=out)
+        # then
+        self.assertIn("Rebuilt 9 entity statistics rows.", out.getvalue())
+        rebuilt = list(EntityStats.objects.order_by("entity_type", "entity_id").values())
+        for row in expected + rebuilt:
+            del row["id"]
+        self.assertEqual(rebuilt, expected)
+
+    def test_month_of_should_use_utc(self):
+        self.assertEqual(month_of("2024-02-29T23:30:00-02:00"), datetime.date(2024, 3, 1))
@@ -0,0 +1,43 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from killstory.models import Killmail
+from killstory.summary import SUMMARY_FIELDS
+from killstory.tasks import save_batch
+
+from .utils import make_batch
+
+
+class TestKillmailSummary(TestCase):
+    def test_should_summarize_killmails_when_saving(self):
+        # when
+        save_batch(make_batch(1, attackers=3, alliance_id=None))
+        # then
+        self.assertEqual(
+            Killmail.objects.values(*SUMMARY_FIELDS).get(),
+            {
+                "victim_ship_type_id": 587,
+                "victim_character_id": 2112000001,
+                "victim_corporation_id": 98000001,
+                "victim_alliance_id": None,
+                "final_blow_ship_type_id": 24690,
+                "final_blow_character_id": 2112000100,
+                "final_blow_corporation_id": 98000100,
+                "final_blow_alliance_id": 99000100,
+                "attacker_count": 3,
+            },
+        )
+
+    def test_backfill_should_summarize_stored_killmails(self):
+        # given
+        save_batch(make_batch(1, 2, attackers=4))
+        expected = list(Killmail.objects.order_by("pk").values(*SUMMARY_FIELDS))
+        Killmail.objects.filter(pk=2).update(**dict.fromkeys(SUMMARY_FIELDS))
+        out = StringIO()
+        # when
+        call_command("backfill_summaries", stdout=out)
+        # then
+        self.assertIn("Summarized 1 killmails.", out.getvalue())
+        self.assertEqual(list(Killmail.objects.order_by("pk").values(*SUMMARY_FIELDS)), expected)
@@ -1,4 +1,24 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from celery import current_app
 from django.test import TestCase
+from django.utils import timezone
+
+from killstory.models import CharacterCheckpoint, Killmail
+from killstory.tasks import (
+    fetch_and_save_killmails,
+    get_due_character_ids,
+    log_population_totals,
+    populate_character_killmails,
+    populate_killmails,
+    record_character_checkpoint,
+    save_batch,
+    sum_results,
+)
+
+from .stub_server import StubServer
+from .utils import create_owned_character, make_batch
 
 
 class TestTasks(TestCase):
@@ -9,3 +29,217 @@ class TestTasks(TestCase):
         ...
         # then
         ...
+
+
+class PopulateTestCase(TestCase):
+    def setUp(self):
+        self.addCleanup(
+            setattr, current_app.conf, "task_always_eager", current_app.conf.task_always_eager
+        )
+        current_app.conf.task_always_eager = True
+        create_owned_character(1001)
+        create_owned_character(1002)
+        self.kill_lists = {
+            1001: {kill_id: f"hash{kill_id}" for kill_id in range(1, 8)},
+            1002: {kill_id: f"hash{kill_id}" for kill_id in range(5, 12)},
+        }
+
+    def run_eager(self, task, *args):
+        with StubServer(self.kill_lists) as self.stub, patch(
+            "killstory.tasks.KILLSTORY_API_LIST_ENDPOINT", self.stub.list_endpoint
+        ), patch(
+            "killstory.tasks.KILLSTORY_API_DETAIL_ENDPOINT", self.stub.detail_endpoint
+        ), patch(
+            "killstory.tasks.KILLSTORY_BATCH_SIZE", 3
+        ):
+            return task.apply(args=args)
+
+
+class TestPopulateKillmails(PopulateTestCase):
+    def test_should_fan_out_one_task_per_character(self):
+        # when
+        self.run_eager(populate_killmails)
+        # then
+        self.assertEqual(
+            sorted(Killmail.objects.values_list("pk", flat=True)), list(range(1, 12))
+        )
+
+    def test_should_use_chord_when_result_backend_is_configured(self):
+        # given
+        with patch("killstory.tasks.current_app") as app, patch(
+            "killstory.tasks.chord"
+        ) as chord:
+            app.backend = object()
+            # when
+            populate_killmails()
+        # then
+        header = chord.call_args[0][0]
+        self.assertEqual(len(header.tasks), 2)
+        callback = chord.return_value.call_args[0][0]
+        self.assertEqual(callback.task, log_population_totals.name)
+        self.assertEqual(callback.args, (2,))
+
+    def test_should_replace_character_task_with_chunks(self):
+        # when
+        result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(sum_results(result.get()), 7)
+        self.assertEqual(Killmail.objects.count(), 7)
+
+    def test_should_return_zero_without_new_killmails(self):
+        # given
+        save_batch(make_batch(*range(1, 8)))
+        # when
+        result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(result.get(), 0)
+
+    def test_should_fetch_and_save_a_chunk(self):
+        # when
+        result = self.run_eager(fetch_and_save_killmails, [[3, "hash3"], [4, "hash4"]])
+        # then
+        self.assertEqual(result.get(), 2)
+        self.assertEqual(Killmail.objects.count(), 2)
+
+    def test_should_log_totals(self):
+        with self.assertLogs("killstory.tasks", level="INFO") as logs:
+            log_population_totals([[3, 2], 0, [4]], 3)
+        self.assertIn("9 killmails processed for 3 characters", logs.output[0])
+
+
+class TestCharacterCheckpoints(PopulateTestCase):
+    def test_should_record_checkpoint_once_chunks_are_saved(self):
+        # when
+        self.run_eager(populate_character_killmails, 1001)
+        # then
+        checkpoint = CharacterCheckpoint.objects.get(pk=1001)
+        self.assertEqual(checkpoint.last_killmail_id, 7)
+        self.assertIsNotNone(checkpoint.list_fetched_at)
+
+    def test_should_record_checkpoint_in_chord_callback_with_result_backend(self):
+        # given
+        with patch("killstory.tasks.current_app") as app, patch.object(
+            populate_character_killmails, "replace"
+        ) as replace:
+            app.backend = object()
+            # when
+            self.run_eager(populate_character_killmails, 1001)
+        # then
+        workflow = replace.call_args[0][0]
+        self.assertEqual(len(workflow.tasks), 3)
+        self.assertEqual(workflow.body.task, record_character_checkpoint.name)
+        character_id, listing = workflow.body.args
+        self.assertEqual((character_id, listing["newest"], listing["new"]), (1001, 7, 7))
+        self.assertFalse(CharacterCheckpoint.objects.exists())
+
+    def test_should_only_fetch_killmails_not_stored(self):
+        # given
+        save_batch(make_batch(1, 2, 3, 4, 5))
+        CharacterCheckpoint.objects.create(
+            character_id=1001,
+            last_killmail_id=5,
+            list_fetched_at=timezone.now() - timedelta(days=2),
+        )
+        # when
+        result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(sum_results(result.get()), 2)
+        self.assertEqual(
+            sorted(path for path, _ in self.stub.requests),
+            ["/killmails/6/hash6/", "/killmails/7/hash7/", "/list/1001.json"],
+        )
+
+    def test_should_fetch_killmails_listed_below_the_last_killmail(self):
+        # given: kill 4 shows up in the list after kill 7 was checkpointed
+        del self.kill_lists[1001][4]
+        self.run_eager(populate_character_killmails, 1001)
+        CharacterCheckpoint.objects.filter(pk=1001).update(
+            list_fetched_at=timezone.now() - timedelta(days=2)
+        )
+        self.kill_lists[1001][4] = "hash4"
+        # when
+        result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(sum_results(result.get()), 1)
+        self.assertEqual(
+            sorted(Killmail.objects.values_list("pk", flat=True)), list(range(1, 8))
+        )
+        self.assertEqual(CharacterCheckpoint.objects.get(pk=1001).last_killmail_id, 7)
+
+    def test_should_skip_characters_fetched_recently(self):
+        # given
+        CharacterCheckpoint.objects.create(character_id=1001, list_fetched_at=timezone.now())
+        # when
+        result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(result.get(), 0)
+        self.assertEqual(get_due_character_ids(), [1002])
+
+    @patch("killstory.tasks.KILLSTORY_CHARACTERS_PER_RUN", 1)
+    def test_should_start_with_characters_never_fetched(self):
+        # given
+        CharacterCheckpoint.objects.create(
+            character_id=1001, list_fetched_at=timezone.now() - timedelta(days=2)
+        )
+        # when/then
+        self.assertEqual(get_due_character_ids(), [1002])
+
+    def test_should_keep_last_killmail_when_some_were_not_saved(self):
+        # given
+        fetched_at = timezone.now()
+        # when
+        saved = record_character_checkpoint(
+            [1, [2]], 1001, {"newest": 9, "new": 4, "fetched_at": fetched_at.isoformat()}
+        )
+        # then
+        self.assertEqual(saved, 3)
+        checkpoint = CharacterCheckpoint.objects.get(pk=1001)
+        self.assertIsNone(checkpoint.last_killmail_id)
+        self.assertEqual(checkpoint.list_fetched_at, fetched_at)
+
+    def test_should_count_killmails_stored_by_another_task_as_processed(self):
+        # given: kills 1 to 3 are saved by another character's task once the list was read
+        save_batch(make_batch(1, 2, 3))
+        with patch("killstory.tasks.filter_new_killmails", side_effect=lambda killmails: killmails):
+            # when
+            result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(sum_results(result.get()), 7)
+        checkpoint = CharacterCheckpoint.objects.get(pk=1001)
+        self.assertEqual(checkpoint.last_killmail_id, 7)
+        self.assertTrue(checkpoint.list_etag)
+
+    def test_should_skip_unchanged_lists(self):
+        # given
+        self.run_eager(populate_character_killmails, 1001)
+        etag = CharacterCheckpoint.objects.get(pk=1001).list_etag
+        CharacterCheckpoint.objects.filter(pk=1001).update(
+            list_fetched_at=timezone.now() - timedelta(days=2)
+        )
+        # when
+        result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(result.get(), 0)
+        self.assertEqual(len(self.stub.requests), 1)
+        path, headers = self.stub.requests[0]
+        self.assertEqual(path, "/list/1001.json")
+        self.assertEqual(headers["If-None-Match"], etag)
+        checkpoint = CharacterCheckpoint.objects.get(pk=1001)
+        self.assertEqual(checkpoint.list_etag, etag)
+        self.assertGreater(checkpoint.list_fetched_at, timezone.now() - timedelta(minutes=1))
+
+    def test_should_fetch_changed_lists(self):
+        # given
+        self.run_eager(populate_character_killmails, 1001)
+        etag = CharacterCheckpoint.objects.get(pk=1001).list_etag
+        CharacterCheckpoint.objects.filter(pk=1001).update(
+            list_fetched_at=timezone.now() - timedelta(days=2)
+        )
+        self.kill_lists[1001][8] = "hash8"
+        # when
+        result = self.run_eager(populate_character_killmails, 1001)
+        # then
+        self.assertEqual(sum_results(result.get()), 1)
+        checkpoint = CharacterCheckpoint.objects.get(pk=1001)
+        self.assertEqual(checkpoint.last_killmail_id, 8)
+        self.assertNotEqual(checkpoint.list_etag, etag)
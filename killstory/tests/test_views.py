@@ -0,0 +1,176 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from allianceauth.tests.auth_utils import AuthUtils
+
+from killstory.models import Killmail
+from killstory.names import batch_name_ids
+from killstory.pagination import decode_cursor, encode_cursor
+from killstory.views import kill_detail_cache_key
+from killstory.tasks import save_batch
+
+from .utils import make_batch
+
+
+def save_killmails(count, start=1):
+    """Saves killmails one minute apart, the highest id being the newest."""
+    batch = make_batch(*range(start, start + count))
+    base = parse_datetime("2024-01-01T00:00:00Z")
+    for killmail, _ in batch:
+        killmail.killmail_time = base + timedelta(minutes=killmail.killmail_id // 2)
+    save_batch(batch)
+
+
+class TestCursor(TestCase):
+    def test_should_round_trip(self):
+        killmail_time = parse_datetime("2024-01-01T12:34:56.123456Z")
+        self.assertEqual(
+            decode_cursor(encode_cursor(killmail_time, 42)), (killmail_time, 42)
+        )
+
+    def test_should_reject_malformed_cursors(self):
+        for cursor in (None, "", "abc", "1_2_3", "x_1"):
+            self.assertIsNone(decode_cursor(cursor))
+
+
+class TestKillstoryView(TestCase):
+    def setUp(self):
+        self.user = AuthUtils.create_user("viewer")
+        AuthUtils.add_main_character_2(self.user, "Viewer", 2112000900)
+        self.client.force_login(self.user)
+
+    def test_should_show_empty_message(self):
+        response = self.client.get(reverse("killstory:index"))
+        self.assertContains(response, "No kill mails available")
+
+    def test_should_show_killmail_value(self):
+        # given
+        batch = make_batch(1, 2)
+        batch[0][0].total_value = 1_000_400.4
+        save_batch(batch)
+        # when
+        response = self.client.get(reverse("killstory:index"))
+        # then
+        self.assertContains(response, "<td>1,000,400</td>", html=True)
+        self.assertContains(response, "<td>-</td>", html=True)
+
+    def test_should_list_killmails_from_a_single_table(self):
+        # given
+        save_killmails(3)
+        # when
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("killstory:index"))
+        # then
+        self.assertContains(response, "<td>2112000001</td>", count=3, html=True)
+        self.assertFalse(
+            [query for query in queries.captured_queries if "kill_victim" in query["sql"]]
+        )
+
+    def test_should_page_through_all_killmails_newest_first(self):
+        # given
+        save_killmails(7)
+        seen, cursor = [], None
+        # when
+        with patch("killstory.views.KILLSTORY_PAGE_SIZE", 3):
+            for _ in range(5):
+                url = reverse("killstory:index")
+                response = self.client.get(url, {"before": cursor} if cursor else {})
+                seen += [kill.killmail_id for kill in response.context["kill_killmails"]]
+                cursor = response.context["next_cursor"]
+                if not cursor:
+                    break
+        # then
+        self.assertEqual(seen, [7, 6, 5, 4, 3, 2, 1])
+
+    @patch("killstory.views.KILLSTORY_PAGE_SIZE", 10)
+    def test_should_use_same_number_of_queries_for_any_page(self):
+        # given
+        save_killmails(25)
+        url = reverse("killstory:index")
+        first_page_queries = len(self.capture_queries(url, {}))
+        cursor = self.client.get(url).context["next_cursor"]
+        cursor = self.client.get(url, {"before": cursor}).context["next_cursor"]
+        # when/then: the last page has 5 rows instead of 10 but needs no fewer queries
+        with self.assertNumQueries(first_page_queries):
+            response = self.client.get(url, {"before": cursor})
+        self.assertEqual(len(response.context["kill_killmails"]), 5)
+        self.assertContains(response, "View Details")
+        self.assertNotContains(response, "Older")
+
+    def capture_queries(self, url, params):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, params)
+        return context.captured_queries
+
+
+class TestKillDetailView(TestCase):
+    def setUp(self):
+        self.user = AuthUtils.create_user("viewer")
+        AuthUtils.add_main_character_2(self.user, "Viewer", 2112000900)
+        self.client.force_login(self.user)
+        for killmail_id in (1, 2, 3):
+            cache.delete(kill_detail_cache_key(killmail_id))
+            self.addCleanup(cache.delete, kill_detail_cache_key(killmail_id))
+
+    def get_detail(self, killmail_id):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("killstory:kill_detail", args=[killmail_id]))
+        return response, [query["sql"] for query in queries.captured_queries]
+
+    def test_should_load_tree_in_fixed_number_of_queries(self):
+        # given
+        batch = make_batch(1, items=1, contained=1, attackers=1) + make_batch(2, items=5, contained=4, attackers=6)
+        save_batch(batch)
+        # IDs a page could not resolve are not looked up again, so each page starts without them
+        name_keys = [f"killstory:name:{entity_id}" for entity_id in batch_name_ids(batch)]
+        self.addCleanup(cache.delete_many, name_keys)
+        # when
+        cache.delete_many(name_keys)
+        small, small_queries = self.get_detail(1)
+        cache.delete_many(name_keys)
+        large, large_queries = self.get_detail(2)
+        # then
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertContains(large, "&rdsh; 3003</td>", count=5)
+        self.assertContains(large, "<td>24690</td>", count=6)
+
+    def test_should_render_tree_from_cache(self):
+        # given
+        save_batch(make_batch(1))
+        self.get_detail(1)
+        # when
+        response, queries = self.get_detail(1)
+        # then
+        self.assertContains(response, "<td>Yes</td>", count=1, html=True)
+        self.assertIsNotNone(cache.get(kill_detail_cache_key(1)))
+        self.assertFalse([sql for sql in queries if "kill_victim" in sql or "kill_attacker" in sql])
+
+    def test_should_show_current_value_with_cached_tree(self):
+        # given
+        save_batch(make_batch(1))
+        self.get_detail(1)
+        Killmail.objects.filter(pk=1).update(total_value=2_500_000)
+        # when
+        response, _ = self.get_detail(1)
+        # then
+        self.assertContains(response, "<td>2,500,000</td>", html=True)
+
+    @patch("killstory.writer.KILLSTORY_STORAGE_MODE", "compact")
+    def test_should_expand_compact_items(self):
+        # given
+        save_batch(make_batch(3, items=2, contained=0))
+        # when
+        response, _ = self.get_detail(3)
+        # then
+        self.assertContains(response, "<td>2001</td>", html=True)
+
+    def test_should_return_404_for_unknown_killmail(self):
+        response, _ = self.get_detail(404)
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,151 @@
+from unittest.mock import Mock, patch
+
+from django.db import OperationalError
+from django.test import TestCase
+
+from killstory import writer
+from killstory.models import Attacker, Killmail, Victim, VictimContainedItem, VictimItem
+from killstory.tasks import save_batch
+from killstory.writer import bulk_save_batch, resolve_item_pks, resolve_victim_pks
+
+from .utils import make_batch
+
+
+class TestBulkSaveBatch(TestCase):
+    def test_should_write_all_tables(self):
+        # when
+        counts = save_batch(make_batch(1, 2, items=3, contained=2, attackers=4))
+        # then
+        self.assertEqual(
+            counts,
+            {
+                "killmails": 2,
+                "victims": 2,
+                "attackers": 8,
+                "items": 6,
+                "contained_items": 12,
+                "skipped": 0,
+            },
+        )
+        self.assertEqual(Killmail.objects.count(), 2)
+        self.assertEqual(Victim.objects.count(), 2)
+        self.assertEqual(Attacker.objects.count(), 8)
+        self.assertEqual(VictimItem.objects.filter(victim__killmail_id=1).count(), 3)
+        self.assertEqual(
+            VictimContainedItem.objects.filter(
+                parent_item__victim__killmail_id=2
+            ).count(),
+            6,
+        )
+
+    def test_should_use_constant_number_of_queries(self):
+        # given
+        batch = make_batch(*range(1, 21), items=5, contained=1)
+        # when/then: 2 savepoints + 2 releases + killmail insert + stored check + 4 inserts
+        # + statistics lock, insert of the missing rows, lock of those and update
+        with self.assertNumQueries(14):
+            bulk_save_batch(batch)
+
+    def test_should_skip_stored_killmails(self):
+        # given
+        save_batch(make_batch(1))
+        # when
+        counts = save_batch(make_batch(1, 2))
+        # then
+        self.assertEqual(counts["killmails"], 1)
+        self.assertEqual(counts["skipped"], 1)
+        self.assertEqual(Victim.objects.count(), 2)
+        self.assertEqual(Attacker.objects.filter(killmail_id=1).count(), 2)
+
+    def test_replaying_a_batch_should_not_duplicate_related_rows(self):
+        # given
+        bulk_save_batch(make_batch(1, 2, items=2, contained=1, attackers=3))
+        # when
+        with self.assertNoLogs("killstory.writer", level="WARNING"):
+            counts = bulk_save_batch(make_batch(1, 2, 3, items=2, contained=1, attackers=3))
+        # then
+        self.assertEqual(counts["killmails"], 1)
+        self.assertEqual(counts["attackers"], 3)
+        self.assertEqual(Attacker.objects.count(), 9)
+        self.assertEqual(VictimItem.objects.count(), 6)
+        self.assertEqual(VictimContainedItem.objects.count(), 6)
+
+    def test_should_complete_killmails_stored_without_related_rows(self):
+        # given
+        killmail, _ = make_batch(1)[0]
+        killmail.save()
+        # when
+        counts = bulk_save_batch(make_batch(1))
+        # then
+        self.assertEqual(counts["victims"], 1)
+        self.assertTrue(Victim.objects.filter(killmail_id=1).exists())
+
+    def test_should_keep_valid_killmails_when_one_fails(self):
+        # given
+        batch = make_batch(1, 2, 3)
+        del batch[1][1]["attackers"][0]["weapon_type_id"]
+        # when
+        with self.assertLogs("killstory.writer", level="ERROR"):
+            counts = bulk_save_batch(batch)
+        # then
+        self.assertEqual(counts["killmails"], 2)
+        self.assertEqual(counts["skipped"], 0)
+        self.assertEqual(
+            sorted(Killmail.objects.values_list("pk", flat=True)), [1, 3]
+        )
+
+    def test_should_insert_killmails_in_id_order(self):
+        # given
+        upsert = Mock(side_effect=writer.upsert_killmails)
+        # when
+        with patch("killstory.writer.upsert_killmails", upsert):
+            bulk_save_batch(make_batch(3, 1, 2))
+        # then
+        self.assertEqual([killmail.pk for killmail, _ in upsert.call_args[0][0]], [1, 2, 3])
+
+    def test_should_save_again_after_a_deadlock(self):
+        # given
+        calls = iter([OperationalError("(1213, 'Deadlock found when trying to get lock')")])
+        upsert = writer.upsert_killmails
+
+        def upsert_once_deadlocked(pairs):
+            error = next(calls, None)
+            if error:
+                raise error
+            return upsert(pairs)
+
+        # when: outside of a caller's transaction
+        with patch("killstory.writer.upsert_killmails", side_effect=upsert_once_deadlocked), patch(
+            "killstory.writer.connection", Mock(in_atomic_block=False)
+        ), patch("killstory.writer.time.sleep"), self.assertLogs("killstory.writer", level="WARNING"):
+            counts = bulk_save_batch(make_batch(1))
+        # then
+        self.assertEqual(counts["killmails"], 1)
+        self.assertTrue(Victim.objects.filter(killmail_id=1).exists())
+
+    def test_should_not_save_again_inside_a_callers_transaction(self):
+        # given
+        deadlock = OperationalError("deadlock detected")
+        # when/then
+        with patch("killstory.writer.upsert_killmails", side_effect=deadlock), self.assertRaises(OperationalError):
+            bulk_save_batch(make_batch(1))
+
+    def test_should_resolve_parent_keys_without_returned_pks(self):
+        # given
+        save_batch(make_batch(1, 2, items=2, contained=0))
+        victims = [Victim(killmail_id=1), Victim(killmail_id=2)]
+        items = [VictimItem(victim_id=v.pk) for v in Victim.objects.order_by("pk")]
+        items += [VictimItem(victim_id=v.pk) for v in Victim.objects.order_by("pk")]
+        items.sort(key=lambda item: item.victim_id)
+        # when
+        resolve_victim_pks(victims)
+        resolve_item_pks(items)
+        # then
+        self.assertEqual(
+            [v.pk for v in victims],
+            [Victim.objects.get(killmail_id=1).pk, Victim.objects.get(killmail_id=2).pk],
+        )
+        self.assertEqual(
+            [item.pk for item in items],
+            list(VictimItem.objects.order_by("victim_id", "pk").values_list("pk", flat=True)),
+        )
@@ -0,0 +1,83 @@
+"""Helpers for building ESI-shaped killmail data and owned characters in tests."""
+
+from allianceauth.authentication.models import CharacterOwnership
+from allianceauth.eveonline.models import EveCharacter
+from allianceauth.tests.auth_utils import AuthUtils
+
+from killstory.tasks import create_killmail_instance
+
+
+def make_killmail_data(killmail_id, items=2, contained=1, attackers=2, **victim):
+    """Returns a raw ESI killmail dict with the given number of items and attackers."""
+    victim_data = {
+        "character_id": 2112000001,
+        "corporation_id": 98000001,
+        "alliance_id": 99000001,
+        "damage_taken": 1000,
+        "ship_type_id": 587,
+        "items": [
+            {
+                "item_type_id": 2000 + i,
+                "flag": 27,
+                "quantity_destroyed": 1,
+                "singleton": 0,
+                "items": [
+                    {
+                        "item_type_id": 3000 + j,
+                        "flag": 27,
+                        "quantity_dropped": 10,
+                        "singleton": 0,
+                    }
+                    for j in range(contained)
+                ],
+            }
+            for i in range(items)
+        ],
+    }
+    victim_data.update(victim)
+    return {
+        "killmail_id": killmail_id,
+        "killmail_time": "2024-01-01T12:00:00Z",
+        "solar_system_id": 30000142,
+        "position": {"x": 1.0, "y": 2.0, "z": 3.0},
+        "victim": victim_data,
+        "attackers": [
+            {
+                "character_id": 2112000100 + i,
+                "corporation_id": 98000100,
+                "alliance_id": 99000100,
+                "damage_done": 500,
+                "final_blow": i == 0,
+                "security_status": 0.5,
+                "ship_type_id": 24690,
+                "weapon_type_id": 2488,
+            }
+            for i in range(attackers)
+        ],
+    }
+
+
+def make_batch(*killmail_ids, **kwargs):
+    """Returns a save_batch batch for the given killmail ids."""
+    batch = []
+    for killmail_id in killmail_ids:
+        data = make_killmail_data(killmail_id, **kwargs)
+        batch.append((create_killmail_instance(data), data))
+    return batch
+
+
+def create_owned_character(character_id, corporation_id=98000001, alliance_id=None):
+    """Creates an EveCharacter owned by a new user."""
+    user = AuthUtils.create_user(f"user_{character_id}")
+    character = EveCharacter.objects.create(
+        character_id=character_id,
+        character_name=f"Character {character_id}",
+        corporation_id=corporation_id,
+        corporation_name=f"Corporation {corporation_id}",
+        corporation_ticker="CORP",
+        alliance_id=alliance_id,
+    )
+    CharacterOwnership.objects.create(
+        character=character, owner_hash=f"hash_{character_id}", user=user
+    )
+    return character
@@ -2,11 +2,18 @@
 
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
+from .app_settings import KILLSTORY_ASYNC_VIEWS
 
 app_name = "killstory"
 
+# Read views served as async views under ASGI, the sync ones otherwise
+read_views = async_views if KILLSTORY_ASYNC_VIEWS else views
+search_view = async_views.search_killmails if KILLSTORY_ASYNC_VIEWS else api.search_killmails
+
 urlpatterns = [
-    path('', views.killstory_view, name='index'),  # Nommer la vue d'index pour l'application
-    path('kill/<int:killmail_id>/', views.kill_detail_view, name='kill_detail'),
+    path('', read_views.killstory_view, name='index'),  # Nommer la vue d'index pour l'application
+    path('kill/<int:killmail_id>/', read_views.kill_detail_view, name='kill_detail'),
+    path('api/killmails/', search_view, name='api_killmails'),
+    path('api/killmails/export/', api.export_killmails_view, name='api_export'),
 ]
@@ -6,17 +6,54 @@ These views handle the rendering of pages related to killmails, victims, attacke
 The views require the user to be logged in to access them, as enforced by the `@login_required` decorator.
 """
 
+from django.core.cache import cache
+from django.db.models import Prefetch
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from .models import Killmail, Victim, VictimItem, VictimContainedItem, Attacker
+from .names import name_resolver
+from .pagination import keyset_page
+from .writer import expand_items
+from .app_settings import KILLSTORY_NAMES_MISSING_TIMEOUT, KILLSTORY_PAGE_SIZE
+
+# Columns shown on the index page, all on the killmail table
+INDEX_COLUMNS = (
+    'killmail_id', 'killmail_time', 'solar_system_id', 'total_value', 'victim_ship_type_id',
+    'victim_character_id', 'victim_corporation_id', 'final_blow_character_id', 'attacker_count',
+)
+
+# Columns of the index page shown by name
+INDEX_NAME_COLUMNS = (
+    'solar_system_id', 'victim_ship_type_id', 'victim_character_id', 'victim_corporation_id',
+    'final_blow_character_id',
+)
+
+# Bump when kill_detail_tree.html changes, so fragments cached forever are rendered again
+KILL_DETAIL_FRAGMENT_VERSION = 2
+
+def kill_detail_cache_key(killmail_id):
+    """Returns the cache key of a killmail's rendered victim, items and attackers fragment."""
+    return f"killstory:kill_detail:{KILL_DETAIL_FRAGMENT_VERSION}:{killmail_id}"
+
+def kill_detail_queryset():
+    """Returns Killmails with their victim, items, contained items and attackers loaded in four queries."""
+    return Killmail.objects.select_related('victim').prefetch_related(
+        Prefetch('attackers', queryset=Attacker.objects.order_by('-final_blow', '-damage_done', 'pk')),
+        Prefetch('victim__items', queryset=VictimItem.objects.order_by('flag', 'pk').prefetch_related(
+            Prefetch('contained_items', queryset=VictimContainedItem.objects.order_by('flag', 'pk'))
+        )),
+    )
 
 @login_required
 def killstory_view(request):
     """
     View function that renders the index page for the killstory application.
 
-    This view retrieves all Killmail objects from the database and passes them to the template
-    'killstory/index.html' to be displayed on the index page.
+    This view retrieves one page of Killmail objects, newest first, with only the denormalized
+    summary columns the template shows, so no other table is joined, and passes them to the template
+    'killstory/index.html'. Pages are selected with a keyset cursor given in the `before`
+    query parameter, so every page costs the same whatever the size of the table.
 
     Args:
         request (HttpRequest): The HTTP request object containing metadata about the request.
@@ -24,19 +61,58 @@ def killstory_view(request):
     Returns:
         HttpResponse: The rendered response for the index page with the Killmail objects.
     """
-    kill_killmails = Killmail.objects.all()
+    kill_killmails, next_cursor = keyset_page(
+        Killmail.objects.only(*INDEX_COLUMNS),
+        request.GET.get('before'),
+        KILLSTORY_PAGE_SIZE,
+    )
     context = {
-        'kill_killmails': kill_killmails
+        'kill_killmails': kill_killmails,
+        # Every ID of the page resolved in one lookup
+        'names': name_resolver.resolve(
+            getattr(kill, column) for kill in kill_killmails for column in INDEX_NAME_COLUMNS
+        ),
+        'next_cursor': next_cursor,
+        'is_first_page': 'before' not in request.GET,
     }
     return render(request, 'killstory/index.html', context)
 
+def tree_ids(killmail):
+    """Yields the IDs shown by name on a killmail's detail tree."""
+    victim = getattr(killmail, 'victim', None)
+    if victim is not None:
+        yield from (victim.character_id, victim.corporation_id, victim.alliance_id, victim.ship_type_id)
+        for item in victim.items.all():
+            yield item.item_type_id
+            yield from (contained_item.item_type_id for contained_item in item.contained_items.all())
+    for attacker in killmail.attackers.all():
+        yield from (
+            attacker.character_id, attacker.corporation_id, attacker.alliance_id,
+            attacker.ship_type_id, attacker.weapon_type_id,
+        )
+
+def cache_kill_detail_tree(killmail):
+    """Renders a killmail's detail tree and caches it, without expiry only once every name is resolved."""
+    ids = {entity_id for entity_id in tree_ids(killmail) if entity_id is not None}
+    names = name_resolver.resolve(ids)
+    fragment = render_to_string('killstory/kill_detail_tree.html', {'killmail': killmail, 'names': names})
+    # Raw IDs are rendered again once the lookups that missed them may be retried
+    timeout = None if ids <= names.keys() else KILLSTORY_NAMES_MISSING_TIMEOUT
+    cache.set(kill_detail_cache_key(killmail.pk), fragment, timeout=timeout)
+    return fragment
+
 @login_required
 def kill_detail_view(request, killmail_id):
     """
     View function that renders the detail page for a specific killmail.
 
     This view retrieves the Killmail object corresponding to the provided killmail_id and passes it to the template
-    'killstory/kill_detail.html' to be displayed on the killmail detail page.
+    'killstory/kill_detail.html' to be displayed on the killmail detail page. The victim, items and
+    attackers are rendered once from 'killstory/kill_detail_tree.html', with the whole tree loaded in a
+    fixed number of queries, and cached without expiry since killmails never change, or only for
+    KILLSTORY_NAMES_MISSING_TIMEOUT seconds while some of its names are unresolved. The items of a
+    killmail saved in compact storage mode are expanded first. Values are read from the killmail row
+    on every request, as they change when killmails are revalued.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -45,9 +121,17 @@ def kill_detail_view(request, killmail_id):
     Returns:
         HttpResponse: The rendered response for the killmail detail page.
     """
-    killmail = get_object_or_404(Killmail, pk=killmail_id)
+    fragment = cache.get(kill_detail_cache_key(killmail_id))
+    if fragment is None:
+        expand_items([killmail_id])
+        killmail = get_object_or_404(kill_detail_queryset(), pk=killmail_id)
+        fragment = cache_kill_detail_tree(killmail)
+    else:
+        killmail = get_object_or_404(Killmail, pk=killmail_id)
     context = {
-        'killmail': killmail
+        'killmail': killmail,
+        'fragment': fragment,
+        'names': name_resolver.resolve([killmail.solar_system_id]),
     }
     return render(request, 'killstory/kill_detail.html', context)
 
@@ -0,0 +1,297 @@
+"""
+Bulk writer for killmail batches.
+
+A batch is a list of ``(Killmail, raw ESI dict)`` tuples. Instead of saving every
+row on its own, the batch is flattened into one row list per table and written
+with a handful of ``bulk_create`` calls, resolving the primary keys of the
+parent rows (victims, then items) in bulk before their children are built.
+
+Writes are idempotent: killmails are inserted with ``ON CONFLICT DO NOTHING``
+(``INSERT IGNORE`` on MySQL) and child rows are only written for killmails that
+have none stored yet, so replaying a batch never duplicates attackers or items.
+The per-entity statistics of the written killmails are added in the same transaction,
+and each killmail is valued and summarized before it is inserted.
+
+In compact storage mode the raw killmail is stored as a compressed blob instead
+of item rows, and ``expand_items`` writes the items when they are first needed.
+"""
+# killstory/writer.py
+
+import time
+import logging
+from collections import defaultdict
+from django.db import connection, transaction, IntegrityError, OperationalError
+from .models import Killmail, KillmailBlob, Victim, Attacker, VictimItem, VictimContainedItem
+from .compact import COMPACT, decode_killmail, encode_killmail
+from .app_settings import KILLSTORY_STORAGE_MODE
+from .stats import add_entity_stats, entity_stat_deltas
+from .pricing import value_killmails
+from .summary import summarize_killmails
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement, keeps SQLite below its bound parameter limit.
+BULK_CREATE_BATCH_SIZE = 500
+
+# Attempts at saving a batch whose transaction was aborted to resolve a deadlock
+DEADLOCK_ATTEMPTS = 3
+
+
+def bulk_save_batch(batch):
+    """Writes a batch of killmails and their related rows.
+
+    Returns the rows written per table and, as ``skipped``, the killmails that were
+    already stored with their related rows. Killmails are written in ID order, so
+    concurrent batches sharing killmails lock them in the same order. A batch whose
+    transaction the database aborted to resolve a deadlock anyway is saved again,
+    unless it runs inside a caller's transaction, which was aborted with it.
+    """
+    killmails = {}
+    for killmail, killmail_data in batch:
+        killmails.setdefault(killmail.killmail_id, (killmail, killmail_data))
+    pairs = [killmails[kill_id] for kill_id in sorted(killmails)]
+    if not pairs:
+        return empty_counts()
+
+    # Loading the price list may take an HTTP request, keep it out of the transaction
+    value_killmails(pairs)
+    attempt = 1
+    while True:
+        try:
+            return save_pairs(pairs)
+        except OperationalError as e:
+            if connection.in_atomic_block or not is_deadlock(e) or attempt >= DEADLOCK_ATTEMPTS:
+                raise
+            logger.warning("Deadlock saving a batch (%s), attempt %d", e, attempt)
+            time.sleep(0.1 * attempt)
+            attempt += 1
+
+
+def is_deadlock(error):
+    """Returns whether a database error reports a deadlock, on PostgreSQL, MySQL or MariaDB."""
+    cause = error.__cause__
+    code = getattr(cause, 'pgcode', None) or (cause.args[0] if cause is not None and cause.args else None)
+    return code in ('40P01', 1213) or 'deadlock' in str(error).lower()
+
+
+def save_pairs(pairs):
+    """Writes (Killmail, raw dict) pairs in one transaction, one by one when the bulk insert fails."""
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                return upsert_killmails(pairs)
+        except IntegrityError as e:
+            logger.warning("Bulk insert failed (%s), retrying killmails one by one.", e)
+
+        # Only malformed killmails get here, conflicts on stored ones are skipped above
+        counts = empty_counts()
+        for killmail, killmail_data in pairs:
+            try:
+                with transaction.atomic():
+                    add_counts(counts, upsert_killmails([(killmail, killmail_data)]))
+            except IntegrityError as e:
+                logger.error("Error saving killmail: %s. Data: %s", e, killmail_data)
+        return counts
+
+
+def upsert_killmails(pairs):
+    """Inserts the killmails not stored yet, then the related rows of those still without any.
+
+    A conflicting insert waits for the transaction that holds the row, so once it
+    returns every killmail is either ours or committed together with its children.
+    The pairs must be sorted by killmail ID, so two batches never wait on each
+    other's rows in opposite orders.
+    """
+    summarize_killmails(pairs)
+    Killmail.objects.bulk_create(
+        [killmail for killmail, _ in pairs], batch_size=BULK_CREATE_BATCH_SIZE, ignore_conflicts=True
+    )
+    stored = stored_killmail_ids([killmail.killmail_id for killmail, _ in pairs])
+    counts = write_killmails([pair for pair in pairs if pair[0].killmail_id not in stored])
+    counts['skipped'] = len(stored)
+    return counts
+
+
+def stored_killmail_ids(kill_ids):
+    """Returns the IDs among the given killmails that already have a victim or attackers."""
+    if not kill_ids:
+        return set()
+    return set(
+        Victim.objects.filter(killmail_id__in=kill_ids).values_list('killmail_id', flat=True).union(
+            Attacker.objects.filter(killmail_id__in=kill_ids).values_list('killmail_id', flat=True)
+        )
+    )
+
+
+def write_killmails(pairs):
+    """Inserts the victims, attackers and items of stored killmails with bulk_create, and adds their statistics."""
+    if not pairs:
+        return empty_counts()
+    rows = flatten_killmails(pairs)
+    compact = KILLSTORY_STORAGE_MODE == COMPACT
+    if compact:
+        KillmailBlob.objects.bulk_create(
+            [KillmailBlob(killmail=killmail, data=encode_killmail(data)) for killmail, data in pairs],
+            batch_size=BULK_CREATE_BATCH_SIZE
+        )
+    Attacker.objects.bulk_create(rows['attackers'], batch_size=BULK_CREATE_BATCH_SIZE)
+
+    victims = [victim for victim, _ in rows['victims']]
+    Victim.objects.bulk_create(victims, batch_size=BULK_CREATE_BATCH_SIZE)
+    item_counts = {'items': 0, 'contained_items': 0}
+    if not compact:
+        resolve_victim_pks(victims)
+        item_counts = write_items(rows['victims'])
+    add_entity_stats(entity_stat_deltas(pairs))
+
+    return {
+        'killmails': len(rows['killmails']),
+        'victims': len(victims),
+        'attackers': len(rows['attackers']),
+        **item_counts,
+    }
+
+
+def write_items(victim_rows):
+    """Inserts the items and contained items of saved victims from (Victim, raw victim dict) pairs."""
+    items, contained_data = [], []
+    for victim, victim_data in victim_rows:
+        for item_data in victim_data.get('items', []):
+            items.append(build_item(VictimItem, item_data, victim=victim))
+            contained_data.append(item_data.get('items', []))
+    VictimItem.objects.bulk_create(items, batch_size=BULK_CREATE_BATCH_SIZE)
+    resolve_item_pks(items)
+
+    contained_items = [
+        build_item(VictimContainedItem, contained_item_data, parent_item=item)
+        for item, children in zip(items, contained_data)
+        for contained_item_data in children
+    ]
+    VictimContainedItem.objects.bulk_create(contained_items, batch_size=BULK_CREATE_BATCH_SIZE)
+    return {'items': len(items), 'contained_items': len(contained_items)}
+
+
+def expand_items(kill_ids):
+    """Writes the item rows of compact mode killmails that were not expanded yet, returns the killmails expanded.
+
+    The blobs are locked while their items are written, so concurrent requests
+    for the same killmail expand it only once.
+    """
+    with transaction.atomic():
+        blobs = list(
+            KillmailBlob.objects.select_for_update()
+            .filter(killmail_id__in=kill_ids, items_expanded=False)
+            .order_by('pk')
+        )
+        if not blobs:
+            return 0
+        victims = Victim.objects.in_bulk([blob.killmail_id for blob in blobs], field_name='killmail_id')
+        victim_rows = []
+        for blob in blobs:
+            victim = victims.get(blob.killmail_id)
+            if victim is not None:
+                victim_rows.append((victim, decode_killmail(blob.data).get('victim', {})))
+        write_items(victim_rows)
+        KillmailBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).update(items_expanded=True)
+        return len(blobs)
+
+
+def flatten_killmails(pairs):
+    """Splits (Killmail, raw dict) pairs into killmail, victim and attacker row lists."""
+    rows = {'killmails': [], 'victims': [], 'attackers': []}
+    for killmail, killmail_data in pairs:
+        rows['killmails'].append(killmail)
+        if "victim" in killmail_data:
+            rows['victims'].append(
+                (build_victim(killmail, killmail_data['victim']), killmail_data['victim'])
+            )
+        for attacker_data in killmail_data.get('attackers', []):
+            rows['attackers'].append(build_attacker(killmail, attacker_data))
+    return rows
+
+
+def resolve_victim_pks(victims):
+    """Fills in victim primary keys on backends where bulk_create does not return them."""
+    missing = [victim for victim in victims if victim.pk is None]
+    if not missing:
+        return
+    pks = dict(
+        Victim.objects.filter(
+            killmail_id__in=[victim.killmail_id for victim in missing]
+        ).values_list('killmail_id', 'pk')
+    )
+    for victim in missing:
+        victim.pk = pks[victim.killmail_id]
+
+
+def resolve_item_pks(items):
+    """Fills in item primary keys on backends where bulk_create does not return them.
+
+    The victims are brand new, so their items are exactly the rows just inserted,
+    and ascending ids per victim follow the insertion order.
+    """
+    if not items or all(item.pk is not None for item in items):
+        return
+    items_by_victim = defaultdict(list)
+    for item in items:
+        items_by_victim[item.victim_id].append(item)
+    pks = defaultdict(list)
+    for victim_id, pk in VictimItem.objects.filter(
+        victim_id__in=list(items_by_victim)
+    ).order_by('victim_id', 'pk').values_list('victim_id', 'pk'):
+        pks[victim_id].append(pk)
+    for victim_id, victim_items in items_by_victim.items():
+        for item, pk in zip(victim_items, pks[victim_id]):
+            item.pk = pk
+
+
+def build_victim(killmail, victim_data):
+    """Builds an unsaved Victim from the given data."""
+    return Victim(
+        killmail=killmail,
+        alliance_id=victim_data.get('alliance_id'),
+        character_id=victim_data.get('character_id'),
+        corporation_id=victim_data.get('corporation_id'),
+        faction_id=victim_data.get('faction_id'),
+        damage_taken=victim_data['damage_taken'],
+        ship_type_id=victim_data['ship_type_id']
+    )
+
+
+def build_attacker(killmail, attacker_data):
+    """Builds an unsaved Attacker from the given data."""
+    return Attacker(
+        killmail=killmail,
+        alliance_id=attacker_data.get('alliance_id'),
+        character_id=attacker_data.get('character_id'),
+        corporation_id=attacker_data.get('corporation_id'),
+        faction_id=attacker_data.get('faction_id'),
+        damage_done=attacker_data['damage_done'],
+        final_blow=attacker_data['final_blow'],
+        security_status=attacker_data['security_status'],
+        ship_type_id=attacker_data['ship_type_id'],
+        weapon_type_id=attacker_data.get('weapon_type_id')
+    )
+
+
+def build_item(model, item_data, **parent):
+    """Builds an unsaved VictimItem or VictimContainedItem from the given data."""
+    return model(
+        item_type_id=item_data['item_type_id'],
+        flag=item_data['flag'],
+        quantity_destroyed=item_data.get('quantity_destroyed'),
+        quantity_dropped=item_data.get('quantity_dropped'),
+        singleton=item_data['singleton'],
+        **parent
+    )
+
+
+def empty_counts():
+    """Returns a zeroed rows-per-table counter, with the killmails skipped as already stored."""
+    return dict.fromkeys(['killmails', 'victims', 'attackers', 'items', 'contained_items', 'skipped'], 0)
+
+
+def add_counts(total, counts):
+    """Adds a rows-per-table counter into a running total."""
+    for table, count in counts.items():
+        total[table] += count
@@ -67,6 +67,10 @@ DEFAULT_FROM_EMAIL = ""
 # Add any custom settings below here. #
 #######################################
 
+# No type price requests to ESI from the tests
+KILLSTORY_PRICE_PROVIDER = None
+KILLSTORY_API_NAMES_ENDPOINT = None
+
 # workarounds to suppress warnings
 LOGGING = None
 STATICFILES_DIRS = []